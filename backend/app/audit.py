@@ -32,9 +32,9 @@ async def log_audit_event(
         return
 
     try:
-        from app.database import get_supabase
+        from app.database import get_supabase, run_query
         db = get_supabase()
-        db.table("audit_logs").insert({
+        await run_query(db.table("audit_logs").insert({
             "id": str(uuid.uuid4()),
             "timestamp": datetime.now(timezone.utc).isoformat(),
             "user_id": user_id,
@@ -48,7 +48,7 @@ async def log_audit_event(
             "request_path": request_path,
             "status_code": status_code,
             "details": details,
-        }).execute()
+        }))
     except Exception as e:
         logger.error(f"Failed to write audit log: {e}")
 
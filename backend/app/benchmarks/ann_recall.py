@@ -0,0 +1,82 @@
+"""Local vector index: IVF recall@k and QPS against the exact (flat) scan.
+
+Builds a flat and an IVF store over the same synthetic clustered embeddings
+(Gaussian blobs on the unit sphere, like real topic clusters), then sweeps
+``nprobe`` and reports recall@k — the share of the exact top-k the IVF index
+returns — and single-query throughput for each setting.
+
+Run via: python -m app.benchmarks.ann_recall [--rows 100000] [--dim 128] [--queries 500] [--top-k 5]
+"""
+
+import argparse
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.local_vectors import IVFVectorStore, LocalVectorStore
+
+_UPSERT_BATCH = 5000
+
+
+def _dataset(rows: int, dim: int, clusters: int, queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    data = centers[labels] + 0.35 * rng.normal(size=(rows, dim)).astype(np.float32)
+    q_labels = rng.integers(0, clusters, size=queries)
+    q = centers[q_labels] + 0.35 * rng.normal(size=(queries, dim)).astype(np.float32)
+    return data, q
+
+
+def _load(store: LocalVectorStore, data: np.ndarray) -> float:
+    started = time.perf_counter()
+    for i in range(0, len(data), _UPSERT_BATCH):
+        store.upsert([
+            {"id": str(i + j), "values": row, "metadata": {}}
+            for j, row in enumerate(data[i:i + _UPSERT_BATCH])
+        ])
+    return time.perf_counter() - started
+
+
+def _run_queries(store: LocalVectorStore, queries: np.ndarray, top_k: int) -> tuple[list[set[str]], float]:
+    results = []
+    started = time.perf_counter()
+    for q in queries:
+        results.append({m["id"] for m in store.query(q, top_k)})
+    return results, len(queries) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--nlist", type=int, default=None, help="IVF lists (default: 4*sqrt(rows))")
+    args = parser.parse_args()
+
+    data, queries = _dataset(args.rows, args.dim, args.clusters, args.queries)
+
+    with tempfile.TemporaryDirectory() as flat_dir, tempfile.TemporaryDirectory() as ivf_dir:
+        flat = LocalVectorStore(flat_dir)
+        ivf = IVFVectorStore(ivf_dir, nlist=args.nlist)
+        print(f"load flat: {_load(flat, data):.1f}s  ivf (incl. training): {_load(ivf, data):.1f}s  {ivf.stats()}")
+
+        exact, flat_qps = _run_queries(flat, queries, args.top_k)
+        print(f"{'index':>10} {'nprobe':>6} {'recall@' + str(args.top_k):>9} {'QPS':>9} {'speedup':>8}")
+        print(f"{'flat':>10} {'-':>6} {1.0:>9.3f} {flat_qps:>9.0f} {1.0:>8.1f}")
+
+        nlist = ivf.stats()["nlist"] or 1
+        for nprobe in (1, 2, 4, 8, 16, 32, 64, 128):
+            if nprobe > nlist:
+                break
+            ivf.nprobe = nprobe
+            approx, qps = _run_queries(ivf, queries, args.top_k)
+            recall = np.mean([len(a & e) / len(e) for a, e in zip(approx, exact) if e])
+            print(f"{'ivf':>10} {nprobe:>6} {recall:>9.3f} {qps:>9.0f} {qps / flat_qps:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""Chunker throughput: per-window decode vs single-pass offset slicing, with and without boundary snapping.
+
+Builds a synthetic corpus of paragraphs and sentences of roughly
+``--tokens`` tokens, then chunks it with:
+
+- ``decode``  — the previous chunker: encode, then decode every
+  overlapping token window separately
+- ``offsets`` — ``document_processor.chunk_text``: one encode, chunk
+  boundaries from token start offsets, chunks sliced from the original text
+- ``snapped`` — the same with ``snap=True`` (end chunks at paragraph /
+  sentence breaks)
+
+and reports time, tokens/s, chunk count, and how many chunks end on a
+sentence or paragraph break.
+
+Run via: python -m app.benchmarks.chunking [--tokens 1000000] [--chunk-size 500] [--overlap 50]
+"""
+
+import argparse
+import random
+import time
+
+from app.services.document_processor import chunk_text
+from app.services.embedding_client import get_encoder
+
+_WORDS = (
+    "the caller asked about their account balance and whether the refund was processed "
+    "our agent confirmed the appointment for next week and sent a reminder message "
+    "pricing depends on the plan minutes included overage charges apply after the limit "
+    "please verify your identity with the last four digits of the registered phone number"
+).split()
+
+
+def _corpus(tokens: int, seed: int = 0) -> str:
+    enc = get_encoder()
+    rng = random.Random(seed)
+    paragraphs = []
+    count = 0
+    while count < tokens:
+        sentences = [
+            " ".join(rng.choices(_WORDS, k=rng.randint(6, 28))).capitalize() + rng.choice(".?!")
+            for _ in range(rng.randint(2, 9))
+        ]
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        count += len(enc.encode_ordinary(paragraph)) + 1
+    return "\n\n".join(paragraphs)
+
+
+def _decode_chunker(text: str, chunk_size: int, chunk_overlap: int) -> list[str]:
+    enc = get_encoder()
+    tokens = enc.encode(text)
+    chunks = []
+    start = 0
+    while start < len(tokens):
+        chunk = enc.decode(tokens[start:start + chunk_size]).strip()
+        if chunk:
+            chunks.append(chunk)
+        start += chunk_size - chunk_overlap
+    return chunks
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=1_000_000)
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3, help="Best of N runs")
+    args = parser.parse_args()
+
+    text = _corpus(args.tokens)
+    enc = get_encoder()
+    total_tokens = len(enc.encode_ordinary(text))
+    print(f"corpus: {total_tokens:,} tokens, {len(text) / 1e6:.1f} M chars; "
+          f"chunk_size={args.chunk_size} overlap={args.overlap}")
+    print(f"{'chunker':>8} {'seconds':>8} {'tokens/s':>11} {'chunks':>7} {'on break':>9}")
+
+    runs = (
+        ("decode", lambda: _decode_chunker(text, args.chunk_size, args.overlap)),
+        ("offsets", lambda: chunk_text(text, args.chunk_size, args.overlap, snap=False)),
+        ("snapped", lambda: chunk_text(text, args.chunk_size, args.overlap, snap=True)),
+    )
+    for name, run in runs:
+        best = float("inf")
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            chunks = run()
+            best = min(best, time.perf_counter() - started)
+        on_break = sum(1 for c in chunks[:-1] if c.endswith((".", "?", "!")))
+        print(f"{name:>8} {best:>8.3f} {total_tokens / best:>11,.0f} {len(chunks):>7} "
+              f"{on_break / max(1, len(chunks) - 1):>8.0%}")
+
+
+if __name__ == "__main__":
+    main()
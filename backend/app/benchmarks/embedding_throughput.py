@@ -0,0 +1,142 @@
+"""Embedding throughput: sequential fixed-size batches vs the shared, token-packed, concurrent client.
+
+Starts a local stub of the OpenAI ``/v1/embeddings`` endpoint whose latency
+grows with the tokens in each request and which answers 429 (with
+``Retry-After``) once more than ``--rps`` requests arrive in a second. It
+then embeds the same synthetic chunks two ways:
+
+- ``sequential`` — the previous behaviour: a fresh client, batches of 100,
+  one request at a time
+- ``batched`` — ``embedding_client.embed_texts``
+
+and reports wall time, chunks/s, requests sent and 429s received.
+
+Run via: python -m app.benchmarks.embedding_throughput [--chunks 5000] [--words 350] [--latency-ms 150] [--rps 20]
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import numpy as np
+import openai
+from aiohttp import web
+
+from app.config import settings
+from app.services import embedding_client
+
+_DIM = 256
+
+
+class _StubServer:
+    def __init__(self, latency_ms: float, ms_per_1k_tokens: float, rps: int):
+        self.latency = latency_ms / 1000
+        self.per_token = ms_per_1k_tokens / 1000 / 1000
+        self.rps = rps
+        self.requests = 0
+        self.rate_limited = 0
+        self._window: list[float] = []
+        self._rng = np.random.default_rng(0)
+
+    def reset(self) -> None:
+        self.requests = 0
+        self.rate_limited = 0
+        self._window.clear()
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        inputs = body["input"]
+        now = time.monotonic()
+        self._window = [t for t in self._window if now - t < 1.0]
+        if self.rps and len(self._window) >= self.rps:
+            self.rate_limited += 1
+            return web.json_response(
+                {"error": {"message": "Rate limit reached", "type": "requests", "code": "rate_limit_exceeded"}},
+                status=429,
+                headers={"retry-after": "1"},
+            )
+        self._window.append(now)
+        self.requests += 1
+
+        # ~4 characters per token, close enough for latency modelling
+        tokens = sum(len(t) for t in inputs) // 4
+        await asyncio.sleep(self.latency + tokens * self.per_token)
+        vectors = self._rng.standard_normal((len(inputs), _DIM)).astype(np.float32)
+        return web.json_response({
+            "object": "list",
+            "model": body["model"],
+            "data": [
+                {"object": "embedding", "index": i, "embedding": v.tolist()}
+                for i, v in enumerate(vectors)
+            ],
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+
+async def _sequential(texts: list[str]) -> list[list[float]]:
+    client = openai.AsyncOpenAI(
+        api_key=settings.OPENAI_API_KEY,
+        base_url=settings.EMBEDDING_API_BASE,
+        max_retries=settings.EMBEDDING_MAX_RETRIES,
+    )
+    out = []
+    for i in range(0, len(texts), 100):
+        response = await client.embeddings.create(model=settings.EMBEDDING_MODEL, input=texts[i:i + 100])
+        out.extend(item.embedding for item in response.data)
+    return out
+
+
+def _chunks(count: int, words: int) -> list[str]:
+    rng = random.Random(0)
+    vocab = [f"word{i}" for i in range(5000)]
+    # Real chunk lengths vary — the last chunk of each file is short, headings are tiny
+    return [" ".join(rng.choices(vocab, k=max(5, int(rng.gauss(words, words / 3))))) for _ in range(count)]
+
+
+async def _run(args) -> None:
+    stub = _StubServer(args.latency_ms, args.ms_per_1k_tokens, args.rps)
+    app = web.Application(client_max_size=256 * 1024 * 1024)
+    app.router.add_post("/v1/embeddings", stub.embeddings)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+
+    settings.OPENAI_API_KEY = "stub"
+    settings.EMBEDDING_API_BASE = f"http://127.0.0.1:{port}/v1"
+    settings.EMBEDDING_CONCURRENCY = args.concurrency
+    if args.max_tokens:
+        settings.EMBEDDING_BATCH_MAX_TOKENS = args.max_tokens
+
+    texts = _chunks(args.chunks, args.words)
+    print(f"{len(texts)} chunks, ~{args.words} words each; stub latency {args.latency_ms:.0f} ms "
+          f"+ {args.ms_per_1k_tokens:.0f} ms/1k tokens, limit {args.rps or '∞'} req/s")
+    print(f"{'mode':>10} {'seconds':>8} {'chunks/s':>9} {'requests':>9} {'429s':>6}")
+    try:
+        for name, fn in (("sequential", _sequential), ("batched", embedding_client.embed_texts)):
+            stub.reset()
+            started = time.perf_counter()
+            vectors = await fn(texts)
+            elapsed = time.perf_counter() - started
+            assert len(vectors) == len(texts)
+            print(f"{name:>10} {elapsed:>8.2f} {len(texts) / elapsed:>9.0f} {stub.requests:>9} {stub.rate_limited:>6}")
+    finally:
+        await runner.cleanup()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--words", type=int, default=350, help="Mean words per chunk")
+    parser.add_argument("--latency-ms", type=float, default=150, help="Fixed per-request stub latency")
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=2, help="Extra stub latency per 1k input tokens")
+    parser.add_argument("--rps", type=int, default=20, help="Stub rate limit (0 = unlimited)")
+    parser.add_argument("--concurrency", type=int, default=settings.EMBEDDING_CONCURRENCY)
+    parser.add_argument("--max-tokens", type=int, default=None, help="Override EMBEDDING_BATCH_MAX_TOKENS")
+    asyncio.run(_run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Event-loop lag under concurrent calls: blocking ``.execute()`` vs ``run_query()``.
+
+Simulates N concurrent voice calls, each issuing a stream of PostgREST queries
+(a stub query whose ``execute()`` sleeps for the configured round-trip time),
+while a probe task measures how late the event loop wakes it up. Lag on the
+loop is lag in every call's audio pipeline.
+
+Run via: python -m app.benchmarks.event_loop_lag [--calls 50] [--queries 5] [--rtt-ms 20]
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.database import run_query
+
+PROBE_INTERVAL = 0.005  # 5 ms — roughly one audio frame scheduling tick
+
+
+class _StubQuery:
+    """Stands in for a built PostgREST query; ``execute()`` blocks like the HTTP round-trip."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+
+    def execute(self):
+        time.sleep(self.rtt)
+        return None
+
+
+async def _probe(lags: list[float], stop: asyncio.Event) -> None:
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + PROBE_INTERVAL
+        await asyncio.sleep(PROBE_INTERVAL)
+        lags.append(max(0.0, loop.time() - expected))
+
+
+async def _call(mode: str, queries: int, rtt: float) -> None:
+    for _ in range(queries):
+        query = _StubQuery(rtt)
+        if mode == "blocking":
+            query.execute()
+        else:
+            await run_query(query)
+        # Simulated per-turn work between DB calls (STT/LLM awaits)
+        await asyncio.sleep(0.01)
+
+
+async def _run(mode: str, calls: int, queries: int, rtt: float) -> dict:
+    lags: list[float] = []
+    stop = asyncio.Event()
+    probe = asyncio.create_task(_probe(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(_call(mode, queries, rtt) for _ in range(calls)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await probe
+
+    lags_ms = sorted(l * 1000 for l in lags) or [0.0]
+    return {
+        "mode": mode,
+        "wall_s": round(elapsed, 2),
+        "lag_p50_ms": round(statistics.median(lags_ms), 2),
+        "lag_p99_ms": round(lags_ms[min(len(lags_ms) - 1, int(len(lags_ms) * 0.99))], 2),
+        "lag_max_ms": round(lags_ms[-1], 2),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=5, help="DB queries per call")
+    parser.add_argument("--rtt-ms", type=float, default=20.0, help="simulated PostgREST round-trip")
+    args = parser.parse_args()
+
+    rtt = args.rtt_ms / 1000
+    for mode in ("blocking", "run_query"):
+        print(asyncio.run(_run(mode, args.calls, args.queries, rtt)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+"""Nepali STT throughput vs latency across job processes: each job's own model vs the shared model server.
+
+livekit-agents runs every call in its own process, so this benchmark does
+too: ``--calls`` processes each send ``--utterances`` utterances of
+``--min-seconds``–``--max-seconds`` of audio with exponential pauses (mean
+``--gap-ms``) between them, transcribed by:
+
+- ``per-job``    — the default (``NEPALI_STT_SERVER_SOCKET`` unset): every
+  call process loads its own model and runs one forward pass per utterance
+- ``wait=N ms``  — ``app.voice.nepali_stt_server`` in a separate process with
+  a batch window of N ms (one row per ``--waits`` value); the call processes
+  send it their audio over its Unix socket
+
+and reports wall time, audio seconds transcribed per second, utterances/s,
+per-utterance latency (p50 / p95, including the socket round trip) and the
+server's mean batch size. Run with ``--calls 1`` to see the latency the
+server adds when there is nothing to batch with.
+
+The audio is synthetic, so transcripts are meaningless, but the compute is
+the real model's. ``--tiny`` uses a small randomly initialised wav2vec2 so
+the benchmark runs without downloading the checkpoint.
+
+Run via: python -m app.benchmarks.nepali_stt_batching [--calls 16] [--utterances 8] [--waits 0,5,10,25] [--tiny]
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+from app.config import settings
+from app.voice import nepali_stt, nepali_stt_server
+
+_RATE = nepali_stt.NepaliSTT.TARGET_SAMPLE_RATE
+
+
+def _tiny_model():
+    from transformers import (
+        Wav2Vec2Config,
+        Wav2Vec2CTCTokenizer,
+        Wav2Vec2FeatureExtractor,
+        Wav2Vec2ForCTC,
+        Wav2Vec2Processor,
+    )
+
+    letters = "कखगघचछजझटठडढणतथदधनपफबभमयरलवशसह"
+    vocab = {"<pad>": 0, "<s>": 1, "</s>": 2, "<unk>": 3, "|": 4, **{c: i + 5 for i, c in enumerate(letters)}}
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(vocab, f)
+    tokenizer = Wav2Vec2CTCTokenizer(f.name, pad_token="<pad>", unk_token="<unk>", word_delimiter_token="|")
+    extractor = Wav2Vec2FeatureExtractor(
+        feature_size=1, sampling_rate=_RATE, padding_value=0.0, do_normalize=True, return_attention_mask=True,
+    )
+    config = Wav2Vec2Config(
+        vocab_size=len(vocab), hidden_size=256, num_hidden_layers=4, num_attention_heads=4,
+        intermediate_size=1024, feat_extract_norm="layer", do_stable_layer_norm=True, pad_token_id=0,
+    )
+    return Wav2Vec2Processor(feature_extractor=extractor, tokenizer=tokenizer), Wav2Vec2ForCTC(config).eval()
+
+
+def _utterance(rng: np.random.Generator, seconds: float) -> np.ndarray:
+    t = np.arange(int(seconds * _RATE)) / _RATE
+    tone = 0.3 * np.sin(2 * np.pi * rng.uniform(100, 300) * t)
+    return (tone + 0.05 * rng.standard_normal(t.size)).astype(np.float32)
+
+
+def _load_model(tiny: bool) -> None:
+    if tiny:
+        nepali_stt._processor, nepali_stt._model = _tiny_model()
+    else:
+        asyncio.run(nepali_stt._ensure_model_loaded())
+    # Warm up kernels and allocator before timing
+    nepali_stt._transcribe_batch_sync([_utterance(np.random.default_rng(1), 1.0)] * 2, _RATE)
+
+
+def _call_process(index: int, args, socket_path: str | None, start, results) -> None:
+    """One voice job: its own process, as with livekit-agents' default process executor."""
+    if socket_path is None:
+        _load_model(args.tiny)
+    rng = np.random.default_rng(index)
+    gaps = random.Random(index)
+    utterances = [
+        (gaps.expovariate(1000 / args.gap_ms), _utterance(rng, rng.uniform(args.min_seconds, args.max_seconds)))
+        for _ in range(args.utterances)
+    ]
+
+    async def run() -> list[float]:
+        loop = asyncio.get_running_loop()
+        latencies = []
+        for gap, audio in utterances:
+            await asyncio.sleep(gap)
+            started = time.perf_counter()
+            if socket_path is None:
+                await loop.run_in_executor(None, nepali_stt._transcribe_sync, audio, _RATE)
+            else:
+                await nepali_stt_server.transcribe(audio, socket_path)
+            latencies.append(time.perf_counter() - started)
+        return latencies
+
+    start.wait()
+    latencies = asyncio.run(run())
+    audio_seconds = sum(a.size for _, a in utterances) / _RATE
+    results.put((latencies, audio_seconds, time.time()))
+
+
+def _server_process(args, wait_ms: float, socket_path: str, ready, stop, stats) -> None:
+    _load_model(args.tiny)
+    batcher = nepali_stt._InferenceBatcher(
+        lambda audios: nepali_stt._transcribe_batch_sync(audios, _RATE),
+        max_batch=args.max_batch,
+        wait=wait_ms / 1000,
+        max_batch_samples=int(settings.NEPALI_STT_BATCH_MAX_SECONDS * _RATE),
+    )
+
+    async def run() -> None:
+        server = asyncio.create_task(nepali_stt_server.serve(socket_path, batcher))
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.01)
+        ready.set()
+        await asyncio.to_thread(stop.wait)
+        stats.put(batcher.stats())
+        server.cancel()
+
+    asyncio.run(run())
+
+
+def _run(mode: str, args, ctx, wait_ms: float | None) -> dict:
+    results, stats = ctx.Queue(), ctx.Queue()
+    start = ctx.Barrier(args.calls + 1)
+    server = None
+    socket_path = None
+    if wait_ms is not None:
+        socket_path = os.path.join(tempfile.mkdtemp(), "stt.sock")
+        ready, stop = ctx.Event(), ctx.Event()
+        server = ctx.Process(target=_server_process, args=(args, wait_ms, socket_path, ready, stop, stats))
+        server.start()
+        ready.wait()
+
+    calls = [ctx.Process(target=_call_process, args=(i, args, socket_path, start, results)) for i in range(args.calls)]
+    for call in calls:
+        call.start()
+    start.wait()  # every call process has loaded what it needs
+    started = time.time()
+    finished = [results.get() for _ in calls]
+    for call in calls:
+        call.join()
+    mean_batch = 1.0
+    if server is not None:
+        stop.set()
+        mean_batch = stats.get()["mean_batch"]
+        server.join()
+
+    wall = max(end for _, _, end in finished) - started
+    latencies = [latency for batch, _, _ in finished for latency in batch]
+    return {
+        "mode": mode,
+        "wall": wall,
+        "audio_rate": sum(seconds for _, seconds, _ in finished) / wall,
+        "utterance_rate": len(latencies) / wall,
+        "p50": np.percentile(latencies, 50) * 1000,
+        "p95": np.percentile(latencies, 95) * 1000,
+        "mean_batch": mean_batch,
+    }
+
+
+def _main(args) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    print(f"{args.calls} call processes × {args.utterances} utterances of {args.min_seconds}-{args.max_seconds}s, "
+          f"mean gap {args.gap_ms:.0f} ms; max batch {args.max_batch}")
+    print(f"{'mode':>10} {'seconds':>8} {'audio s/s':>10} {'utt/s':>7} {'p50 ms':>7} {'p95 ms':>7} {'batch':>6}")
+    for mode, wait_ms in [("per-job", None)] + [(f"wait={w:g}ms", w) for w in args.waits]:
+        row = _run(mode, args, ctx, wait_ms)
+        print(f"{row['mode']:>10} {row['wall']:>8.2f} {row['audio_rate']:>10.1f} {row['utterance_rate']:>7.1f} "
+              f"{row['p50']:>7.0f} {row['p95']:>7.0f} {row['mean_batch']:>6.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=16)
+    parser.add_argument("--utterances", type=int, default=8, help="Utterances per call")
+    parser.add_argument("--min-seconds", type=float, default=1.0)
+    parser.add_argument("--max-seconds", type=float, default=4.0)
+    parser.add_argument("--gap-ms", type=float, default=500, help="Mean pause between a call's utterances")
+    parser.add_argument("--waits", type=lambda s: [float(w) for w in s.split(",")], default=[0, 5, 10, 25],
+                        help="Comma-separated batch windows to compare (ms)")
+    parser.add_argument("--max-batch", type=int, default=settings.NEPALI_STT_MAX_BATCH)
+    parser.add_argument("--tiny", action="store_true", help="Small random wav2vec2 instead of the real checkpoint")
+    _main(parser.parse_args())
+
+
+if __name__ == "__main__":
+    main()
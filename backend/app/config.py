@@ -1,8 +1,10 @@
 from pathlib import Path
+from pydantic import AliasChoices, Field, field_validator
 from pydantic_settings import BaseSettings
 
 # Find .env relative to this file's location (backend/.env)
-_ENV_FILE = Path(__file__).resolve().parent.parent / ".env"
+_BACKEND_DIR = Path(__file__).resolve().parent.parent
+_ENV_FILE = _BACKEND_DIR / ".env"
 
 
 class Settings(BaseSettings):
@@ -37,11 +39,98 @@ class Settings(BaseSettings):
     HF_TOKEN: str = ""
 
     # Knowledge Base / RAG
-    PINECONE_API_KEY: str = ""
+    PINECONE_API_KEY: str = ""  # fallback when a knowledge base's config has no api_key
+    PINECONE_UPSERT_BATCH_SIZE: int = 100
+    PINECONE_UPSERT_CONCURRENCY: int = 4
+    VECTOR_PROVIDER_IDLE_SECONDS: float = 900.0
+    VECTOR_PROVIDER_HEALTH_INTERVAL_SECONDS: float = 60.0
     EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_PATH: str = "data/embedding_cache.sqlite3"
+    EMBEDDING_CACHE_MAX_ENTRIES: int = 200_000
+    EMBEDDING_API_BASE: str = ""  # override the OpenAI base URL (e.g. a proxy or local stub)
+    EMBEDDING_BATCH_MAX_TOKENS: int = 250_000  # OpenAI allows 300k tokens per embeddings request
+    EMBEDDING_BATCH_MAX_INPUTS: int = 2048
+    EMBEDDING_CONCURRENCY: int = 4
+    EMBEDDING_MAX_RETRIES: int = 6
     CHUNK_SIZE: int = 500
     CHUNK_OVERLAP: int = 50
+    CHUNK_SNAP_BOUNDARIES: bool = True  # end chunks at paragraph/sentence breaks when one falls in their last quarter
+    INGEST_BATCH_CHUNKS: int = 256  # chunks embedded + upserted per pipeline step (bounds ingestion memory)
+    INGEST_WORKERS: int = 2  # files ingested concurrently per API process
+    INGEST_PARSE_PROCESSES: int = 2  # process pool for parsing/chunking uploads
+    PDF_SHARD_MIN_PAGES: int = 20  # larger PDFs are split into page ranges parsed in parallel
+    INGEST_UPLOAD_DIR: str = "data/uploads"  # uploads wait here until their ingestion job finishes
+    INGEST_JOB_RETENTION_SECONDS: int = 3600  # finished jobs stay queryable in memory this long
     RAG_TOP_K: int = 5
+    RAG_LATENCY_BUDGET_MS: int = 300
+    RAG_MIN_SCORE: float = 0.0
+    RAG_SPECULATE_DEBOUNCE_MS: int = 150  # interim transcripts must be stable this long before a speculative lookup
+    RAG_SPECULATE_MAX_PER_TURN: int = 3
+    LOCAL_VECTOR_DIR: str = "data/vectors"  # root for the "local" knowledge base provider
+    RAG_HYBRID_ENABLED: bool = True  # BM25 index per knowledge base, fused with vector results
+    RAG_HYBRID_VECTOR_WAIT_MS: int = 200  # after this, hybrid searches answer from the BM25 index alone
+    RAG_RRF_K: int = 60  # reciprocal rank fusion constant
+    LEXICAL_INDEX_DIR: str = "data/lexical"  # one SQLite FTS5 file per knowledge base
+    RAG_QUERY_CACHE_ENABLED: bool = True  # query embedding + retrieval result cache shared by job processes
+    RAG_QUERY_CACHE_PATH: str = "data/query_cache.sqlite3"
+    RAG_QUERY_CACHE_TTL_SECONDS: float = 600.0
+    RAG_QUERY_CACHE_MAX_ENTRIES: int = 5000  # per level
+    RAG_QUERY_CACHE_MIN_SIMILARITY: float = 0.97  # cached matches reused for query embeddings at least this close
+
+    # Nepali STT model server (python -m app.voice.nepali_stt_server) — utterances from concurrent calls
+    # share one forward pass. Empty (default): each job process runs its own model, unbatched.
+    NEPALI_STT_SERVER_SOCKET: str = ""
+    NEPALI_STT_MAX_BATCH: int = 8
+    NEPALI_STT_BATCH_WAIT_MS: float = 10.0  # how long an idle server waits for more utterances
+    NEPALI_STT_BATCH_MAX_SECONDS: float = 60.0  # padded audio per forward pass
+
+    # Database — max concurrent PostgREST requests per process (thread pool size)
+    DB_POOL_SIZE: int = 16
+
+    # Worker call teardown — seconds to wait for a caller to reconnect
+    CALL_RECONNECT_GRACE_SECONDS: float = 5.0
+
+    # Worker batch writers (transcripts, function call logs) — bulk-insert thresholds and retry buffer bound.
+    # The TRANSCRIPT_* names are the original transcript-only settings, still read for existing env files.
+    BATCH_WRITE_MAX_ENTRIES: int = Field(20, validation_alias=AliasChoices("BATCH_WRITE_MAX_ENTRIES", "TRANSCRIPT_FLUSH_MAX_ENTRIES"))
+    BATCH_WRITE_INTERVAL_SECONDS: float = Field(2.0, validation_alias=AliasChoices("BATCH_WRITE_INTERVAL_SECONDS", "TRANSCRIPT_FLUSH_INTERVAL_SECONDS"))
+    BATCH_WRITE_MAX_PENDING: int = Field(5000, validation_alias=AliasChoices("BATCH_WRITE_MAX_PENDING", "TRANSCRIPT_MAX_PENDING"))
+    BATCH_WRITE_MAX_ATTEMPTS: int = 8  # a batch still failing transiently after this many attempts is dropped
+
+    # Agent webhooks — pooled HTTP client + background delivery queue
+    WEBHOOK_MAX_CONNECTIONS: int = 100
+    WEBHOOK_MAX_CONCURRENCY_PER_HOST: int = 8
+    WEBHOOK_KEEPALIVE_SECONDS: float = 60.0
+    WEBHOOK_QUEUE_SIZE: int = 1000
+    WEBHOOK_DELIVERY_WORKERS: int = 4
+    WEBHOOK_MAX_ATTEMPTS: int = 3
+
+    # Custom function webhooks — shared pooled httpx client
+    TOOL_HTTP_MAX_CONNECTIONS: int = 100
+    TOOL_HTTP_MAX_KEEPALIVE: int = 20
+    TOOL_HTTP_KEEPALIVE_SECONDS: float = 60.0
+
+    # Custom function webhooks — per-endpoint circuit breaker and hedged requests
+    TOOL_BREAKER_WINDOW_SECONDS: float = 60.0
+    TOOL_BREAKER_MIN_REQUESTS: int = 5
+    TOOL_BREAKER_FAILURE_RATE: float = 0.5
+    TOOL_BREAKER_SLOW_CALL_SECONDS: float = 5.0
+    TOOL_BREAKER_OPEN_SECONDS: float = 30.0
+    TOOL_HEDGE_MIN_DELAY_SECONDS: float = 0.2
+    TOOL_HEDGE_DEFAULT_DELAY_SECONDS: float = 1.0
+
+    # Post-call job queue (consumer: python -m app.tasks.post_call_worker)
+    POST_CALL_QUEUE_ENABLED: bool = True
+    POST_CALL_MAX_ATTEMPTS: int = 5
+    POST_CALL_CONCURRENCY: int = 8
+    POST_CALL_POLL_INTERVAL_SECONDS: float = 1.0
+    POST_CALL_VISIBILITY_TIMEOUT_SECONDS: int = 300
+    # Warn when a due job has waited this long unclaimed (no consumer running)
+    POST_CALL_UNCLAIMED_WARN_SECONDS: int = 300
+
+    # Worker config cache (agents / knowledge bases / custom functions)
+    CONFIG_CACHE_TTL_SECONDS: float = 30.0
 
     # Security & Compliance
     ALLOWED_ORIGINS: str = ""  # Comma-separated allowed origins, empty = use APP_ENV logic
@@ -52,6 +141,21 @@ class Settings(BaseSettings):
 
     model_config = {"env_file": str(_ENV_FILE), "extra": "ignore"}
 
+    @field_validator(
+        "EMBEDDING_CACHE_PATH", "RAG_QUERY_CACHE_PATH", "INGEST_UPLOAD_DIR", "LOCAL_VECTOR_DIR", "LEXICAL_INDEX_DIR",
+        "NEPALI_STT_SERVER_SOCKET",
+    )
+    @classmethod
+    def _resolve_data_path(cls, value: str) -> str:
+        """Relative paths are relative to backend/, not the working directory.
+
+        The API and the voice worker are started from different directories,
+        and must still share the same vector, lexical and cache stores.
+        """
+        if not value or Path(value).is_absolute():
+            return value
+        return str(_BACKEND_DIR / value)
+
     def get_allowed_origins(self) -> list[str]:
         """Return parsed list of allowed origins."""
         if self.ALLOWED_ORIGINS:
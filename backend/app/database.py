@@ -1,7 +1,23 @@
+"""Supabase client and non-blocking query execution.
+
+``get_supabase()`` returns the process-wide sync client. Its PostgREST session
+is a single pooled HTTP/2 ``httpx.Client`` with keep-alive, so connections are
+reused across requests. Building a query is pure and cheap; only
+``.execute()`` does network I/O, so async code must never call it directly —
+hand the built query to ``run_query()`` instead, which executes it on a bounded
+thread pool and keeps the event loop (and every live call's audio) free:
+
+    result = await run_query(db.table("agents").select("*").eq("id", agent_id))
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+
 from supabase import create_client, Client
 from app.config import settings
 
 _client: Client | None = None
+_executor: ThreadPoolExecutor | None = None
 
 
 def get_supabase() -> Client:
@@ -11,6 +27,27 @@ def get_supabase() -> Client:
     return _client
 
 
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=settings.DB_POOL_SIZE,
+            thread_name_prefix="supabase",
+        )
+    return _executor
+
+
+async def run_sync(fn: Callable[..., Any], *args) -> Any:
+    """Run a blocking DB-bound callable on the bounded Supabase thread pool."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), fn, *args)
+
+
+async def run_query(query) -> Any:
+    """Execute a built PostgREST query off the event loop and return its response."""
+    return await run_sync(query.execute)
+
+
 MIGRATION_SQL = """
 CREATE EXTENSION IF NOT EXISTS "uuid-ossp";
 
@@ -206,4 +243,60 @@ CREATE TABLE IF NOT EXISTS consent_records (
 );
 
 CREATE INDEX IF NOT EXISTS idx_consent_records_call_id ON consent_records(call_id);
+
+-- Post-call job queue (consumed by app.tasks.post_call_worker)
+CREATE TABLE IF NOT EXISTS post_call_jobs (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    call_id UUID REFERENCES calls(id) ON DELETE CASCADE,
+    agent_id UUID REFERENCES agents(id) ON DELETE CASCADE,
+    stage TEXT NOT NULL,
+    payload JSONB DEFAULT '{}'::jsonb,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INT NOT NULL DEFAULT 0,
+    max_attempts INT NOT NULL DEFAULT 5,
+    run_after TIMESTAMPTZ DEFAULT now(),
+    locked_at TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ DEFAULT now(),
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS idx_post_call_jobs_due ON post_call_jobs(status, run_after);
+
+-- Opt-in per-function webhook response cache (see app.services.response_cache)
+ALTER TABLE custom_functions ADD COLUMN IF NOT EXISTS response_cache JSONB;
+
+-- Hedged requests + per-endpoint circuit breaker state shared by voice job processes
+ALTER TABLE custom_functions ADD COLUMN IF NOT EXISTS hedge_requests BOOLEAN DEFAULT false;
+
+-- Earlier versions kept one row per worker process; the rows are disposable snapshots
+DO $$ BEGIN
+    IF EXISTS (SELECT 1 FROM information_schema.columns
+               WHERE table_name = 'webhook_circuit_breakers' AND column_name = 'worker_id') THEN
+        DROP TABLE webhook_circuit_breakers;
+    END IF;
+END $$;
+
+CREATE TABLE IF NOT EXISTS webhook_circuit_breakers (
+    endpoint TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    requests INT DEFAULT 0,
+    failure_rate REAL DEFAULT 0,
+    latency_p50_ms REAL,
+    latency_p95_ms REAL,
+    rejected INT DEFAULT 0,
+    hedges INT DEFAULT 0,
+    hedge_wins INT DEFAULT 0,
+    -- Shared rolling window, [epoch seconds, failed, latency_ms] per request
+    samples JSONB DEFAULT '[]'::jsonb,
+    opened_at TIMESTAMPTZ,
+    state_changed_at TIMESTAMPTZ,
+    updated_at TIMESTAMPTZ DEFAULT now()
+);
+
+-- Streaming ingestion progress for knowledge base files
+ALTER TABLE knowledge_base_files ADD COLUMN IF NOT EXISTS progress JSONB DEFAULT '{}';
+
+-- Content-addressed vector ids of each file's chunks (diff-based re-indexing)
+ALTER TABLE knowledge_base_files ADD COLUMN IF NOT EXISTS chunk_ids JSONB;
 """
@@ -114,6 +114,21 @@ app.include_router(chat_conversations.router, prefix="/api/chat-conversations",
 app.include_router(compliance.router, prefix="/api/compliance", tags=["compliance"], dependencies=_auth)
 
 
+# ── Lifecycle ───────────────────────────────────────────────────
+
+
+@app.on_event("startup")
+async def startup():
+    from app.services import ingestion_jobs
+    await ingestion_jobs.recover()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    from app.services import ingestion_jobs
+    await ingestion_jobs.shutdown()
+
+
 # ── Error handler — sanitized, no internal details ──────────────
 
 
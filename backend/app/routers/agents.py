@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from app.database import get_supabase
+from app.database import get_supabase, run_query
+from app.services import config_cache
 
 router = APIRouter()
 
@@ -35,14 +36,14 @@ class AgentUpdate(BaseModel):
 @router.get("")
 async def list_agents():
     db = get_supabase()
-    result = db.table("agents").select("*").order("created_at", desc=True).execute()
+    result = await run_query(db.table("agents").select("*").order("created_at", desc=True))
     return result.data
 
 
 @router.get("/{agent_id}")
 async def get_agent(agent_id: str):
     db = get_supabase()
-    result = db.table("agents").select("*").eq("id", agent_id).execute()
+    result = await run_query(db.table("agents").select("*").eq("id", agent_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Agent not found")
     return result.data[0]
@@ -52,7 +53,7 @@ async def get_agent(agent_id: str):
 async def create_agent(agent: AgentCreate):
     db = get_supabase()
     data = agent.model_dump(exclude_none=True)
-    result = db.table("agents").insert(data).execute()
+    result = await run_query(db.table("agents").insert(data))
     return result.data[0]
 
 
@@ -63,14 +64,16 @@ async def update_agent(agent_id: str, agent: AgentUpdate):
     if not data:
         raise HTTPException(status_code=400, detail="No fields to update")
     data["updated_at"] = "now()"
-    result = db.table("agents").update(data).eq("id", agent_id).execute()
+    result = await run_query(db.table("agents").update(data).eq("id", agent_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Agent not found")
+    config_cache.agents.invalidate(agent_id)
     return result.data[0]
 
 
 @router.delete("/{agent_id}")
 async def delete_agent(agent_id: str):
     db = get_supabase()
-    db.table("agents").delete().eq("id", agent_id).execute()
+    await run_query(db.table("agents").delete().eq("id", agent_id))
+    config_cache.agents.invalidate(agent_id)
     return {"deleted": True}
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from app.database import get_supabase
+from app.database import get_supabase, run_query
 from app.pii import mask_phone_number
 
 router = APIRouter()
@@ -21,12 +21,11 @@ class OutboundCallRequest(BaseModel):
 @router.get("")
 async def list_calls():
     db = get_supabase()
-    result = (
+    result = await run_query(
         db.table("calls")
         .select("*, agents(name)")
         .order("started_at", desc=True)
         .limit(100)
-        .execute()
     )
     return [_mask_call(c) for c in result.data]
 
@@ -34,7 +33,7 @@ async def list_calls():
 @router.get("/{call_id}")
 async def get_call(call_id: str):
     db = get_supabase()
-    result = db.table("calls").select("*, agents(name)").eq("id", call_id).execute()
+    result = await run_query(db.table("calls").select("*, agents(name)").eq("id", call_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Call not found")
     return _mask_call(result.data[0])
@@ -44,21 +43,19 @@ async def get_call(call_id: str):
 async def get_transcript(call_id: str):
     db = get_supabase()
 
-    transcript = (
+    transcript = (await run_query(
         db.table("transcript_entries")
         .select("*")
         .eq("call_id", call_id)
         .order("timestamp", desc=False)
-        .execute()
-    ).data or []
+    )).data or []
 
-    tool_calls = (
+    tool_calls = (await run_query(
         db.table("function_call_logs")
         .select("*")
         .eq("call_id", call_id)
         .order("executed_at", desc=False)
-        .execute()
-    ).data or []
+    )).data or []
 
     # Normalize tool calls into the same shape as transcript entries
     tool_items = [
@@ -88,12 +85,12 @@ async def make_outbound_call(req: OutboundCallRequest):
     db = get_supabase()
 
     # Create call record
-    call_result = db.table("calls").insert({
+    call_result = await run_query(db.table("calls").insert({
         "agent_id": req.agent_id,
         "direction": "outbound",
         "caller_number": req.to_number,
         "status": "queued",
-    }).execute()
+    }))
 
     if not call_result.data:
         raise HTTPException(status_code=500, detail="Failed to create call record")
@@ -112,5 +109,5 @@ async def make_outbound_call(req: OutboundCallRequest):
 @router.delete("/{call_id}")
 async def delete_call(call_id: str):
     db = get_supabase()
-    db.table("calls").delete().eq("id", call_id).execute()
+    await run_query(db.table("calls").delete().eq("id", call_id))
     return {"deleted": True}
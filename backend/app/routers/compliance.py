@@ -7,7 +7,7 @@ from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel, field_validator
 
 from app.config import settings
-from app.database import get_supabase
+from app.database import get_supabase, run_query
 from app.audit import log_audit_event
 from app.pii import redact_pii_from_transcript
 
@@ -41,12 +41,12 @@ def _normalize_phone(phone: str) -> list[str]:
     return list(variants)
 
 
-def _get_call_ids_for_phone(db, phone: str) -> list[str]:
+async def _get_call_ids_for_phone(db, phone: str) -> list[str]:
     """Return all call IDs matching any variant of the given phone number."""
     variants = _normalize_phone(phone)
     all_ids: list[str] = []
     for variant in variants:
-        result = db.table("calls").select("id").eq("caller_number", variant).execute()
+        result = await run_query(db.table("calls").select("id").eq("caller_number", variant))
         all_ids.extend(c["id"] for c in (result.data or []))
     return list(set(all_ids))  # deduplicate
 
@@ -100,7 +100,7 @@ async def data_export(req: DataExportRequest, request: Request):
     """Export all data associated with a phone number (APP 12 compliance)."""
     db = get_supabase()
 
-    call_ids = _get_call_ids_for_phone(db, req.phone_number)
+    call_ids = await _get_call_ids_for_phone(db, req.phone_number)
 
     calls_data: list[dict] = []
     transcripts: list[dict] = []
@@ -109,22 +109,16 @@ async def data_export(req: DataExportRequest, request: Request):
 
     if call_ids:
         # Batch fetch — one query per table
-        calls_result = db.table("calls").select("*").in_("id", call_ids).execute()
+        calls_result = await run_query(db.table("calls").select("*").in_("id", call_ids))
         calls_data = calls_result.data or []
 
-        transcripts_result = (
-            db.table("transcript_entries").select("*").in_("call_id", call_ids).execute()
-        )
+        transcripts_result = await run_query(db.table("transcript_entries").select("*").in_("call_id", call_ids))
         transcripts = transcripts_result.data or []
 
-        logs_result = (
-            db.table("function_call_logs").select("*").in_("call_id", call_ids).execute()
-        )
+        logs_result = await run_query(db.table("function_call_logs").select("*").in_("call_id", call_ids))
         function_logs = logs_result.data or []
 
-        consent_result = (
-            db.table("consent_records").select("*").in_("call_id", call_ids).execute()
-        )
+        consent_result = await run_query(db.table("consent_records").select("*").in_("call_id", call_ids))
         consent_records = consent_result.data or []
 
     ip = request.client.host if request.client else ""
@@ -157,7 +151,7 @@ async def data_deletion(req: DataDeletionRequest, request: Request):
     """Delete/redact all data for a phone number (APP 13 compliance)."""
     db = get_supabase()
 
-    call_ids = _get_call_ids_for_phone(db, req.phone_number)
+    call_ids = await _get_call_ids_for_phone(db, req.phone_number)
 
     deleted_counts = {
         "calls": 0,
@@ -168,40 +162,34 @@ async def data_deletion(req: DataDeletionRequest, request: Request):
 
     if call_ids:
         # Redact all transcript entries in one update per batch
-        transcripts_result = (
-            db.table("transcript_entries").select("id").in_("call_id", call_ids).execute()
-        )
+        transcripts_result = await run_query(db.table("transcript_entries").select("id").in_("call_id", call_ids))
         transcript_ids = [e["id"] for e in (transcripts_result.data or [])]
         if transcript_ids:
-            db.table("transcript_entries").update({
+            await run_query(db.table("transcript_entries").update({
                 "content": "[REDACTED — data deletion request]"
-            }).in_("id", transcript_ids).execute()
+            }).in_("id", transcript_ids))
             deleted_counts["transcripts"] = len(transcript_ids)
 
         # Delete function call logs in bulk
-        logs_result = (
-            db.table("function_call_logs").select("id").in_("call_id", call_ids).execute()
-        )
+        logs_result = await run_query(db.table("function_call_logs").select("id").in_("call_id", call_ids))
         log_ids = [e["id"] for e in (logs_result.data or [])]
         if log_ids:
-            db.table("function_call_logs").delete().in_("id", log_ids).execute()
+            await run_query(db.table("function_call_logs").delete().in_("id", log_ids))
             deleted_counts["function_logs"] = len(log_ids)
 
         # Delete consent records in bulk
-        consent_result = (
-            db.table("consent_records").select("id").in_("call_id", call_ids).execute()
-        )
+        consent_result = await run_query(db.table("consent_records").select("id").in_("call_id", call_ids))
         consent_ids = [e["id"] for e in (consent_result.data or [])]
         if consent_ids:
-            db.table("consent_records").delete().in_("id", consent_ids).execute()
+            await run_query(db.table("consent_records").delete().in_("id", consent_ids))
             deleted_counts["consent_records"] = len(consent_ids)
 
         # Redact caller number and mark calls as deleted in bulk
-        db.table("calls").update({
+        await run_query(db.table("calls").update({
             "caller_number": None,
             "pii_redacted": True,
             "summary": "[REDACTED — data deletion request]",
-        }).in_("id", call_ids).execute()
+        }).in_("id", call_ids))
         deleted_counts["calls"] = len(call_ids)
 
     ip = request.client.host if request.client else ""
@@ -239,7 +227,7 @@ async def record_consent(req: ConsentRequest):
         datetime.now(timezone.utc) + timedelta(days=settings.DATA_RETENTION_DAYS)
     ).isoformat()
 
-    result = db.table("consent_records").insert({
+    result = await run_query(db.table("consent_records").insert({
         "call_id": req.call_id,
         "caller_number": req.caller_number,
         "consent_type": req.consent_type,
@@ -247,7 +235,7 @@ async def record_consent(req: ConsentRequest):
         "consent_method": req.consent_method,
         "recorded_at": datetime.now(timezone.utc).isoformat(),
         "expires_at": expires_at,
-    }).execute()
+    }))
 
     return result.data[0] if result.data else {"status": "recorded"}
 
@@ -256,7 +244,7 @@ async def record_consent(req: ConsentRequest):
 async def get_consent(call_id: str):
     """Check consent status for a call."""
     db = get_supabase()
-    result = db.table("consent_records").select("*").eq("call_id", call_id).execute()
+    result = await run_query(db.table("consent_records").select("*").eq("call_id", call_id))
     if not result.data:
         return {"call_id": call_id, "consent_given": False, "records": []}
     return {
@@ -366,5 +354,5 @@ async def list_audit_logs(
     if resource_type:
         query = query.eq("resource_type", resource_type)
 
-    result = query.range(offset, offset + limit - 1).execute()
+    result = await run_query(query.range(offset, offset + limit - 1))
     return result.data or []
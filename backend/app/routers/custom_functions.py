@@ -1,8 +1,10 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
+from datetime import datetime, timezone, timedelta
 import httpx
-from app.database import get_supabase
+from app.database import get_supabase, run_query
+from app.services import config_cache
 
 router = APIRouter()
 
@@ -23,6 +25,8 @@ class FunctionCreate(BaseModel):
     query_params: Optional[dict] = None
     payload_mode: Optional[str] = None
     store_variables: Optional[dict] = None
+    response_cache: Optional[dict] = None
+    hedge_requests: Optional[bool] = None
 
 
 class FunctionUpdate(BaseModel):
@@ -41,6 +45,8 @@ class FunctionUpdate(BaseModel):
     query_params: Optional[dict] = None
     payload_mode: Optional[str] = None
     store_variables: Optional[dict] = None
+    response_cache: Optional[dict] = None
+    hedge_requests: Optional[bool] = None
 
 
 # Base columns from the CREATE TABLE statement (always exist)
@@ -58,14 +64,28 @@ def _strip_to_base_columns(data: dict) -> dict:
 @router.get("")
 async def list_functions():
     db = get_supabase()
-    result = db.table("custom_functions").select("*").order("created_at", desc=True).execute()
+    result = await run_query(db.table("custom_functions").select("*").order("created_at", desc=True))
+    return result.data
+
+
+@router.get("/circuit-breakers")
+async def list_circuit_breakers(max_age_seconds: int = 3600):
+    """Webhook circuit breaker state reported by voice workers, most recent first."""
+    db = get_supabase()
+    since = (datetime.now(timezone.utc) - timedelta(seconds=max_age_seconds)).isoformat()
+    result = await run_query(
+        db.table("webhook_circuit_breakers")
+        .select("*")
+        .gte("updated_at", since)
+        .order("updated_at", desc=True)
+    )
     return result.data
 
 
 @router.get("/{function_id}")
 async def get_function(function_id: str):
     db = get_supabase()
-    result = db.table("custom_functions").select("*").eq("id", function_id).execute()
+    result = await run_query(db.table("custom_functions").select("*").eq("id", function_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Function not found")
     return result.data[0]
@@ -76,11 +96,11 @@ async def create_function(func: FunctionCreate):
     db = get_supabase()
     data = func.model_dump(exclude_none=True)
     try:
-        result = db.table("custom_functions").insert(data).execute()
+        result = await run_query(db.table("custom_functions").insert(data))
     except Exception as e:
         if "PGRST204" in str(e):
             data = _strip_to_base_columns(data)
-            result = db.table("custom_functions").insert(data).execute()
+            result = await run_query(db.table("custom_functions").insert(data))
         else:
             raise
     return result.data[0]
@@ -94,30 +114,33 @@ async def update_function(function_id: str, func: FunctionUpdate):
         raise HTTPException(status_code=400, detail="No fields to update")
     data["updated_at"] = "now()"
     try:
-        result = db.table("custom_functions").update(data).eq("id", function_id).execute()
+        result = await run_query(db.table("custom_functions").update(data).eq("id", function_id))
     except Exception as e:
         if "PGRST204" in str(e):
             data = _strip_to_base_columns(data)
             data["updated_at"] = "now()"
-            result = db.table("custom_functions").update(data).eq("id", function_id).execute()
+            result = await run_query(db.table("custom_functions").update(data).eq("id", function_id))
         else:
             raise
     if not result.data:
         raise HTTPException(status_code=404, detail="Function not found")
+    # Cache is keyed by name and the name itself may have changed
+    config_cache.custom_functions.invalidate()
     return result.data[0]
 
 
 @router.delete("/{function_id}")
 async def delete_function(function_id: str):
     db = get_supabase()
-    db.table("custom_functions").delete().eq("id", function_id).execute()
+    await run_query(db.table("custom_functions").delete().eq("id", function_id))
+    config_cache.custom_functions.invalidate()
     return {"deleted": True}
 
 
 @router.post("/{function_id}/test")
 async def test_function(function_id: str):
     db = get_supabase()
-    result = db.table("custom_functions").select("*").eq("id", function_id).execute()
+    result = await run_query(db.table("custom_functions").select("*").eq("id", function_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Function not found")
 
@@ -1,15 +1,27 @@
 """Knowledge base CRUD + file management router."""
 from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from typing import Optional
+from pathlib import Path
+import asyncio
+import json
 import logging
-from app.database import get_supabase
+import tempfile
+from app.database import get_supabase, run_query
+from app.services import config_cache, ingestion_jobs
+from app.services.lexical_index import drop_lexical_index, get_lexical_index
+from app.services.query_cache import knowledge_base_changed
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
 ALLOWED_FILE_TYPES = {".pdf", ".txt", ".docx", ".csv"}
 MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
+UPLOAD_READ_SIZE = 1024 * 1024
+SSE_KEEPALIVE_SECONDS = 15
+# Everything but chunk_ids, which can be large
+FILE_LIST_COLUMNS = "id,knowledge_base_id,filename,file_type,file_size,chunk_count,status,error_message,progress,created_at,updated_at"
 
 
 class KBCreate(BaseModel):
@@ -32,7 +44,7 @@ class KBUpdate(BaseModel):
 async def list_knowledge_bases():
     db = get_supabase()
     try:
-        result = db.table("knowledge_bases").select("*").order("created_at", desc=True).execute()
+        result = await run_query(db.table("knowledge_bases").select("*").order("created_at", desc=True))
     except Exception as e:
         logger.warning(f"knowledge_bases table may not exist yet: {e}")
         return []
@@ -41,7 +53,7 @@ async def list_knowledge_bases():
     kbs = result.data or []
     for kb in kbs:
         try:
-            files_result = db.table("knowledge_base_files").select("id", count="exact").eq("knowledge_base_id", kb["id"]).execute()
+            files_result = await run_query(db.table("knowledge_base_files").select("id", count="exact").eq("knowledge_base_id", kb["id"]))
             kb["file_count"] = files_result.count if hasattr(files_result, "count") and files_result.count is not None else len(files_result.data or [])
         except Exception:
             kb["file_count"] = 0
@@ -52,7 +64,7 @@ async def list_knowledge_bases():
 @router.get("/{kb_id}")
 async def get_knowledge_base(kb_id: str):
     db = get_supabase()
-    result = db.table("knowledge_bases").select("*").eq("id", kb_id).execute()
+    result = await run_query(db.table("knowledge_bases").select("*").eq("id", kb_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Knowledge base not found")
     return result.data[0]
@@ -62,7 +74,7 @@ async def get_knowledge_base(kb_id: str):
 async def create_knowledge_base(kb: KBCreate):
     db = get_supabase()
     data = kb.model_dump(exclude_none=True)
-    result = db.table("knowledge_bases").insert(data).execute()
+    result = await run_query(db.table("knowledge_bases").insert(data))
     return result.data[0]
 
 
@@ -73,9 +85,10 @@ async def update_knowledge_base(kb_id: str, kb: KBUpdate):
     if not data:
         raise HTTPException(status_code=400, detail="No fields to update")
     data["updated_at"] = "now()"
-    result = db.table("knowledge_bases").update(data).eq("id", kb_id).execute()
+    result = await run_query(db.table("knowledge_bases").update(data).eq("id", kb_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Knowledge base not found")
+    config_cache.knowledge_bases.invalidate(kb_id)
     return result.data[0]
 
 
@@ -84,20 +97,22 @@ async def delete_knowledge_base(kb_id: str):
     db = get_supabase()
 
     # Get KB config for vector cleanup
-    kb_result = db.table("knowledge_bases").select("*").eq("id", kb_id).execute()
+    kb_result = await run_query(db.table("knowledge_bases").select("*").eq("id", kb_id))
     if kb_result.data:
         kb = kb_result.data[0]
         try:
-            from app.services.vector_db import get_provider
-            provider = get_provider(kb["provider"], kb.get("config", {}))
+            from app.services.vector_db import acquire_provider
+            provider = await acquire_provider(kb["provider"], kb.get("config", {}))
             namespace = kb.get("config", {}).get("namespace")
             await provider.delete(delete_all=True, namespace=namespace)
             logger.info(f"Cleaned up vectors for KB {kb_id}")
         except Exception as e:
             logger.error(f"Failed to clean up vectors for KB {kb_id}: {e}")
+    drop_lexical_index(kb_id)
 
-    db.table("knowledge_base_files").delete().eq("knowledge_base_id", kb_id).execute()
-    db.table("knowledge_bases").delete().eq("id", kb_id).execute()
+    await run_query(db.table("knowledge_base_files").delete().eq("knowledge_base_id", kb_id))
+    await run_query(db.table("knowledge_bases").delete().eq("id", kb_id))
+    config_cache.knowledge_bases.invalidate(kb_id)
     return {"deleted": True}
 
 
@@ -106,91 +121,191 @@ async def delete_knowledge_base(kb_id: str):
 @router.get("/{kb_id}/files")
 async def list_files(kb_id: str):
     db = get_supabase()
-    result = db.table("knowledge_base_files").select("*").eq("knowledge_base_id", kb_id).order("created_at", desc=True).execute()
+    result = await run_query(db.table("knowledge_base_files").select(FILE_LIST_COLUMNS).eq("knowledge_base_id", kb_id).order("created_at", desc=True))
     return result.data
 
 
-@router.post("/{kb_id}/files")
-async def upload_file(kb_id: str, file: UploadFile = File(...)):
+async def _get_kb(kb_id: str) -> dict:
     db = get_supabase()
-
-    # Verify KB exists
-    kb_result = db.table("knowledge_bases").select("*").eq("id", kb_id).execute()
+    kb_result = await run_query(db.table("knowledge_bases").select("*").eq("id", kb_id))
     if not kb_result.data:
         raise HTTPException(status_code=404, detail="Knowledge base not found")
-    kb = kb_result.data[0]
+    return kb_result.data[0]
+
 
-    # Validate file type
+def _validate_filename(file: UploadFile) -> tuple[str, str]:
     filename = file.filename or "unknown"
     ext = "." + filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
     if ext not in ALLOWED_FILE_TYPES:
         raise HTTPException(status_code=400, detail=f"Unsupported file type: {ext}. Allowed: {', '.join(ALLOWED_FILE_TYPES)}")
+    return filename, ext
 
-    # Read file content
-    content = await file.read()
-    file_size = len(content)
-    if file_size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=400, detail=f"File too large. Max: {MAX_FILE_SIZE // (1024*1024)}MB")
-
-    # Create file record
-    file_record = db.table("knowledge_base_files").insert({
-        "knowledge_base_id": kb_id,
-        "filename": filename,
-        "file_type": ext.lstrip("."),
-        "file_size": file_size,
-        "status": "processing",
-    }).execute()
-
-    file_id = file_record.data[0]["id"]
 
-    # Process: parse → chunk → embed → upsert
+async def _spool_upload(file: UploadFile, ext: str) -> tuple[str, int]:
+    """Stream the upload to disk so large files are never held in memory. Returns (path, size)."""
+    tmp = tempfile.NamedTemporaryFile(dir=ingestion_jobs.upload_dir(), suffix=ext, delete=False)
     try:
-        from app.services.vector_db import get_provider
-        from app.services.document_processor import process_and_upsert
-
-        provider = get_provider(kb["provider"], kb.get("config", {}))
-        namespace = kb.get("config", {}).get("namespace")
-        chunk_count = await process_and_upsert(content, filename, file_id, provider, namespace=namespace)
-
-        db.table("knowledge_base_files").update({
-            "status": "completed",
-            "chunk_count": chunk_count,
-            "updated_at": "now()",
-        }).eq("id", file_id).execute()
+        file_size = 0
+        while block := await file.read(UPLOAD_READ_SIZE):
+            file_size += len(block)
+            if file_size > MAX_FILE_SIZE:
+                raise HTTPException(status_code=400, detail=f"File too large. Max: {MAX_FILE_SIZE // (1024*1024)}MB")
+            await asyncio.to_thread(tmp.write, block)
+    except BaseException:
+        tmp.close()
+        Path(tmp.name).unlink(missing_ok=True)
+        raise
+    tmp.close()
+    return tmp.name, file_size
+
+
+@router.post("/{kb_id}/files", status_code=202)
+async def upload_file(kb_id: str, file: UploadFile = File(...)):
+    """Store the upload and queue it for ingestion; poll ``/status`` or follow ``/events`` for progress."""
+    db = get_supabase()
+    kb = await _get_kb(kb_id)
+    filename, ext = _validate_filename(file)
 
-        return {**file_record.data[0], "status": "completed", "chunk_count": chunk_count}
-    except Exception as e:
-        logger.error(f"File processing error for {filename}: {e}", exc_info=True)
-        db.table("knowledge_base_files").update({
-            "status": "failed",
-            "error_message": str(e),
+    # The ingestion job deletes the spooled upload when done
+    path, file_size = await _spool_upload(file, ext)
+    try:
+        file_record = await run_query(db.table("knowledge_base_files").insert({
+            "knowledge_base_id": kb_id,
+            "filename": filename,
+            "file_type": ext.lstrip("."),
+            "file_size": file_size,
+            "status": "queued",
+        }))
+        record = file_record.data[0]
+        path = ingestion_jobs.claim_upload(path, record["id"], ext)
+        ingestion_jobs.submit(record["id"], kb, path, filename)
+    except BaseException:
+        Path(path).unlink(missing_ok=True)
+        raise
+    return record
+
+
+@router.put("/{kb_id}/files/{file_id}", status_code=202)
+async def replace_file(kb_id: str, file_id: str, file: UploadFile = File(...)):
+    """Upload a revised version of a file. Only chunks whose text changed are embedded and upserted;
+    chunks that no longer exist are deleted once the new version is indexed."""
+    db = get_supabase()
+    kb = await _get_kb(kb_id)
+    filename, ext = _validate_filename(file)
+
+    file_result = await run_query(
+        db.table("knowledge_base_files").select("id,chunk_count,chunk_ids").eq("id", file_id).eq("knowledge_base_id", kb_id)
+    )
+    if not file_result.data:
+        raise HTTPException(status_code=404, detail="File not found")
+    if ingestion_jobs.is_active(file_id):
+        raise HTTPException(status_code=409, detail="File is still being ingested")
+    existing_ids = _vector_ids(file_id, file_result.data[0])
+
+    path, file_size = await _spool_upload(file, ext)
+    try:
+        result = await run_query(db.table("knowledge_base_files").update({
+            "filename": filename,
+            "file_type": ext.lstrip("."),
+            "file_size": file_size,
+            "status": "queued",
+            "error_message": None,
             "updated_at": "now()",
-        }).eq("id", file_id).execute()
-        raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+        }).eq("id", file_id))
+        path = ingestion_jobs.claim_upload(path, file_id, ext)
+        ingestion_jobs.submit(file_id, kb, path, filename, existing_ids=existing_ids)
+    except BaseException:
+        Path(path).unlink(missing_ok=True)
+        raise
+    return {key: value for key, value in result.data[0].items() if key != "chunk_ids"}
+
+
+def _vector_ids(file_id: str, row: dict) -> list[str]:
+    """Ids of a file's vectors: recorded chunk ids, or positional ids for files indexed before they were recorded."""
+    from app.services.document_processor import legacy_chunk_ids
+    if row.get("chunk_ids") is not None:
+        return row["chunk_ids"]
+    return legacy_chunk_ids(file_id, row.get("chunk_count") or 0)
+
+
+async def _file_status(kb_id: str, file_id: str) -> dict:
+    job = ingestion_jobs.get_job(file_id)
+    if job is not None:
+        return job.snapshot()
+    # Not ingested by this process (or long finished) — report what the file row says
+    db = get_supabase()
+    result = await run_query(
+        db.table("knowledge_base_files").select(FILE_LIST_COLUMNS).eq("id", file_id).eq("knowledge_base_id", kb_id)
+    )
+    if not result.data:
+        raise HTTPException(status_code=404, detail="File not found")
+    row = result.data[0]
+    return {
+        **(row.get("progress") or {}),
+        "file_id": file_id,
+        "filename": row["filename"],
+        "stage": (row.get("progress") or {}).get("stage") or row.get("status"),
+        "chunks": row.get("chunk_count") or 0,
+        "error": row.get("error_message"),
+    }
+
+
+@router.get("/{kb_id}/files/{file_id}/status")
+async def get_file_status(kb_id: str, file_id: str):
+    """Ingestion stage, chunk progress and throughput for an uploaded file."""
+    return await _file_status(kb_id, file_id)
+
+
+@router.get("/{kb_id}/files/{file_id}/events")
+async def stream_file_status(kb_id: str, file_id: str):
+    """Server-sent events: the file status on every ingestion update, until it finishes."""
+    initial = await _file_status(kb_id, file_id)
+
+    async def events():
+        status = initial
+        yield f"data: {json.dumps(status)}\n\n"
+        job = ingestion_jobs.get_job(file_id)
+        while job is not None and status["stage"] not in ingestion_jobs.TERMINAL_STAGES:
+            if await job.wait_for_update(timeout=SSE_KEEPALIVE_SECONDS):
+                status = job.snapshot()
+                yield f"data: {json.dumps(status)}\n\n"
+            else:
+                yield ": keepalive\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
 
 
 @router.delete("/{kb_id}/files/{file_id}")
 async def delete_file(kb_id: str, file_id: str):
     db = get_supabase()
 
+    # Stop an ingestion still running for this file (it rolls back what it added)
+    await ingestion_jobs.cancel(file_id)
+
     # Get KB for vector cleanup
-    kb_result = db.table("knowledge_bases").select("*").eq("id", kb_id).execute()
+    kb_result = await run_query(db.table("knowledge_bases").select("*").eq("id", kb_id))
     if kb_result.data:
         kb = kb_result.data[0]
-        # Get chunk count to know how many vector IDs to delete
-        file_result = db.table("knowledge_base_files").select("chunk_count").eq("id", file_id).execute()
+        file_result = await run_query(db.table("knowledge_base_files").select("chunk_count,chunk_ids").eq("id", file_id))
         if file_result.data:
-            chunk_count = file_result.data[0].get("chunk_count", 0) or 0
-            if chunk_count > 0:
+            vector_ids = _vector_ids(file_id, file_result.data[0])
+            if vector_ids:
                 try:
-                    from app.services.vector_db import get_provider
-                    provider = get_provider(kb["provider"], kb.get("config", {}))
+                    from app.services.vector_db import acquire_provider
+                    provider = await acquire_provider(kb["provider"], kb.get("config", {}))
                     namespace = kb.get("config", {}).get("namespace")
-                    vector_ids = [f"{file_id}_{i}" for i in range(chunk_count)]
                     await provider.delete(ids=vector_ids, namespace=namespace)
-                    logger.info(f"Deleted {chunk_count} vectors for file {file_id}")
+                    logger.info(f"Deleted {len(vector_ids)} vectors for file {file_id}")
                 except Exception as e:
                     logger.error(f"Failed to delete vectors for file {file_id}: {e}")
 
-    db.table("knowledge_base_files").delete().eq("id", file_id).execute()
+    lexical_index = get_lexical_index(kb_id)
+    if lexical_index is not None and lexical_index.exists():
+        try:
+            await lexical_index.delete(file_id=file_id)
+        except Exception as e:
+            logger.error(f"Failed to delete lexical index entries for file {file_id}: {e}")
+    await knowledge_base_changed(kb_id)
+
+    await run_query(db.table("knowledge_base_files").delete().eq("id", file_id))
     return {"deleted": True}
@@ -3,7 +3,7 @@ import logging
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
-from app.database import get_supabase
+from app.database import get_supabase, run_query
 from app.services.livekit_service import generate_token, create_room, list_rooms
 from app.config import settings
 
@@ -30,11 +30,11 @@ async def get_livekit_token(req: TokenRequest):
     db = get_supabase()
 
     # Create call record
-    call_result = db.table("calls").insert({
+    call_result = await run_query(db.table("calls").insert({
         "agent_id": req.agent_id,
         "direction": "inbound",
         "status": "in-progress",
-    }).execute()
+    }))
 
     if not call_result.data:
         raise HTTPException(status_code=500, detail="Failed to create call record")
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from app.database import get_supabase
+from app.database import get_supabase, run_query
 from app.config import settings
 import logging
 
@@ -17,11 +17,10 @@ class UpdatePhoneNumber(BaseModel):
 @router.get("")
 async def list_phone_numbers():
     db = get_supabase()
-    result = (
+    result = await run_query(
         db.table("phone_numbers")
         .select("*, agents(id, name)")
         .order("created_at", desc=False)
-        .execute()
     )
     return result.data
 
@@ -39,23 +38,22 @@ async def sync_phone_numbers():
     synced = []
 
     for number in incoming_numbers:
-        existing = (
+        existing = await run_query(
             db.table("phone_numbers")
             .select("id")
             .eq("phone_number", number.phone_number)
-            .execute()
         )
         if existing.data:
-            db.table("phone_numbers").update({
+            await run_query(db.table("phone_numbers").update({
                 "friendly_name": number.friendly_name,
                 "updated_at": "now()",
-            }).eq("phone_number", number.phone_number).execute()
+            }).eq("phone_number", number.phone_number))
             synced.append({"phone_number": number.phone_number, "action": "updated"})
         else:
-            db.table("phone_numbers").insert({
+            await run_query(db.table("phone_numbers").insert({
                 "phone_number": number.phone_number,
                 "friendly_name": number.friendly_name,
-            }).execute()
+            }))
             synced.append({"phone_number": number.phone_number, "action": "created"})
 
     return {"synced": synced, "count": len(synced)}
@@ -66,7 +64,7 @@ async def update_phone_number(phone_id: str, data: UpdatePhoneNumber):
     db = get_supabase()
     update = {k: v for k, v in data.model_dump().items() if v is not None}
     update["updated_at"] = "now()"
-    result = db.table("phone_numbers").update(update).eq("id", phone_id).execute()
+    result = await run_query(db.table("phone_numbers").update(update).eq("id", phone_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Phone number not found")
     return result.data[0]
@@ -81,7 +79,7 @@ async def configure_phone_number(phone_id: str):
     now just returns the current phone number configuration status.
     """
     db = get_supabase()
-    result = db.table("phone_numbers").select("*").eq("id", phone_id).execute()
+    result = await run_query(db.table("phone_numbers").select("*").eq("id", phone_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="Phone number not found")
 
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-from app.database import get_supabase
+from app.database import get_supabase, run_query
 
 router = APIRouter()
 
@@ -27,14 +27,14 @@ class SystemPromptUpdate(BaseModel):
 @router.get("")
 async def list_prompts():
     db = get_supabase()
-    result = db.table("system_prompts").select("*").order("created_at", desc=True).execute()
+    result = await run_query(db.table("system_prompts").select("*").order("created_at", desc=True))
     return result.data
 
 
 @router.get("/{prompt_id}")
 async def get_prompt(prompt_id: str):
     db = get_supabase()
-    result = db.table("system_prompts").select("*").eq("id", prompt_id).execute()
+    result = await run_query(db.table("system_prompts").select("*").eq("id", prompt_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="System prompt not found")
     return result.data[0]
@@ -44,7 +44,7 @@ async def get_prompt(prompt_id: str):
 async def create_prompt(prompt: SystemPromptCreate):
     db = get_supabase()
     data = prompt.model_dump(exclude_none=True)
-    result = db.table("system_prompts").insert(data).execute()
+    result = await run_query(db.table("system_prompts").insert(data))
     return result.data[0]
 
 
@@ -55,7 +55,7 @@ async def update_prompt(prompt_id: str, prompt: SystemPromptUpdate):
     if not data:
         raise HTTPException(status_code=400, detail="No fields to update")
     data["updated_at"] = "now()"
-    result = db.table("system_prompts").update(data).eq("id", prompt_id).execute()
+    result = await run_query(db.table("system_prompts").update(data).eq("id", prompt_id))
     if not result.data:
         raise HTTPException(status_code=404, detail="System prompt not found")
     return result.data[0]
@@ -64,5 +64,5 @@ async def update_prompt(prompt_id: str, prompt: SystemPromptUpdate):
 @router.delete("/{prompt_id}")
 async def delete_prompt(prompt_id: str):
     db = get_supabase()
-    db.table("system_prompts").delete().eq("id", prompt_id).execute()
+    await run_query(db.table("system_prompts").delete().eq("id", prompt_id))
     return {"deleted": True}
@@ -0,0 +1,205 @@
+"""Buffered, batched writers for append-only worker tables.
+
+The worker used to insert one row per utterance (``transcript_entries``) and
+insert-then-update one row per tool call (``function_call_logs``), each a
+blocking round-trip on the call's critical path. A ``BatchWriter`` instead
+buffers rows in memory and writes them as bulk inserts when either
+``BATCH_WRITE_MAX_ENTRIES`` rows are pending or
+``BATCH_WRITE_INTERVAL_SECONDS`` has passed since the first pending row, and
+on demand via ``flush()`` (call end, before reading rows back).
+
+Each row is stamped with its own timestamp column when it is added (unless the
+caller set it), so ordering by that column matches the conversation
+regardless of when the batch lands. A single flusher drains the buffer in FIFO
+order. A batch that fails transiently (connection errors, 5xx, timeouts) is
+put back at the head and retried with exponential backoff, and given up on
+(dropped and logged) after ``BATCH_WRITE_MAX_ATTEMPTS`` attempts so later
+rows are not held up behind it forever. A batch the database rejects
+outright (PostgREST 4xx — e.g. a foreign key violation for a deleted call,
+a malformed row) is bisected until the offending rows are isolated; those
+are dropped and logged and the rest are written. The buffer is bounded by
+``BATCH_WRITE_MAX_PENDING`` — if the database stays down long enough to hit
+it, the oldest rows are dropped (and logged) rather than growing without
+limit.
+"""
+import asyncio
+import logging
+from collections import deque
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.database import get_supabase, run_query
+
+logger = logging.getLogger(__name__)
+
+_MAX_BACKOFF_SECONDS = 30.0
+
+# SQLSTATE classes that reject the rows themselves: data exception, integrity
+# constraint violation, syntax error or access rule violation (e.g. unknown column)
+_PERMANENT_SQLSTATE_CLASSES = ("22", "23", "42")
+
+
+def is_permanent_error(error: Exception) -> bool:
+    """True when retrying the same rows cannot succeed (PostgREST rejected the request itself)."""
+    code = getattr(error, "code", None)
+    if code is None:
+        return False  # connection errors, timeouts
+    code = str(code)
+    if code.isdigit() and len(code) == 3:
+        # PostgREST answered without a JSON error body: fall back to the HTTP status
+        status = int(code)
+        return 400 <= status < 500 and status not in (408, 429)
+    if code.startswith(("PGRST1", "PGRST2")):
+        # Malformed request / schema errors (PGRST0xx are connection errors, PGRST3xx auth)
+        return True
+    return code[:2] in _PERMANENT_SQLSTATE_CLASSES
+
+
+class BatchWriter:
+    def __init__(
+        self,
+        table: str,
+        timestamp_column: str,
+        batch_size: int | None = None,
+        flush_interval: float | None = None,
+        max_pending: int | None = None,
+        max_attempts: int | None = None,
+    ):
+        self.table = table
+        self.timestamp_column = timestamp_column
+        self.batch_size = batch_size or settings.BATCH_WRITE_MAX_ENTRIES
+        self.flush_interval = flush_interval or settings.BATCH_WRITE_INTERVAL_SECONDS
+        self.max_pending = max_pending or settings.BATCH_WRITE_MAX_PENDING
+        self.max_attempts = max_attempts or settings.BATCH_WRITE_MAX_ATTEMPTS
+        self._pending: deque[dict] = deque()
+        self._lock = asyncio.Lock()
+        self._wakeup = asyncio.Event()
+        self._task: asyncio.Task | None = None
+        self._failures = 0
+        self.written = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    def add(self, row: dict) -> None:
+        """Queue one row. Never blocks and never raises."""
+        row.setdefault(self.timestamp_column, datetime.now(timezone.utc).isoformat())
+        self._pending.append(row)
+        self._enforce_bound()
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+            self._wakeup.set()
+
+    async def flush(self) -> bool:
+        """Write every pending row now. Returns False if a batch failed transiently (it stays queued)."""
+        async with self._lock:
+            while self._pending:
+                batch = [self._pending.popleft() for _ in range(min(self.batch_size, len(self._pending)))]
+                unwritten, error = await self._write(batch)
+                if error is None:
+                    self._failures = 0
+                    continue
+                self._failures += 1
+                if self._failures >= self.max_attempts:
+                    self.dropped += len(unwritten)
+                    self._failures = 0
+                    logger.error(
+                        f"Batch write [{self.table}] gave up after {self.max_attempts} attempts — "
+                        f"dropped {len(unwritten)} rows: {error}"
+                    )
+                    continue
+                # Put the unwritten rows back at the head so order is preserved on retry
+                self._pending.extendleft(reversed(unwritten))
+                self._enforce_bound()
+                logger.warning(
+                    f"Batch write [{self.table}] failed ({len(self._pending)} pending, "
+                    f"attempt {self._failures}): {error}"
+                )
+                return False
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "written": self.written,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+        }
+
+    # ── Internals ─────────────────────────────────────────────────
+
+    async def _write(self, batch: list[dict]) -> tuple[list[dict], Exception | None]:
+        """Insert ``batch``, isolating rows the database rejects. Returns (rows not yet written, transient error)."""
+        parts = [batch]
+        while parts:
+            rows = parts.pop(0)
+            try:
+                await run_query(get_supabase().table(self.table).insert(rows))
+            except Exception as e:
+                if not is_permanent_error(e):
+                    return [row for part in [rows, *parts] for row in part], e
+                if len(rows) > 1:
+                    # Bisect, keeping order, until the rejected rows are on their own
+                    mid = len(rows) // 2
+                    parts[:0] = [rows[:mid], rows[mid:]]
+                    continue
+                self.rejected += 1
+                logger.error(
+                    f"Batch write [{self.table}] rejected row for call {rows[0].get('call_id')} — dropped: {e}"
+                )
+                continue
+            self.written += len(rows)
+            logger.info(f"Batch write [{self.table}]: wrote {len(rows)} rows")
+        return [], None
+
+    def _enforce_bound(self) -> None:
+        while len(self._pending) > self.max_pending:
+            row = self._pending.popleft()
+            self.dropped += 1
+            logger.error(f"Batch write [{self.table}] buffer full — dropped row for call {row.get('call_id')}")
+
+    async def _run(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+
+            # Give the batch up to flush_interval to fill before writing it
+            if len(self._pending) < self.batch_size:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+            if not await self.flush():
+                backoff = min(self.flush_interval * (2 ** self._failures), _MAX_BACKOFF_SECONDS)
+                await asyncio.sleep(backoff)
+                self._wakeup.set()
+
+
+_transcript_sink: BatchWriter | None = None
+_function_log_sink: BatchWriter | None = None
+
+
+def get_transcript_sink() -> BatchWriter:
+    """Return the per-worker-process ``transcript_entries`` writer."""
+    global _transcript_sink
+    if _transcript_sink is None:
+        _transcript_sink = BatchWriter("transcript_entries", timestamp_column="timestamp")
+    return _transcript_sink
+
+
+def get_function_log_sink() -> BatchWriter:
+    """Return the per-worker-process ``function_call_logs`` writer."""
+    global _function_log_sink
+    if _function_log_sink is None:
+        _function_log_sink = BatchWriter("function_call_logs", timestamp_column="executed_at")
+    return _function_log_sink
+
+
+async def flush_all() -> None:
+    """Flush every writer created in this process (call end)."""
+    for sink in (_transcript_sink, _function_log_sink):
+        if sink is not None:
+            await sink.flush()
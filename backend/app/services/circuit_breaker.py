@@ -0,0 +1,300 @@
+"""Per-endpoint circuit breakers for custom function webhooks.
+
+Each webhook endpoint (scheme + host + path) gets a breaker that keeps a
+rolling window of the last ``TOOL_BREAKER_WINDOW_SECONDS`` of requests. A
+request counts as failed on a transport error, timeout or 5xx, and as slow
+when it takes longer than ``TOOL_BREAKER_SLOW_CALL_SECONDS``. Once the window
+holds at least ``TOOL_BREAKER_MIN_REQUESTS`` requests and the failed + slow
+share reaches ``TOOL_BREAKER_FAILURE_RATE`` the breaker opens: calls fail
+fast (to the function's ``speak_on_failure``) instead of leaving the caller
+in dead air. After ``TOOL_BREAKER_OPEN_SECONDS`` it goes half-open and lets a
+single probe through; the probe's outcome closes or re-opens it.
+
+The window's p95 latency also drives hedged requests (see
+``hedge_delay()``).
+
+livekit-agents runs each call in its own job process, so one call alone
+rarely sees enough requests to trip a breaker or estimate a p95. The window
+and state are therefore shared through ``webhook_circuit_breakers``, one row
+per endpoint: a breaker loads its endpoint's row when it is created, and
+merges its own requests back into the row on every state change and at the
+end of the call. The API reports the same rows
+(``GET /api/custom-functions/circuit-breakers``).
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+from app.config import settings
+from app.database import get_supabase, run_query
+
+logger = logging.getLogger(__name__)
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+_HEDGE_MIN_SAMPLES = 10
+
+# Newest requests kept in an endpoint's shared row
+_MAX_SHARED_SAMPLES = 500
+
+_COUNTERS = ("rejected", "hedges", "hedge_wins")
+
+
+class EndpointBreaker:
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.state = CLOSED
+        # Wall-clock times, comparable with other processes' published state
+        self.opened_at: float | None = None
+        self.changed_at = 0.0
+        self._probe_inflight = False
+        self._probe_started = 0.0
+        # (wall time, failed, latency_ms) per finished request
+        self._window: deque[tuple[float, bool, float]] = deque()
+        self.rejected = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        # Counter values already added to the shared row
+        self._published = dict.fromkeys(_COUNTERS, 0)
+
+    # ── Admission ────────────────────────────────────────────────
+
+    def allow(self) -> bool:
+        """True if a request may be sent now."""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.time() - self.opened_at >= settings.TOOL_BREAKER_OPEN_SECONDS:
+            self._transition(HALF_OPEN)
+        if self.state == HALF_OPEN:
+            # A probe abandoned without an outcome (e.g. its call was cancelled)
+            # must not hold the breaker half-open forever
+            now = time.monotonic()
+            if not self._probe_inflight or now - self._probe_started >= settings.TOOL_BREAKER_OPEN_SECONDS:
+                self._probe_inflight = True
+                self._probe_started = now
+                return True
+        self.rejected += 1
+        return False
+
+    def record(self, failed: bool, latency_ms: float) -> None:
+        now = time.time()
+        slow = latency_ms > settings.TOOL_BREAKER_SLOW_CALL_SECONDS * 1000
+        self._window.append((now, failed or slow, latency_ms))
+        self._trim(now)
+
+        if self.state == HALF_OPEN:
+            self._probe_inflight = False
+            # Closing starts a fresh window (see _trim)
+            self._transition(OPEN if failed or slow else CLOSED)
+            return
+        self._check_window()
+
+    # ── Window statistics ────────────────────────────────────────
+
+    def failure_rate(self) -> float:
+        if not self._window:
+            return 0.0
+        return sum(1 for _, bad, _ in self._window if bad) / len(self._window)
+
+    def latency_percentile(self, p: float) -> float | None:
+        samples = sorted(lat for _, bad, lat in self._window if not bad)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+    def hedge_delay(self, timeout: float) -> float:
+        """Seconds to wait before sending a hedged second request.
+
+        The window's p95 latency once there are enough samples, otherwise
+        ``TOOL_HEDGE_DEFAULT_DELAY_SECONDS``; never below
+        ``TOOL_HEDGE_MIN_DELAY_SECONDS`` or beyond half the request timeout.
+        """
+        self._trim(time.time())
+        good = sum(1 for _, bad, _ in self._window if not bad)
+        if good >= _HEDGE_MIN_SAMPLES:
+            delay = self.latency_percentile(0.95) / 1000
+        else:
+            delay = settings.TOOL_HEDGE_DEFAULT_DELAY_SECONDS
+        return min(max(delay, settings.TOOL_HEDGE_MIN_DELAY_SECONDS), timeout / 2)
+
+    def snapshot(self) -> dict:
+        self._trim(time.time())
+        p50 = self.latency_percentile(0.50)
+        p95 = self.latency_percentile(0.95)
+        return {
+            "endpoint": self.endpoint,
+            "state": self.state,
+            "requests": len(self._window),
+            "failure_rate": round(self.failure_rate(), 3),
+            "latency_p50_ms": round(p50, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95, 1) if p95 is not None else None,
+            "rejected": self.rejected,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+    # ── Shared state ─────────────────────────────────────────────
+
+    def merge(self, row: dict) -> None:
+        """Fold the endpoint's shared row (other processes' requests and state) into this breaker."""
+        # Samples this process loaded earlier come back in the row; the set drops the duplicates
+        samples = set(self._window)
+        samples.update((t, bool(bad), lat) for t, bad, lat in row.get("samples") or [])
+        self._window = deque(sorted(samples)[-_MAX_SHARED_SAMPLES:])
+
+        changed_at = _from_timestamp(row.get("state_changed_at")) or 0.0
+        if changed_at > self.changed_at:
+            # Another process changed state more recently. Its half-open probe is its
+            # own; here the breaker stays open until this process's own timer runs out.
+            self.state = CLOSED if row.get("state") == CLOSED else OPEN
+            self.opened_at = _from_timestamp(row.get("opened_at")) or changed_at
+            self.changed_at = changed_at
+            self._probe_inflight = False
+        self._trim(time.time())
+
+    def to_row(self, shared: dict | None) -> dict:
+        """The endpoint's row after merging: this breaker's snapshot plus the shared counters."""
+        counters = {
+            name: (shared or {}).get(name, 0) + getattr(self, name) - self._published[name]
+            for name in _COUNTERS
+        }
+        return {
+            **self.snapshot(),
+            **counters,
+            "samples": [list(s) for s in self._window],
+            "opened_at": _to_timestamp(self.opened_at),
+            "state_changed_at": _to_timestamp(self.changed_at),
+        }
+
+    # ── Internals ────────────────────────────────────────────────
+
+    def _check_window(self) -> None:
+        if self.state == CLOSED and len(self._window) >= settings.TOOL_BREAKER_MIN_REQUESTS:
+            if self.failure_rate() >= settings.TOOL_BREAKER_FAILURE_RATE:
+                self._transition(OPEN)
+
+    def _trim(self, now: float) -> None:
+        cutoff = now - settings.TOOL_BREAKER_WINDOW_SECONDS
+        if self.state == CLOSED:
+            # Requests from before the breaker last closed no longer count
+            cutoff = max(cutoff, self.changed_at)
+        while self._window and self._window[0][0] < cutoff:
+            self._window.popleft()
+
+    def _transition(self, state: str) -> None:
+        previous, self.state = self.state, state
+        self.changed_at = time.time()
+        if state == OPEN:
+            self.opened_at = self.changed_at
+            logger.warning(
+                f"Circuit breaker OPEN for {self.endpoint} "
+                f"(failure rate {self.failure_rate():.0%} over {len(self._window)} requests)"
+            )
+        else:
+            logger.info(f"Circuit breaker {previous} → {state} for {self.endpoint}")
+        self._trim(self.changed_at)
+        _in_background(publish_breaker_states([self]))
+
+
+_breakers: dict[str, EndpointBreaker] = {}
+
+
+def endpoint_key(url: str) -> str:
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+
+
+def get_breaker(url: str) -> EndpointBreaker:
+    """The endpoint's breaker; a new one loads the endpoint's shared state in the background."""
+    key = endpoint_key(url)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        breaker = EndpointBreaker(key)
+        _breakers[key] = breaker
+        _in_background(load_breaker_states([breaker]))
+    return breaker
+
+
+def get_breaker_states() -> list[dict]:
+    """Snapshot of every breaker in this process."""
+    return [b.snapshot() for b in _breakers.values()]
+
+
+# ── Shared state (webhook_circuit_breakers) ──────────────────────
+
+def _to_timestamp(t: float | None) -> str | None:
+    return datetime.fromtimestamp(t, timezone.utc).isoformat() if t else None
+
+
+def _from_timestamp(value: str | None) -> float | None:
+    return datetime.fromisoformat(value).timestamp() if value else None
+
+
+async def _fetch_rows(breakers: list[EndpointBreaker]) -> dict[str, dict]:
+    result = await run_query(
+        get_supabase().table("webhook_circuit_breakers")
+        .select("*")
+        .in_("endpoint", [b.endpoint for b in breakers])
+    )
+    return {row["endpoint"]: row for row in result.data or []}
+
+
+async def load_breaker_states(breakers: list[EndpointBreaker]) -> None:
+    """Merge each endpoint's shared row into its breaker."""
+    try:
+        rows = await _fetch_rows(breakers)
+    except Exception as e:
+        logger.debug(f"Failed to load circuit breaker state: {e}")
+        return
+    for breaker in breakers:
+        if breaker.endpoint in rows:
+            breaker.merge(rows[breaker.endpoint])
+            breaker._check_window()
+
+
+async def publish_breaker_states(breakers: list[EndpointBreaker] | None = None) -> None:
+    """Merge breakers into their endpoints' rows in ``webhook_circuit_breakers`` and write them back.
+
+    Read-merge-write rather than a transaction: a request recorded by another
+    process between the read and the write can be lost, which only thins the
+    shared window slightly.
+    """
+    breakers = list(_breakers.values()) if breakers is None else breakers
+    if not breakers:
+        return
+    now = datetime.now(timezone.utc).isoformat()
+    try:
+        shared = await _fetch_rows(breakers)
+        rows, counted = [], []
+        for breaker in breakers:
+            row = shared.get(breaker.endpoint)
+            if row is not None:
+                breaker.merge(row)
+            rows.append({**breaker.to_row(row), "updated_at": now})
+            counted.append({name: getattr(breaker, name) for name in _COUNTERS})
+        await run_query(
+            get_supabase().table("webhook_circuit_breakers")
+            .upsert(rows, on_conflict="endpoint")
+        )
+    except Exception as e:
+        logger.debug(f"Failed to publish circuit breaker state: {e}")
+        return
+    for breaker, published in zip(breakers, counted):
+        breaker._published = published
+
+
+# Load/publish tasks in flight; referenced here so they are not garbage-collected mid-run
+_background: set[asyncio.Task] = set()
+
+
+def _in_background(coro) -> None:
+    try:
+        task = asyncio.get_running_loop().create_task(coro)
+    except RuntimeError:
+        coro.close()
+        return  # no running loop (e.g. used from a script) — nothing to load from or publish to
+    _background.add(task)
+    task.add_done_callback(_background.discard)
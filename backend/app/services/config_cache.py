@@ -0,0 +1,173 @@
+"""In-process cache for agent, knowledge base and custom function rows.
+
+The LiveKit worker needs these rows before it can greet the caller. Entries are
+stamped with the row's ``updated_at`` and served from memory for
+``CONFIG_CACHE_TTL_SECONDS``. After that they are still served immediately, and
+a background task revalidates them with a cheap ``select id, updated_at`` —
+only rows whose ``updated_at`` changed are re-fetched, deleted/inactive rows
+are evicted. A warm worker therefore starts a session with no database
+round-trips on the critical path.
+
+Each process has its own cache. The API routers' ``invalidate()`` calls only
+refresh the API process; a voice worker sees an edit on its first lookup after
+the entry is ``CONFIG_CACHE_TTL_SECONDS`` old, when revalidation finds the new
+``updated_at``. Worker staleness is therefore bounded by the TTL plus one
+revalidation round-trip.
+"""
+import asyncio
+import logging
+import time
+
+from app.config import settings
+from app.database import get_supabase, run_sync
+
+logger = logging.getLogger(__name__)
+
+
+# Revalidation tasks in flight; referenced here so they are not garbage-collected mid-run
+_background: set[asyncio.Task] = set()
+
+
+class _Entry:
+    __slots__ = ("row", "version", "fetched_at")
+
+    def __init__(self, row: dict, fetched_at: float):
+        self.row = row
+        self.version = row.get("updated_at")
+        self.fetched_at = fetched_at
+
+
+class RowCache:
+    """TTL + version-stamped cache of rows from one table, keyed on a column."""
+
+    def __init__(self, table: str, key: str = "id", filters: dict | None = None):
+        self.table = table
+        self.key = key
+        self.filters = filters or {}
+        self._entries: dict[str, _Entry] = {}
+        self._refreshing: set[str] = set()
+        self.hits = 0
+        self.misses = 0
+
+    # ── Public API ────────────────────────────────────────────────
+
+    async def get(self, key: str) -> dict | None:
+        rows = await self.get_many([key])
+        return rows.get(key)
+
+    async def get_many(self, keys: list[str]) -> dict[str, dict]:
+        """Return {key: row} for the requested keys that exist (and match filters)."""
+        now = time.monotonic()
+        ttl = settings.CONFIG_CACHE_TTL_SECONDS
+        found: dict[str, dict] = {}
+        missing: list[str] = []
+        stale: list[str] = []
+
+        for key in dict.fromkeys(keys):
+            entry = self._entries.get(key)
+            if entry is None:
+                missing.append(key)
+                continue
+            found[key] = entry.row
+            if now - entry.fetched_at > ttl and key not in self._refreshing:
+                stale.append(key)
+
+        self.hits += len(found)
+        self.misses += len(missing)
+
+        if stale:
+            self._refreshing.update(stale)
+            task = asyncio.create_task(self._revalidate(stale))
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+
+        if missing:
+            rows = await run_sync(self._fetch_rows, missing)
+            for row in rows:
+                self._store(row)
+                found[row[self.key]] = row
+
+        return found
+
+    def peek(self, key: str) -> dict | None:
+        """Return the cached row without touching the database."""
+        entry = self._entries.get(key)
+        return entry.row if entry else None
+
+    def prime(self, rows: list[dict]) -> None:
+        """Seed the cache with rows loaded elsewhere (e.g. at worker prewarm)."""
+        for row in rows:
+            if row.get(self.key) is not None:
+                self._store(row)
+
+    def invalidate(self, key: str | None = None) -> None:
+        """Drop one entry, or every entry when ``key`` is None."""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+    # ── Internals ─────────────────────────────────────────────────
+
+    def _store(self, row: dict) -> None:
+        self._entries[row[self.key]] = _Entry(row, time.monotonic())
+
+    def _query(self, columns: str, keys: list[str]):
+        query = get_supabase().table(self.table).select(columns).in_(self.key, keys)
+        for column, value in self.filters.items():
+            query = query.eq(column, value)
+        return query
+
+    def _fetch_rows(self, keys: list[str]) -> list[dict]:
+        return self._query("*", keys).execute().data or []
+
+    def _fetch_versions(self, keys: list[str]) -> dict[str, str | None]:
+        result = self._query(f"{self.key},updated_at", keys).execute()
+        return {r[self.key]: r.get("updated_at") for r in (result.data or [])}
+
+    async def _revalidate(self, keys: list[str]) -> None:
+        try:
+            versions = await run_sync(self._fetch_versions, keys)
+            changed = []
+            now = time.monotonic()
+            for key in keys:
+                entry = self._entries.get(key)
+                if key not in versions:
+                    # Row deleted or no longer matches filters (e.g. deactivated)
+                    self._entries.pop(key, None)
+                elif entry is None or entry.version != versions[key]:
+                    changed.append(key)
+                else:
+                    entry.fetched_at = now
+
+            if changed:
+                rows = await run_sync(self._fetch_rows, changed)
+                for row in rows:
+                    self._store(row)
+                logger.info(f"Config cache [{self.table}]: refreshed {len(rows)} changed row(s)")
+        except Exception as e:
+            # Keep serving the cached rows — a DB blip must not break new calls
+            logger.warning(f"Config cache [{self.table}]: revalidation failed: {e}")
+        finally:
+            self._refreshing.difference_update(keys)
+
+
+agents = RowCache("agents")
+knowledge_bases = RowCache("knowledge_bases", filters={"is_active": True})
+custom_functions = RowCache("custom_functions", key="name", filters={"is_active": True})
+
+
+def prime_all() -> None:
+    """Synchronously load every agent, active KB and active custom function."""
+    db = get_supabase()
+    agents.prime(db.table("agents").select("*").execute().data or [])
+    knowledge_bases.prime(db.table("knowledge_bases").select("*").eq("is_active", True).execute().data or [])
+    custom_functions.prime(db.table("custom_functions").select("*").eq("is_active", True).execute().data or [])
+    logger.info(
+        f"Config cache primed: agents={agents.stats()['entries']}, "
+        f"knowledge_bases={knowledge_bases.stats()['entries']}, "
+        f"custom_functions={custom_functions.stats()['entries']}"
+    )
@@ -1,130 +1,483 @@
 """Document processing: parse, chunk, embed, upsert."""
+import asyncio
 import io
 import csv
+import functools
+import hashlib
+import json
+import re
 import logging
-import uuid
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, Iterable, Iterator
+
+import numpy as np
+
 from app.config import settings
+from app.services.embedding_cache import get_embedding_cache
+from app.services.embedding_client import embed_texts, get_encoder
 
 logger = logging.getLogger(__name__)
 
+# Approximate size of the text pieces TXT/CSV files are streamed in
+_SEGMENT_CHARS = 64 * 1024
+
+# End of a sentence: terminal punctuation (plus closing quotes/brackets) followed by whitespace
+_SENTENCE_END_RE = re.compile(r"[.!?][\"')\]]*(?=\s)")
+
+# How the embedding side tails the chunk spool written by the parser
+_SPOOL_READ_SIZE = 1024 * 1024
+_SPOOL_POLL_SECONDS = 0.05
+
+
+class DocumentReader:
+    """Streams a PDF/TXT/DOCX/CSV file as text segments without building the whole text.
 
-def parse_file(content: bytes, filename: str) -> str:
-    """Extract text from PDF/TXT/DOCX/CSV files."""
-    ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+    ``segments()`` yields pieces of the document in order (page by page for
+    PDFs, paragraph by paragraph for DOCX, ~64 KB blocks for TXT and blocks
+    of rows for CSV), including the separators between them, and keeps
+    ``done``/``total`` (in ``unit``s) current for progress reporting.
+    """
 
-    if ext == "txt":
-        return content.decode("utf-8", errors="ignore")
+    def __init__(self, file: BinaryIO, filename: str, pages: range | None = None):
+        self.file = file
+        # PDF page range to read (a parse shard); None reads every page
+        self.pages = pages
+        self.ext = filename.rsplit(".", 1)[-1].lower() if "." in filename else ""
+        if self.ext not in ("txt", "csv", "pdf", "docx", "doc"):
+            raise ValueError(f"Unsupported file type: .{self.ext}")
+        self.unit = "bytes"
+        self.done = 0
+        self.total = 0
 
-    if ext == "csv":
-        text_io = io.StringIO(content.decode("utf-8", errors="ignore"))
-        reader = csv.reader(text_io)
-        rows = []
-        for row in reader:
-            rows.append(" | ".join(row))
-        return "\n".join(rows)
+    def segments(self) -> Iterator[str]:
+        if self.ext == "pdf":
+            yield from self._pdf()
+        elif self.ext in ("docx", "doc"):
+            yield from self._docx()
+        elif self.ext == "csv":
+            yield from self._csv()
+        else:
+            yield from self._text()
 
-    if ext == "pdf":
+    def _text(self) -> Iterator[str]:
+        text_io = self._open_text()
+        while block := text_io.read(_SEGMENT_CHARS):
+            self.done = self.file.tell()
+            yield block
+        text_io.detach()
+        self.done = self.total
+
+    def _csv(self) -> Iterator[str]:
+        text_io = self._open_text()
+        rows: list[str] = []
+        chars = 0
+        for row in csv.reader(text_io):
+            line = " | ".join(row)
+            rows.append(line)
+            chars += len(line) + 1
+            if chars >= _SEGMENT_CHARS:
+                self.done = self.file.tell()
+                yield "\n".join(rows) + "\n"
+                rows, chars = [], 0
+        text_io.detach()
+        self.done = self.total
+        if rows:
+            yield "\n".join(rows)
+
+    def _open_text(self) -> io.TextIOWrapper:
+        self.file.seek(0, io.SEEK_END)
+        self.total = self.file.tell()
+        self.file.seek(0)
+        return io.TextIOWrapper(self.file, encoding="utf-8", errors="ignore", newline="")
+
+    def _pdf(self) -> Iterator[str]:
         from PyPDF2 import PdfReader
-        reader = PdfReader(io.BytesIO(content))
-        pages = []
-        for page in reader.pages:
-            text = page.extract_text()
+        reader = PdfReader(self.file)
+        self.unit = "pages"
+        self.total = len(reader.pages)
+        first = True
+        for i in self.pages if self.pages is not None else range(self.total):
+            text = reader.pages[i].extract_text()
+            self.done = i + 1
             if text:
-                pages.append(text)
-        return "\n\n".join(pages)
+                yield text if first else "\n\n" + text
+                first = False
 
-    if ext in ("docx", "doc"):
+    def _docx(self) -> Iterator[str]:
+        # python-docx parses the whole document XML up front; only the text is streamed
         from docx import Document
-        doc = Document(io.BytesIO(content))
-        paragraphs = [p.text for p in doc.paragraphs if p.text.strip()]
-        return "\n\n".join(paragraphs)
+        doc = Document(self.file)
+        self.unit = "paragraphs"
+        self.total = len(doc.paragraphs)
+        first = True
+        for i, p in enumerate(doc.paragraphs):
+            self.done = i + 1
+            if p.text.strip():
+                yield p.text if first else "\n\n" + p.text
+                first = False
 
-    raise ValueError(f"Unsupported file type: .{ext}")
+    def progress(self) -> float:
+        return round(self.done / self.total, 3) if self.total else 0.0
 
 
-def chunk_text(text: str, chunk_size: int | None = None, chunk_overlap: int | None = None) -> list[str]:
-    """Split text into overlapping chunks by approximate token count."""
-    import tiktoken
+@functools.lru_cache(maxsize=1)
+def _token_byte_lengths() -> np.ndarray:
+    """UTF-8 byte length of every token id in the encoder's vocabulary (built once)."""
+    enc = get_encoder()
+    lengths = np.zeros(enc.n_vocab, dtype=np.int64)
+    for token in range(enc.n_vocab):
+        try:
+            lengths[token] = len(enc.decode_single_token_bytes(token))
+        except KeyError:
+            pass  # gaps below the special tokens
+    return lengths
+
+
+def _token_starts(enc, text: str) -> np.ndarray:
+    """Character offset in ``text`` at which each of its tokens starts (one encode, no decode)."""
+    # Special-token text is encoded as ordinary text, like encode_ordinary
+    tokens = enc.encode_to_numpy(text, disallowed_special=())
+    lengths = _token_byte_lengths()[tokens]
+    byte_starts = np.cumsum(lengths) - lengths
+    raw = text.encode("utf-8")
+    if len(raw) == len(text):
+        return byte_starts
+    # Non-ASCII text: map byte offsets to character offsets by counting UTF-8 lead bytes
+    leads = (np.frombuffer(raw, dtype=np.uint8) & 0xC0) != 0x80
+    chars_before = np.concatenate(([0], np.cumsum(leads)))
+    return chars_before[byte_starts]
 
-    chunk_size = chunk_size or settings.CHUNK_SIZE
-    chunk_overlap = chunk_overlap or settings.CHUNK_OVERLAP
 
-    enc = tiktoken.get_encoding("cl100k_base")
-    tokens = enc.encode(text)
+def _snap_end(text: str, starts: np.ndarray, lo: int, hi: int) -> int:
+    """Token index in ``(lo, hi]`` at which to end a chunk, preferring paragraph then sentence breaks."""
+    window = text[starts[lo]:starts[hi]]
+    cut = window.rfind("\n\n")
+    if cut <= 0:
+        sentence_ends = [m.end() for m in _SENTENCE_END_RE.finditer(window)]
+        cut = sentence_ends[-1] if sentence_ends else window.rfind("\n")
+    if cut <= 0:
+        return hi
+    # First token starting at or after the break
+    end = lo + 1 + int(np.searchsorted(starts[lo + 1:hi], starts[lo] + cut))
+    return end
 
-    chunks = []
-    start = 0
-    while start < len(tokens):
-        end = start + chunk_size
-        chunk_tokens = tokens[start:end]
-        chunk_text = enc.decode(chunk_tokens)
-        if chunk_text.strip():
-            chunks.append(chunk_text.strip())
-        start = end - chunk_overlap
 
+def iter_chunks(
+    segments: Iterable[str],
+    chunk_size: int | None = None,
+    chunk_overlap: int | None = None,
+    snap: bool | None = None,
+) -> Iterator[str]:
+    """Split streamed text into overlapping chunks by approximate token count.
+
+    Each segment is tokenized once; chunk boundaries are found by walking
+    token start offsets and chunks are sliced out of the original text, so
+    no tokens are decoded. With ``snap`` (default ``CHUNK_SNAP_BOUNDARIES``)
+    a chunk ends at the last paragraph or sentence break in its final
+    quarter when there is one. Only the text from the current chunk onwards
+    is held, so memory does not grow with the document.
+    """
+    chunk_size = settings.CHUNK_SIZE if chunk_size is None else chunk_size
+    chunk_overlap = settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    snap = settings.CHUNK_SNAP_BOUNDARIES if snap is None else snap
+    snap_window = max(1, chunk_size // 4)
+
+    enc = get_encoder()
+    text = ""
+    starts = np.zeros(0, dtype=np.int64)  # start offset in ``text`` of every token
+    head = 0  # first token of the chunk being built
+    emitted = 0  # tokens before this index are already in an emitted chunk
+    for segment in segments:
+        # Drop consumed text before appending, keeping offsets relative to ``text``
+        cut = int(starts[head]) if head < len(starts) else len(text)
+        text = text[cut:] + segment
+        starts = np.concatenate((starts[head:] - cut, _token_starts(enc, segment) + (len(text) - len(segment))))
+        emitted -= head
+        head = 0
+
+        # A chunk is complete once the token after it has been seen
+        while len(starts) - head > chunk_size:
+            end = head + chunk_size
+            if snap:
+                end = _snap_end(text, starts, end - snap_window, end)
+            chunk = text[starts[head]:starts[end]].strip()
+            if chunk:
+                yield chunk
+            emitted = end
+            head = max(head + 1, end - chunk_overlap)
+
+    if len(starts) > emitted:
+        chunk = text[starts[head]:].strip()
+        if chunk:
+            yield chunk
+
+
+def chunk_text(
+    text: str,
+    chunk_size: int | None = None,
+    chunk_overlap: int | None = None,
+    snap: bool | None = None,
+) -> list[str]:
+    """Split text into overlapping chunks by approximate token count."""
+    chunk_size = settings.CHUNK_SIZE if chunk_size is None else chunk_size
+    chunk_overlap = settings.CHUNK_OVERLAP if chunk_overlap is None else chunk_overlap
+    chunks = list(iter_chunks([text], chunk_size, chunk_overlap, snap))
     logger.info(f"Split text into {len(chunks)} chunks (size={chunk_size}, overlap={chunk_overlap})")
     return chunks
 
 
 async def generate_embedding(text: str) -> list[float]:
-    """Generate embedding for a single text using OpenAI."""
-    import openai
-
-    client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-    response = await client.embeddings.create(
-        model=settings.EMBEDDING_MODEL,
-        input=text,
-    )
-    return response.data[0].embedding
+    """Generate embedding for a single text using OpenAI (served from the embedding cache when possible)."""
+    return (await generate_embeddings([text]))[0]
 
 
 async def generate_embeddings(texts: list[str]) -> list[list[float]]:
-    """Generate embeddings for multiple texts using OpenAI."""
-    import openai
+    """Generate embeddings for multiple texts using OpenAI.
+
+    Texts already in the embedding cache (same model, same content) are not
+    sent; only the misses are embedded and then written back to the cache.
+    """
+    model = settings.EMBEDDING_MODEL
+    cache = get_embedding_cache()
+    results: list[list[float] | None] = [None] * len(texts)
+    if cache is not None:
+        try:
+            results = await cache.get_many(model, texts)
+        except Exception as e:
+            logger.warning(f"Embedding cache lookup failed, embedding everything: {e}")
+
+    # Embed each distinct missing text once
+    missing = list(dict.fromkeys(t for t, r in zip(texts, results) if r is None))
+    if missing:
+        embedded = dict(zip(missing, await embed_texts(missing, model)))
+        results = [r if r is not None else embedded[t] for t, r in zip(texts, results)]
+        if cache is not None:
+            try:
+                await cache.put_many(model, missing, [embedded[t] for t in missing])
+            except Exception as e:
+                logger.warning(f"Embedding cache write failed: {e}")
 
-    client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-    batch_size = 100
-    all_embeddings = []
+    if len(texts) > 1:
+        logger.info(f"Embeddings: {len(texts) - len(missing)}/{len(texts)} served from cache")
+    return results
 
-    for i in range(0, len(texts), batch_size):
-        batch = texts[i:i + batch_size]
-        response = await client.embeddings.create(
-            model=settings.EMBEDDING_MODEL,
-            input=batch,
-        )
-        all_embeddings.extend([item.embedding for item in response.data])
 
-    return all_embeddings
+def extract_chunks(path: str, filename: str, spool_path: str, pages: range | None = None) -> int:
+    """Parse and chunk the file at ``path`` (or one page range of a PDF), appending chunks to a JSONL spool file.
+
+    Runs in an executor (the ingestion process pool). Each spool line is one
+    chunk plus the reader's position, flushed as it is written, so the
+    embedding side can consume chunks while parsing is still going.
+    Returns the number of chunks written.
+    """
+    count = 0
+    with open(path, "rb") as f, open(spool_path, "a", encoding="utf-8") as spool:
+        reader = DocumentReader(f, filename, pages)
+        for chunk in iter_chunks(reader.segments()):
+            spool.write(json.dumps({"text": chunk, "done": reader.done, "total": reader.total, "unit": reader.unit}) + "\n")
+            spool.flush()
+            count += 1
+    return count
+
+
+def pdf_page_count(path: str) -> int:
+    from PyPDF2 import PdfReader
+    with open(path, "rb") as f:
+        return len(PdfReader(f).pages)
+
+
+async def _plan_shards(path: str, filename: str, executor: Executor | None) -> list[range | None]:
+    """Split a large PDF into page ranges, one per parse process; everything else is one shard."""
+    processes = settings.INGEST_PARSE_PROCESSES
+    if not isinstance(executor, ProcessPoolExecutor) or processes <= 1 or not filename.lower().endswith(".pdf"):
+        return [None]
+    try:
+        pages = await asyncio.get_running_loop().run_in_executor(executor, pdf_page_count, path)
+    except Exception:
+        # Let the single-shard parse surface the error
+        return [None]
+    shard_pages = max(settings.PDF_SHARD_MIN_PAGES, -(-pages // processes))
+    if pages <= shard_pages:
+        return [None]
+    return [range(start, min(start + shard_pages, pages)) for start in range(0, pages, shard_pages)]
+
+
+async def _read_spool(spool_path: str, parsing: asyncio.Future) -> AsyncIterator[dict]:
+    """Yield spool entries as ``extract_chunks`` writes them, until it finishes."""
+    with open(spool_path, "r", encoding="utf-8") as spool:
+        partial = ""
+        while True:
+            finished = parsing.done()
+            data = await asyncio.to_thread(spool.read, _SPOOL_READ_SIZE)
+            if data:
+                lines = (partial + data).split("\n")
+                partial = lines.pop()
+                for line in lines:
+                    yield json.loads(line)
+                continue
+            if finished:
+                break
+            await asyncio.sleep(_SPOOL_POLL_SECONDS)
+    # Re-raise parse errors
+    parsing.result()
+
+
+def chunk_id(file_id: str, text: str, occurrence: int = 0) -> str:
+    """Content-addressed vector id: the same chunk text in the same file always gets the same id.
+
+    ``occurrence`` numbers repeats of identical text within one file.
+    """
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+    return f"{file_id}_{digest}" if occurrence == 0 else f"{file_id}_{digest}_{occurrence}"
+
+
+def legacy_chunk_ids(file_id: str, chunk_count: int) -> list[str]:
+    """Positional ids used before chunk ids were content-addressed."""
+    return [f"{file_id}_{i}" for i in range(chunk_count)]
 
 
 async def process_and_upsert(
-    content: bytes,
+    path: str,
     filename: str,
     file_id: str,
     provider,
     namespace: str | None = None,
-) -> int:
-    """Full pipeline: parse → chunk → embed → upsert to vector DB. Returns chunk count."""
-    text = parse_file(content, filename)
-    if not text.strip():
-        raise ValueError("No text content extracted from file")
-
-    chunks = chunk_text(text)
-    embeddings = await generate_embeddings(chunks)
-
-    vectors = []
-    for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-        vectors.append({
-            "id": f"{file_id}_{i}",
-            "values": embedding,
-            "metadata": {
-                "text": chunk,
-                "file_id": file_id,
-                "filename": filename,
-                "chunk_index": i,
-            },
-        })
-
-    await provider.upsert(vectors, namespace=namespace)
-    logger.info(f"Processed {filename}: {len(chunks)} chunks embedded and upserted")
-    return len(chunks)
+    on_progress: Callable[[dict], Awaitable[None]] | None = None,
+    executor: Executor | None = None,
+    existing_ids: Iterable[str] | None = None,
+    lexical_index=None,
+) -> list[str]:
+    """Streaming pipeline: parse → chunk → embed → upsert to vector DB. Returns the file's chunk ids.
+
+    Parsing and chunking run in ``executor`` (a process pool for ingestion
+    jobs; the default thread pool otherwise) and stream chunks through a
+    spool file next to ``path``. With a process pool, PDFs of more than
+    ``PDF_SHARD_MIN_PAGES`` pages are split into page ranges parsed in
+    parallel, one spool each, and read back in page order (chunks do not
+    span shard boundaries). Chunks are embedded and upserted in batches
+    of ``INGEST_BATCH_CHUNKS`` as they arrive, so only one batch is in memory
+    regardless of file size. ``on_progress`` is awaited after each batch
+    with the chunk count so far and the parser's position.
+
+    Chunk ids are content-addressed (``chunk_id``). When re-indexing a file,
+    pass its current ids as ``existing_ids``: chunks whose id is already
+    there are neither embedded nor upserted, and ids no longer produced are
+    deleted once the new version is fully upserted. If the pipeline fails or
+    is cancelled, vectors it added are deleted again, leaving the index as
+    it was.
+
+    ``lexical_index`` (a ``LexicalIndex``), when given, receives every chunk's
+    text under the same id for BM25 retrieval and is kept in step with the
+    vector index: unchanged chunks are (re)added so an index created after
+    the file was first ingested is backfilled, and stale and rolled-back ids
+    are deleted from both.
+    """
+    existing = set(existing_ids or ())
+    loop = asyncio.get_running_loop()
+    shards = await _plan_shards(path, filename, executor)
+    spools = []
+    for i, pages in enumerate(shards):
+        spool_path = f"{path}.chunks-{i}.jsonl"
+        open(spool_path, "w").close()
+        parsing = loop.run_in_executor(executor, extract_chunks, path, filename, spool_path, pages)
+        # Parse errors are re-raised by _read_spool; don't warn about ones nobody reads after a failure
+        parsing.add_done_callback(lambda f: f.cancelled() or f.exception())
+        spools.append((spool_path, parsing))
+    if len(shards) > 1:
+        logger.info(f"Parsing {filename} in {len(shards)} page-range shards of {len(shards[0])} pages")
+    batch_size = settings.INGEST_BATCH_CHUNKS
+    started = time.perf_counter()
+    ids: list[str] = []
+    added: list[str] = []
+    occurrences: dict[str, int] = {}
+    batch: list[dict] = []
+
+    async def flush() -> None:
+        nonlocal batch
+        new = []
+        for entry in batch:
+            n = occurrences.get(entry["text"], 0)
+            occurrences[entry["text"]] = n + 1
+            vector_id = chunk_id(file_id, entry["text"], n)
+            ids.append(vector_id)
+            if vector_id not in existing:
+                new.append((len(ids) - 1, vector_id, entry["text"]))
+
+        if new:
+            embeddings = await generate_embeddings([text for _, _, text in new])
+            vectors = [
+                {
+                    "id": vector_id,
+                    "values": embedding,
+                    "metadata": {
+                        "text": text,
+                        "file_id": file_id,
+                        "filename": filename,
+                        "chunk_index": index,
+                    },
+                }
+                for (index, vector_id, text), embedding in zip(new, embeddings)
+            ]
+            await provider.upsert(vectors, namespace=namespace)
+            added.extend(vector_id for _, vector_id, _ in new)
+        if lexical_index is not None:
+            await lexical_index.upsert(
+                [(vector_id, file_id, entry["text"]) for vector_id, entry in zip(ids[-len(batch):], batch)]
+            )
+
+        last = batch[-1]
+        batch = []
+        if on_progress is not None:
+            await on_progress({
+                "chunks": len(ids),
+                "unchanged": len(ids) - len(added),
+                "done": last["done"],
+                "total": last["total"],
+                "unit": last["unit"],
+                "fraction": round(last["done"] / last["total"], 3) if last["total"] else 0.0,
+                "elapsed_seconds": round(time.perf_counter() - started, 1),
+            })
+
+    try:
+        # Shards parse in parallel; their chunks are consumed in page order
+        for spool_path, parsing in spools:
+            async for entry in _read_spool(spool_path, parsing):
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    await flush()
+        if batch:
+            await flush()
+        if not ids:
+            raise ValueError("No text content extracted from file")
+    except BaseException:
+        if added:
+            await _delete_ids(provider, added, namespace, "roll back", lexical_index)
+        raise
+    finally:
+        # A process-pool parse cannot be interrupted; its output is simply dropped
+        for spool_path, parsing in spools:
+            parsing.cancel()
+            Path(spool_path).unlink(missing_ok=True)
+
+    stale = existing - set(ids)
+    if stale:
+        await _delete_ids(provider, list(stale), namespace, "remove stale", lexical_index)
+    logger.info(
+        f"Processed {filename}: {len(ids)} chunks ({len(added)} embedded and upserted, "
+        f"{len(ids) - len(added)} unchanged, {len(stale)} removed) in {time.perf_counter() - started:.1f}s"
+    )
+    return ids
+
+
+async def _delete_ids(provider, ids: list[str], namespace: str | None, purpose: str, lexical_index=None) -> None:
+    try:
+        await provider.delete(ids=ids, namespace=namespace)
+    except Exception as e:
+        logger.error(f"Failed to {purpose} {len(ids)} vectors: {e}")
+    if lexical_index is not None:
+        try:
+            await lexical_index.delete(ids=ids)
+        except Exception as e:
+            logger.error(f"Failed to {purpose} {len(ids)} lexical index entries: {e}")
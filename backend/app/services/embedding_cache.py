@@ -0,0 +1,179 @@
+"""Persistent embedding cache keyed by (model, sha256(text)).
+
+Consulted by ``document_processor.generate_embedding(s)`` so re-uploading an
+edited document only pays for the chunks that changed, and repeated caller
+questions skip the embeddings API entirely.
+
+Entries live in a SQLite file (``EMBEDDING_CACHE_PATH``) as float32 blobs —
+WAL mode, so the API process (ingestion) and voice workers (queries) can
+share it. The cache is bounded to ``EMBEDDING_CACHE_MAX_ENTRIES``; when an
+insert pushes it over, the least recently used entries are evicted. Writes
+keep a running row count (re-read every ``_RECOUNT_EVERY`` writes to pick
+up other processes' inserts) rather than counting the table each time. Lookups
+and writes run in a thread so the event loop never waits on disk.
+"""
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    hash BLOB NOT NULL,
+    vector BLOB NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (model, hash)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used);
+"""
+
+# SQLite's default limit on bound parameters per statement is 999 on older builds
+_LOOKUP_CHUNK = 400
+
+# Writes between re-reading the true row count (other processes insert into the same file)
+_RECOUNT_EVERY = 500
+
+
+def _digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    def __init__(self, path: str | Path, max_entries: int):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._entries: int | None = None
+        self._writes_since_count = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    # ── Sync API (run in a thread by the async wrappers) ─────────
+
+    def get_many_sync(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        digests = [_digest(t) for t in texts]
+        found: dict[bytes, bytes] = {}
+        with self._lock:
+            conn = self._connect()
+            unique = list(dict.fromkeys(digests))
+            for i in range(0, len(unique), _LOOKUP_CHUNK):
+                chunk = unique[i:i + _LOOKUP_CHUNK]
+                placeholders = ",".join("?" * len(chunk))
+                rows = conn.execute(
+                    f"SELECT hash, vector FROM embeddings WHERE model = ? AND hash IN ({placeholders})",
+                    [model, *chunk],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                # Touch hits for LRU ordering
+                now = time.time()
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, model, h) for h in found],
+                )
+                conn.commit()
+
+        results = []
+        for d in digests:
+            blob = found.get(d)
+            results.append(np.frombuffer(blob, dtype=np.float32).tolist() if blob is not None else None)
+        hits = sum(1 for r in results if r is not None)
+        self.hits += hits
+        self.misses += len(results) - hits
+        return results
+
+    def put_many_sync(self, model: str, texts: list[str], vectors: list[list[float]]) -> None:
+        now = time.time()
+        rows = [
+            (model, _digest(t), np.asarray(v, dtype=np.float32).tobytes(), now)
+            for t, v in zip(texts, vectors)
+        ]
+        with self._lock:
+            conn = self._connect()
+            if self._entries is None or self._writes_since_count >= _RECOUNT_EVERY:
+                self._entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+                self._writes_since_count = 0
+            self._writes_since_count += 1
+            # Existing keys already hold the same vector; only their LRU stamp changes
+            inserted = conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            ).rowcount
+            if inserted < len(rows):
+                conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND hash = ?",
+                    [(now, model, row[1]) for row in rows],
+                )
+            self._entries += inserted
+            excess = self._entries - self.max_entries
+            if excess > 0:
+                evicted = conn.execute(
+                    "DELETE FROM embeddings WHERE (model, hash) IN "
+                    "(SELECT model, hash FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (excess,),
+                ).rowcount
+                self._entries -= evicted
+                self.evictions += evicted
+            conn.commit()
+
+    def stats_sync(self) -> dict:
+        with self._lock:
+            conn = self._connect()
+            entries = self._entries = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            self._writes_since_count = 0
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "size_bytes": self.path.stat().st_size if self.path.exists() else 0,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+    # ── Async API ────────────────────────────────────────────────
+
+    async def get_many(self, model: str, texts: list[str]) -> list[list[float] | None]:
+        return await asyncio.to_thread(self.get_many_sync, model, texts)
+
+    async def put_many(self, model: str, texts: list[str], vectors: list[list[float]]) -> None:
+        await asyncio.to_thread(self.put_many_sync, model, texts, vectors)
+
+    async def stats(self) -> dict:
+        return await asyncio.to_thread(self.stats_sync)
+
+
+_cache: EmbeddingCache | None = None
+
+
+def get_embedding_cache() -> EmbeddingCache | None:
+    """Process-wide cache, or None when ``EMBEDDING_CACHE_ENABLED`` is off."""
+    global _cache
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = EmbeddingCache(settings.EMBEDDING_CACHE_PATH, settings.EMBEDDING_CACHE_MAX_ENTRIES)
+    return _cache
@@ -0,0 +1,155 @@
+"""Shared OpenAI embeddings client with token-aware, concurrent batching.
+
+- One pooled ``AsyncOpenAI`` client per process (per event loop), instead of
+  a new client — and new connections — for every call.
+- Batches are packed by token count, up to ``EMBEDDING_BATCH_MAX_TOKENS``
+  and ``EMBEDDING_BATCH_MAX_INPUTS`` per request, rather than a fixed 100
+  texts, so short texts share requests and long documents need fewer.
+- Up to ``EMBEDDING_CONCURRENCY`` batches are in flight at once.
+- 429s and transient 5xx / connection errors are retried with exponential
+  backoff and jitter (honouring ``Retry-After``), up to
+  ``EMBEDDING_MAX_RETRIES`` times. The SDK's own retries are disabled so
+  backoff is decided in one place.
+
+Throughput against a local stub: ``python -m app.benchmarks.embedding_throughput``.
+"""
+import asyncio
+import functools
+import logging
+import random
+import time
+
+import openai
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_MAX_BACKOFF_SECONDS = 30.0
+
+_client: openai.AsyncOpenAI | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
+
+# Caps embeddings requests in flight across every caller in the process (ingestion jobs + queries)
+_semaphore: asyncio.Semaphore | None = None
+_semaphore_loop: asyncio.AbstractEventLoop | None = None
+
+_metrics = {"requests": 0, "texts": 0, "tokens": 0, "rate_limited": 0, "retries": 0}
+
+
+def get_embeddings_client() -> openai.AsyncOpenAI:
+    """Return the process-wide client, creating it for the running loop."""
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.EMBEDDING_API_BASE or None,
+            max_retries=0,
+        )
+        _client_loop = loop
+    return _client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    """Return the process-wide ``EMBEDDING_CONCURRENCY`` limit, creating it for the running loop."""
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(settings.EMBEDDING_CONCURRENCY)
+        _semaphore_loop = loop
+    return _semaphore
+
+
+@functools.lru_cache(maxsize=1)
+def get_encoder():
+    """The cl100k_base tokenizer used by OpenAI's embedding models, loaded once per process."""
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def plan_batches(texts: list[str], max_tokens: int | None = None, max_inputs: int | None = None) -> list[list[int]]:
+    """Group text indices into request batches bounded by token count and input count."""
+    if len(texts) <= 1:
+        # Single query embeddings (the RAG hot path) skip tokenization entirely
+        return [list(range(len(texts)))]
+    max_tokens = max_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS
+    max_inputs = max_inputs or settings.EMBEDDING_BATCH_MAX_INPUTS
+    counts = [len(tokens) for tokens in get_encoder().encode_ordinary_batch(texts)]
+
+    batches: list[list[int]] = []
+    current: list[int] = []
+    current_tokens = 0
+    for i, n in enumerate(counts):
+        if current and (current_tokens + n > max_tokens or len(current) >= max_inputs):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    retry_after = None
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            retry_after = float(response.headers.get("retry-after"))
+        except (TypeError, ValueError):
+            retry_after = None
+    backoff = min(_MAX_BACKOFF_SECONDS, 0.5 * 2 ** attempt)
+    return max(retry_after or 0.0, backoff * random.uniform(0.5, 1.0))
+
+
+async def _embed_batch(batch: list[str], model: str) -> list[list[float]]:
+    client = get_embeddings_client()
+    for attempt in range(settings.EMBEDDING_MAX_RETRIES + 1):
+        try:
+            response = await client.embeddings.create(model=model, input=batch)
+            _metrics["requests"] += 1
+            _metrics["texts"] += len(batch)
+            if response.usage is not None:
+                _metrics["tokens"] += response.usage.total_tokens
+            return [item.embedding for item in sorted(response.data, key=lambda d: d.index)]
+        except (openai.RateLimitError, openai.InternalServerError, openai.APIConnectionError) as e:
+            if attempt >= settings.EMBEDDING_MAX_RETRIES:
+                raise
+            if isinstance(e, openai.RateLimitError):
+                _metrics["rate_limited"] += 1
+            _metrics["retries"] += 1
+            delay = _retry_delay(e, attempt)
+            logger.warning(f"Embedding batch of {len(batch)} failed ({type(e).__name__}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+    raise RuntimeError("unreachable")
+
+
+async def embed_texts(texts: list[str], model: str | None = None) -> list[list[float]]:
+    """Embed ``texts`` (order preserved) with token-packed, concurrent batches."""
+    if not texts:
+        return []
+    model = model or settings.EMBEDDING_MODEL
+    started = time.perf_counter()
+    batches = plan_batches(texts)
+    results: list[list[float] | None] = [None] * len(texts)
+    sem = _get_semaphore()
+
+    async def _run(indices: list[int]) -> None:
+        async with sem:
+            vectors = await _embed_batch([texts[i] for i in indices], model)
+        for i, vector in zip(indices, vectors):
+            results[i] = vector
+
+    await asyncio.gather(*(_run(b) for b in batches))
+    if len(texts) > 1:
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"Embedded {len(texts)} texts in {len(batches)} requests, {elapsed:.2f}s "
+            f"({len(texts) / elapsed:.0f} texts/s)"
+        )
+    return results
+
+
+def get_embedding_metrics() -> dict:
+    return dict(_metrics)
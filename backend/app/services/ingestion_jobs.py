@@ -0,0 +1,354 @@
+"""Background ingestion jobs for knowledge base uploads.
+
+``upload_file`` only spools the upload to ``INGEST_UPLOAD_DIR``, creates the
+``knowledge_base_files`` row (status ``queued``) and calls ``submit()``; the
+response returns straight away. ``INGEST_WORKERS`` asyncio workers take jobs
+off the queue and run the streaming pipeline in
+``document_processor.process_and_upsert`` — parsing and chunking in a
+process pool of ``INGEST_PARSE_PROCESSES`` (CPU-bound, kept off the API's
+GIL), embedding and upserting on the event loop.
+
+Each job moves through ``queued → parsing → embedding → completed|failed``.
+Progress is pushed to the file row after every batch and kept in memory for
+``get_job()``/``wait_for_update()``, which back the status and SSE
+endpoints. Jobs live in the API process that accepted the upload; other
+processes see progress through the file row. The queue itself is in memory,
+so ``recover()`` runs at startup to requeue (or fail) files a previous run
+left unfinished and to clear upload files nobody owns any more.
+"""
+import asyncio
+import fcntl
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from app.config import settings
+from app.database import get_supabase, run_query
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STAGES = ("completed", "failed", "cancelled")
+
+
+class IngestionJob:
+    def __init__(self, file_id: str, kb: dict, path: str, filename: str, existing_ids: list[str] | None = None):
+        self.file_id = file_id
+        self.kb = kb
+        self.path = path
+        self.filename = filename
+        # Chunk ids of the version being replaced (re-index); None for a new file
+        self.existing_ids = existing_ids
+        self.stage = "queued"
+        self.chunks = 0
+        self.progress: dict = {}
+        self.error: str | None = None
+        self.queued_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.task: asyncio.Task | None = None
+        self._changed = asyncio.Event()
+
+    def update(self, **fields) -> None:
+        for key, value in fields.items():
+            setattr(self, key, value)
+        # Wake everyone waiting on this job, then arm a fresh event for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait_for_update(self, timeout: float) -> bool:
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def snapshot(self) -> dict:
+        end = self.finished_at or time.time()
+        running = end - self.started_at if self.started_at else 0.0
+        return {
+            "file_id": self.file_id,
+            "filename": self.filename,
+            "stage": self.stage,
+            "chunks": self.chunks,
+            "progress": self.progress,
+            "chunks_per_second": round(self.chunks / running, 1) if running > 0 else 0.0,
+            "queued_seconds": round((self.started_at or end) - self.queued_at, 1),
+            "running_seconds": round(running, 1),
+            "error": self.error,
+        }
+
+
+_jobs: dict[str, IngestionJob] = {}
+_queue: asyncio.Queue | None = None
+_workers: list[asyncio.Task] = []
+_pool: ProcessPoolExecutor | None = None
+# Shared flock on INGEST_UPLOAD_DIR/.lock, held for the life of the process (see recover())
+_dir_lock: int | None = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn, not fork: the API process has running threads (DB pool, event loop)
+        _pool = ProcessPoolExecutor(
+            max_workers=settings.INGEST_PARSE_PROCESSES,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def upload_dir() -> Path:
+    path = Path(settings.INGEST_UPLOAD_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def claim_upload(spooled_path: str, file_id: str, ext: str) -> str:
+    """Rename a spooled upload after its file row, so ``recover()`` can find it after a restart."""
+    path = upload_dir() / f"{file_id}{ext}"
+    os.replace(spooled_path, path)
+    return str(path)
+
+
+def submit(file_id: str, kb: dict, path: str, filename: str, existing_ids: list[str] | None = None) -> IngestionJob:
+    """Queue an uploaded file for ingestion. The job owns (and finally deletes) ``path``.
+
+    ``existing_ids`` are the chunk ids of the file's current version when it
+    is being replaced; only changed chunks are then embedded and upserted.
+    """
+    global _queue
+    if _queue is None:
+        _queue = asyncio.Queue()
+    _prune()
+    if not _workers:
+        for i in range(settings.INGEST_WORKERS):
+            _workers.append(asyncio.create_task(_worker(i)))
+
+    job = IngestionJob(file_id, kb, path, filename, existing_ids)
+    _jobs[file_id] = job
+    _queue.put_nowait(job)
+    logger.info(f"Ingestion queued: {filename} ({file_id}), {_queue.qsize()} waiting")
+    return job
+
+
+def get_job(file_id: str) -> IngestionJob | None:
+    return _jobs.get(file_id)
+
+
+def is_active(file_id: str) -> bool:
+    job = _jobs.get(file_id)
+    return job is not None and job.stage not in TERMINAL_STAGES
+
+
+async def cancel(file_id: str) -> None:
+    """Stop a job for a file being deleted. Vectors it already added are rolled back."""
+    job = _jobs.get(file_id)
+    if job is None or job.stage in TERMINAL_STAGES:
+        return
+    if job.task is not None:
+        job.task.cancel()
+        try:
+            await job.task
+        except (asyncio.CancelledError, Exception):
+            pass
+    else:
+        # Still queued: the worker will skip it, so the upload is ours to remove
+        Path(job.path).unlink(missing_ok=True)
+    job.update(stage="cancelled", finished_at=time.time())
+
+
+def get_queue_stats() -> dict:
+    stages: dict[str, int] = {}
+    for job in _jobs.values():
+        stages[job.stage] = stages.get(job.stage, 0) + 1
+    return {"waiting": _queue.qsize() if _queue else 0, "workers": len(_workers), "jobs": stages}
+
+
+def _lock_upload_dir() -> bool:
+    """Take this process's lock on ``INGEST_UPLOAD_DIR``; True if no other API process holds one.
+
+    Every API process keeps a shared lock for its lifetime. A process that
+    gets the lock exclusively is the only one alive, so the queued files
+    and uploads in the directory are left over from a previous run; it
+    keeps the exclusive lock until ``recover()`` downgrades it.
+    """
+    global _dir_lock
+    if _dir_lock is None:
+        _dir_lock = os.open(upload_dir() / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(_dir_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except BlockingIOError:
+        # Blocks only while a starting process is recovering
+        fcntl.flock(_dir_lock, fcntl.LOCK_SH)
+        return False
+
+
+async def recover() -> None:
+    """Deal with files a previous run of the API left ``queued`` or ``processing``.
+
+    Their jobs died with the process. A file whose upload is still in
+    ``INGEST_UPLOAD_DIR`` is queued again; any other is marked failed so the
+    frontend stops polling it. Uploads and chunk spools that no recovered job
+    owns are deleted. Call once at startup, before any upload is accepted.
+
+    With several API processes sharing the directory (``uvicorn --workers``),
+    only a process starting while no other is alive recovers: otherwise the
+    rows and uploads may belong to jobs that are still running.
+    """
+    if not await asyncio.to_thread(_lock_upload_dir):
+        logger.info("Ingestion recovery skipped — another API process is using the upload directory")
+        return
+    try:
+        await _recover()
+    finally:
+        fcntl.flock(_dir_lock, fcntl.LOCK_SH)
+
+
+async def _recover() -> None:
+    db = get_supabase()
+    try:
+        result = await run_query(
+            db.table("knowledge_base_files")
+            .select("id,knowledge_base_id,filename,file_type,chunk_count,chunk_ids")
+            .in_("status", ["queued", "processing"])
+        )
+        kb_ids = list({row["knowledge_base_id"] for row in result.data})
+        kbs = {}
+        if kb_ids:
+            kb_result = await run_query(db.table("knowledge_bases").select("*").in_("id", kb_ids))
+            kbs = {kb["id"]: kb for kb in kb_result.data}
+    except Exception as e:
+        logger.error(f"Ingestion recovery skipped — could not read interrupted files: {e}")
+        return
+
+    resumed: list[tuple[dict, dict, Path]] = []
+    for row in result.data:
+        path = upload_dir() / f"{row['id']}.{row['file_type']}"
+        kb = kbs.get(row["knowledge_base_id"])
+        if kb is not None and path.exists():
+            resumed.append((row, kb, path))
+            continue
+        try:
+            await _set_file(row["id"], {
+                "status": "failed",
+                "error_message": "Ingestion was interrupted by a server restart; upload the file again",
+            })
+        except Exception as e:
+            logger.error(f"Failed to mark interrupted ingestion of {row['id']} as failed: {e}")
+
+    # Spools of interrupted jobs are rewritten from scratch, so only resumed uploads are kept
+    keep = {path for _, _, path in resumed}
+    orphans = [p for p in upload_dir().iterdir() if p.is_file() and p not in keep and p.name != ".lock"]
+    for orphan in orphans:
+        orphan.unlink(missing_ok=True)
+
+    from app.services.document_processor import legacy_chunk_ids
+    for row, kb, path in resumed:
+        # A replacement keeps the previous version's ids (positional for files indexed before ids
+        # were recorded), so chunks it dropped are still cleaned up
+        existing_ids = row.get("chunk_ids")
+        if existing_ids is None:
+            existing_ids = legacy_chunk_ids(row["id"], row.get("chunk_count") or 0)
+        submit(row["id"], kb, str(path), row["filename"], existing_ids=existing_ids)
+    if result.data or orphans:
+        logger.info(
+            f"Ingestion recovery: {len(resumed)} files requeued, {len(result.data) - len(resumed)} marked failed, "
+            f"{len(orphans)} orphaned upload files removed"
+        )
+
+
+async def shutdown() -> None:
+    global _dir_lock
+    for task in _workers:
+        task.cancel()
+    _workers.clear()
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+    if _dir_lock is not None:
+        os.close(_dir_lock)
+        _dir_lock = None
+
+
+def _prune() -> None:
+    cutoff = time.time() - settings.INGEST_JOB_RETENTION_SECONDS
+    for file_id in [k for k, j in _jobs.items() if j.finished_at and j.finished_at < cutoff]:
+        del _jobs[file_id]
+
+
+async def _worker(index: int) -> None:
+    while True:
+        job = await _queue.get()
+        try:
+            if job.stage == "queued":
+                job.task = asyncio.create_task(_run(job))
+                await asyncio.shield(job.task)
+        except asyncio.CancelledError:
+            # The job was cancelled (file deleted) — keep the worker; re-raise on shutdown
+            if job.task is None or not job.task.cancelled():
+                raise
+        except Exception as e:
+            logger.error(f"Ingestion worker {index}: unexpected error for {job.file_id}: {e}", exc_info=True)
+        finally:
+            _queue.task_done()
+
+
+async def _set_file(file_id: str, data: dict) -> None:
+    db = get_supabase()
+    await run_query(db.table("knowledge_base_files").update({**data, "updated_at": "now()"}).eq("id", file_id))
+
+
+async def _run(job: IngestionJob) -> None:
+    from app.services.document_processor import process_and_upsert
+    from app.services.lexical_index import get_lexical_index
+    from app.services.query_cache import knowledge_base_changed
+    from app.services.vector_db import acquire_provider
+
+    job.update(stage="parsing", started_at=time.time())
+
+    async def report_progress(progress: dict) -> None:
+        job.update(stage="embedding", chunks=progress["chunks"], progress=progress)
+        await _set_file(job.file_id, {"progress": job.snapshot()})
+
+    try:
+        await _set_file(job.file_id, {"status": "processing"})
+        config = job.kb.get("config") or {}
+        provider = await acquire_provider(job.kb["provider"], config)
+        chunk_ids = await process_and_upsert(
+            job.path, job.filename, job.file_id, provider,
+            namespace=config.get("namespace"),
+            on_progress=report_progress,
+            executor=_get_pool(),
+            existing_ids=job.existing_ids,
+            lexical_index=get_lexical_index(job.kb["id"]),
+        )
+        chunk_count = len(chunk_ids)
+        job.update(stage="completed", chunks=chunk_count, finished_at=time.time())
+        await _set_file(job.file_id, {
+            "status": "completed",
+            "chunk_count": chunk_count,
+            "chunk_ids": chunk_ids,
+            "error_message": None,
+            "progress": job.snapshot(),
+        })
+        await knowledge_base_changed(job.kb["id"])
+        snap = job.snapshot()
+        logger.info(
+            f"Ingestion completed: {job.filename} — {chunk_count} chunks in {snap['running_seconds']}s "
+            f"({snap['chunks_per_second']} chunks/s)"
+        )
+    except asyncio.CancelledError:
+        logger.info(f"Ingestion cancelled: {job.filename} ({job.file_id})")
+        raise
+    except Exception as e:
+        logger.error(f"File processing error for {job.filename}: {e}", exc_info=True)
+        job.update(stage="failed", error=str(e), finished_at=time.time())
+        try:
+            await _set_file(job.file_id, {"status": "failed", "error_message": str(e), "progress": job.snapshot()})
+        except Exception as db_error:
+            logger.error(f"Failed to record ingestion failure for {job.file_id}: {db_error}")
+    finally:
+        Path(job.path).unlink(missing_ok=True)
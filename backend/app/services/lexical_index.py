@@ -0,0 +1,169 @@
+"""Per-knowledge-base BM25 index of chunk text, for hybrid retrieval.
+
+Embeddings match product codes, names and numbers poorly ("AB-1234",
+"plan 499"); a lexical index matches them exactly. Every chunk upserted to
+a KB's vector provider is also written here by the ingestion pipeline, and
+``rag.KnowledgeRetriever`` fuses BM25 hits with vector hits (reciprocal
+rank fusion), falling back to BM25 alone when the vector backend is slow.
+
+Each KB has a SQLite file under ``LEXICAL_INDEX_DIR`` holding the chunks
+(``docs``) and an FTS5 index over their text, ranked with FTS5's built-in
+``bm25()``. The tokenizer keeps Unicode letters, digits and combining marks
+together, so Devanagari words are not split at vowel signs. WAL mode lets
+the API process (ingestion) and voice workers (queries) share the file, as
+with ``LOCAL_VECTOR_DIR``. All calls run in a thread.
+"""
+import asyncio
+import logging
+import re
+import sqlite3
+import threading
+from pathlib import Path
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    rowid INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    file_id TEXT,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_docs_file_id ON docs(file_id);
+CREATE VIRTUAL TABLE IF NOT EXISTS docs_fts USING fts5(
+    text, content='docs', content_rowid='rowid',
+    tokenize="unicode61 categories 'L* N* Co M*'"
+);
+CREATE TRIGGER IF NOT EXISTS docs_ai AFTER INSERT ON docs BEGIN
+    INSERT INTO docs_fts(rowid, text) VALUES (new.rowid, new.text);
+END;
+CREATE TRIGGER IF NOT EXISTS docs_ad AFTER DELETE ON docs BEGIN
+    INSERT INTO docs_fts(docs_fts, rowid, text) VALUES ('delete', old.rowid, old.text);
+END;
+"""
+
+# SQLite's default limit on bound parameters per statement is 999 on older builds
+_DELETE_CHUNK = 400
+
+# Query terms beyond this add latency without changing the top hits
+_MAX_QUERY_TERMS = 32
+
+_EDGE_PUNCTUATION = ".,;:!?\"'()[]{}<>«»“”‘’"
+
+
+def build_match_query(text: str) -> str | None:
+    """FTS5 MATCH expression for free text: any of its whitespace-separated terms.
+
+    Each term is quoted, so punctuation inside it ("AB-1234", "9.30") becomes
+    a phrase of its tokens rather than FTS5 syntax.
+    """
+    terms = []
+    for raw in text.split():
+        term = raw.strip(_EDGE_PUNCTUATION)
+        if term and re.search(r"\w", term):
+            terms.append('"' + term.replace('"', '""') + '"')
+    if not terms:
+        return None
+    return " OR ".join(dict.fromkeys(terms[:_MAX_QUERY_TERMS]))
+
+
+class LexicalIndex:
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    # ── Sync API (run in a thread by the async wrappers) ─────────
+
+    def upsert_sync(self, chunks: list[tuple[str, str, str]]) -> None:
+        """Add ``(id, file_id, text)`` rows. Ids are content-addressed, so existing ids are left as they are."""
+        with self._lock:
+            conn = self._connect()
+            conn.executemany("INSERT OR IGNORE INTO docs (id, file_id, text) VALUES (?, ?, ?)", chunks)
+            conn.commit()
+
+    def delete_sync(self, ids: list[str] | None = None, file_id: str | None = None) -> None:
+        with self._lock:
+            conn = self._connect()
+            if file_id is not None:
+                conn.execute("DELETE FROM docs WHERE file_id = ?", (file_id,))
+            for i in range(0, len(ids or ()), _DELETE_CHUNK):
+                chunk = ids[i:i + _DELETE_CHUNK]
+                conn.execute(f"DELETE FROM docs WHERE id IN ({','.join('?' * len(chunk))})", chunk)
+            conn.commit()
+
+    def search_sync(self, text: str, top_k: int) -> list[dict]:
+        """Top-k chunks by BM25. ``score`` is FTS5's bm25() negated, so higher is better."""
+        query = build_match_query(text)
+        if query is None or not self.exists():
+            return []
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT docs.id, docs.file_id, docs.text, bm25(docs_fts) AS rank "
+                "FROM docs_fts JOIN docs ON docs.rowid = docs_fts.rowid "
+                "WHERE docs_fts MATCH ? ORDER BY rank LIMIT ?",
+                (query, top_k),
+            ).fetchall()
+        return [{"id": r[0], "file_id": r[1], "text": r[2], "score": -r[3]} for r in rows]
+
+    def stats_sync(self) -> dict:
+        if not self.exists():
+            return {"chunks": 0, "size_bytes": 0}
+        with self._lock:
+            chunks = self._connect().execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+        return {"chunks": chunks, "size_bytes": self.path.stat().st_size}
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    # ── Async API ────────────────────────────────────────────────
+
+    async def upsert(self, chunks: list[tuple[str, str, str]]) -> None:
+        await asyncio.to_thread(self.upsert_sync, chunks)
+
+    async def delete(self, ids: list[str] | None = None, file_id: str | None = None) -> None:
+        await asyncio.to_thread(self.delete_sync, ids, file_id)
+
+    async def search(self, text: str, top_k: int) -> list[dict]:
+        return await asyncio.to_thread(self.search_sync, text, top_k)
+
+
+_indexes: dict[str, LexicalIndex] = {}
+
+
+def get_lexical_index(kb_id: str) -> LexicalIndex | None:
+    """The KB's BM25 index, or None when hybrid retrieval is disabled."""
+    if not settings.RAG_HYBRID_ENABLED or not kb_id:
+        return None
+    index = _indexes.get(kb_id)
+    if index is None:
+        index = _indexes[kb_id] = LexicalIndex(Path(settings.LEXICAL_INDEX_DIR) / f"{kb_id}.sqlite3")
+    return index
+
+
+def drop_lexical_index(kb_id: str) -> None:
+    """Remove a deleted KB's index files."""
+    index = _indexes.pop(kb_id, None)
+    if index is not None:
+        index.close()
+    path = Path(settings.LEXICAL_INDEX_DIR) / f"{kb_id}.sqlite3"
+    for suffix in ("", "-wal", "-shm"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
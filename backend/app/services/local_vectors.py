@@ -0,0 +1,580 @@
+"""Embedded on-disk vector store backing the ``local`` knowledge base provider.
+
+Each namespace is a directory holding:
+
+- ``manifest.json``         — ``{"dim": int, "generation": int}``
+- ``vectors-<gen>.f32``     — float32 rows, L2-normalised, memory-mapped
+- ``log-<gen>.jsonl``       — append-only log: ``{"op": "put", "row", "id", "metadata"}``
+  and ``{"op": "del", "row"}``
+
+The log is the commit point: a vector row is written first, and only becomes
+visible once its ``put`` line is appended. Upserting an existing id writes a
+new row and tombstones the old one; deletes only tombstone. When tombstones
+make up a large share of the rows, ``compact()`` rewrites live rows into the
+next generation's files and swaps the manifest atomically.
+
+Stores load lazily on first use and catch up on other processes' writes (the
+API uploads, the voice worker queries) by reading new log lines before each
+operation — a ``stat()`` when nothing changed. Writers serialise on an
+``flock`` so the API process and scripts can write the same namespace.
+
+Queries are a single matrix-vector product over the mapped rows with
+``argpartition`` top-k — no per-row Python work.
+"""
+import fcntl
+import json
+import logging
+import os
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_INITIAL_CAPACITY = 1024
+_COMPACT_MIN_DEAD = 1024
+_COMPACT_DEAD_RATIO = 0.3
+
+_IVF_MIN_TRAIN_ROWS = 10_000
+_IVF_RETRAIN_GROWTH = 4
+_IVF_SAMPLE_PER_LIST = 64
+_IVF_DEFAULT_NPROBE = 16
+
+
+def namespace_dir(root: str | Path, index_name: str, namespace: str | None) -> Path:
+    """Directory for an index/namespace pair (names sanitised for the filesystem)."""
+    def clean(name: str) -> str:
+        return re.sub(r"[^\w.-]", "_", name)
+    return Path(root) / clean(index_name or "default") / clean(namespace or "_default")
+
+
+def _normalise(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32, copy=False)
+
+
+class LocalVectorStore:
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        self._lock = threading.RLock()
+        self._reset_state()
+
+    # ── State / loading ──────────────────────────────────────────
+
+    def _reset_state(self) -> None:
+        self.dim: int | None = None
+        self.generation = -1
+        self._vectors: np.memmap | None = None
+        self._ids: list[str | None] = []
+        self._metadata: list[dict | None] = []
+        self._alive = np.zeros(0, dtype=bool)
+        self._row_of: dict[str, int] = {}
+        self._log_offset = 0
+        self._log_size_seen = -1
+        self._manifest_mtime = None
+        self.dead = 0
+
+    @property
+    def _manifest_path(self) -> Path:
+        return self.directory / "manifest.json"
+
+    def _vectors_path(self, generation: int) -> Path:
+        return self.directory / f"vectors-{generation}.f32"
+
+    def _log_path(self, generation: int) -> Path:
+        return self.directory / f"log-{generation}.jsonl"
+
+    def _generation_files(self, generation: int) -> list[Path]:
+        return [self._vectors_path(generation), self._log_path(generation)]
+
+    # ── Index hooks (overridden by IVFVectorStore) ───────────────
+
+    def _load_generation(self) -> None:
+        """Called after switching to a new generation's files."""
+
+    def _prepare_generation(self, generation: int, matrix: np.ndarray) -> None:
+        """Called during compaction, before ``generation`` is published, with its rows."""
+
+    def _assign(self, matrix: np.ndarray) -> np.ndarray | None:
+        """Per-row index data stored in the log as ``"list"`` (None: nothing to store)."""
+        return None
+
+    def _candidate_rows(self, q: np.ndarray) -> np.ndarray | None:
+        """Rows worth scoring for query ``q`` (None: scan every row)."""
+        return None
+
+    def _refresh(self) -> None:
+        """Bring in-memory state up to date with the files on disk."""
+        try:
+            st = self._manifest_path.stat()
+            mtime = (st.st_ino, st.st_mtime_ns)
+        except FileNotFoundError:
+            if self.generation != -1:
+                self._reset_state()
+            return
+        if mtime != self._manifest_mtime:
+            manifest = json.loads(self._manifest_path.read_text())
+            if manifest["generation"] != self.generation:
+                self._reset_state()
+                self.dim = manifest["dim"]
+                self.generation = manifest["generation"]
+                self._load_generation()
+            self._manifest_mtime = mtime
+
+        log_path = self._log_path(self.generation)
+        try:
+            size = log_path.stat().st_size
+        except FileNotFoundError:
+            return
+        if size == self._log_size_seen:
+            return
+
+        with open(log_path, "rb") as f:
+            f.seek(self._log_offset)
+            data = f.read()
+        # Only apply complete lines — a writer may be mid-append
+        end = data.rfind(b"\n") + 1
+        for line in data[:end].splitlines():
+            if line.strip():
+                self._apply(json.loads(line))
+        self._log_offset += end
+        self._log_size_seen = size if end == len(data) else -1
+
+    def _apply(self, entry: dict) -> None:
+        row = entry["row"]
+        if entry["op"] == "put":
+            while len(self._ids) < row:
+                self._ids.append(None)
+                self._metadata.append(None)
+            if row == len(self._ids):
+                self._ids.append(entry["id"])
+                self._metadata.append(entry.get("metadata") or {})
+            else:
+                self._ids[row] = entry["id"]
+                self._metadata[row] = entry.get("metadata") or {}
+            if row >= len(self._alive):
+                grown = np.zeros(max(row + 1, len(self._alive) * 2, _INITIAL_CAPACITY), dtype=bool)
+                grown[:len(self._alive)] = self._alive
+                self._alive = grown
+            self._alive[row] = True
+            self._row_of[entry["id"]] = row
+        elif entry["op"] == "del":
+            if row < len(self._alive) and self._alive[row]:
+                self._alive[row] = False
+                self.dead += 1
+                vid = self._ids[row]
+                if self._row_of.get(vid) == row:
+                    del self._row_of[vid]
+
+    def _mapped(self) -> np.ndarray:
+        """Read-only view of the committed rows, re-mapping if the file grew."""
+        rows = len(self._ids)
+        if rows == 0:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        if self._vectors is None or self._vectors.shape[0] < rows:
+            path = self._vectors_path(self.generation)
+            capacity = path.stat().st_size // (self.dim * 4)
+            self._vectors = np.memmap(path, dtype=np.float32, mode="r", shape=(capacity, self.dim))
+        return self._vectors[:rows]
+
+    # ── Writing ──────────────────────────────────────────────────
+
+    def _writer_lock(self):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        return _FileLock(self.directory / ".lock")
+
+    def _write_manifest(self, dim: int | None, generation: int) -> None:
+        """Start ``generation`` with empty files, or publish it if its files are already written."""
+        for path in (self._vectors_path(generation), self._log_path(generation)):
+            if not path.exists():
+                path.write_bytes(b"")
+        tmp = self.directory / "manifest.json.tmp"
+        tmp.write_text(json.dumps({"dim": dim, "generation": generation}))
+        os.replace(tmp, self._manifest_path)
+
+    def _append_rows(self, vectors: np.ndarray, start: int) -> None:
+        path = self._vectors_path(self.generation)
+        needed = (start + len(vectors)) * self.dim * 4
+        size = path.stat().st_size
+        if size < needed:
+            # Grow geometrically so appends stay amortised O(1)
+            capacity_rows = max(_INITIAL_CAPACITY, size // (self.dim * 4))
+            while capacity_rows * self.dim * 4 < needed:
+                capacity_rows *= 2
+            with open(path, "r+b") as f:
+                f.truncate(capacity_rows * self.dim * 4)
+        out = np.memmap(path, dtype=np.float32, mode="r+", offset=start * self.dim * 4, shape=vectors.shape)
+        out[:] = vectors
+        out.flush()
+        del out
+
+    def _append_log(self, entries: list[dict]) -> None:
+        with open(self._log_path(self.generation), "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in entries))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def upsert(self, vectors: list[dict]) -> None:
+        """Insert or replace ``[{"id", "values", "metadata"}]``."""
+        if not vectors:
+            return
+        matrix = _normalise(np.asarray([v["values"] for v in vectors], dtype=np.float32))
+        with self._lock, self._writer_lock():
+            self._refresh()
+            if self.dim is None:
+                self._write_manifest(matrix.shape[1], self.generation + 1)
+                self._refresh()
+            if matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {matrix.shape[1]} does not match index dimension {self.dim}")
+
+            start = len(self._ids)
+            self._append_rows(matrix, start)
+            lists = self._assign(matrix)
+            entries = []
+            for i, v in enumerate(vectors):
+                old = self._row_of.get(v["id"])
+                if old is not None:
+                    entries.append({"op": "del", "row": old})
+                entry = {"op": "put", "row": start + i, "id": v["id"], "metadata": v.get("metadata", {})}
+                if lists is not None:
+                    entry["list"] = int(lists[i])
+                entries.append(entry)
+            self._append_log(entries)
+            self._refresh()
+            self._maybe_compact()
+
+    def delete(self, ids: list[str]) -> int:
+        """Tombstone the given ids. Returns how many were live."""
+        with self._lock, self._writer_lock():
+            self._refresh()
+            rows = [self._row_of[i] for i in ids if i in self._row_of]
+            if rows:
+                self._append_log([{"op": "del", "row": r} for r in rows])
+                self._refresh()
+                self._maybe_compact()
+            return len(rows)
+
+    def clear(self) -> None:
+        """Delete every vector in the namespace."""
+        with self._lock, self._writer_lock():
+            self._refresh()
+            old_gen = self.generation
+            # A new (dimensionless) generation, so other processes drop their state
+            self._write_manifest(None, old_gen + 1)
+            for path in self._generation_files(old_gen):
+                path.unlink(missing_ok=True)
+            self._refresh()
+
+    def _maybe_compact(self) -> None:
+        if self.dead >= _COMPACT_MIN_DEAD and self.dead >= _COMPACT_DEAD_RATIO * len(self._ids):
+            self._compact_locked()
+
+    def compact(self) -> None:
+        """Rewrite live rows into a fresh generation, dropping tombstones."""
+        with self._lock, self._writer_lock():
+            self._refresh()
+            self._compact_locked()
+
+    def _compact_locked(self) -> None:
+        if self.dim is None:
+            return
+        old_gen = self.generation
+        new_gen = old_gen + 1
+        live = np.flatnonzero(self._alive[:len(self._ids)])
+        matrix = np.asarray(self._mapped()[live]) if len(live) else np.zeros((0, self.dim), np.float32)
+
+        self._prepare_generation(new_gen, matrix)
+        lists = self._assign(matrix)
+        entries = []
+        for new_row, old_row in enumerate(live):
+            entry = {"op": "put", "row": new_row, "id": self._ids[old_row], "metadata": self._metadata[old_row]}
+            if lists is not None:
+                entry["list"] = int(lists[new_row])
+            entries.append(entry)
+
+        self._vectors_path(new_gen).write_bytes(matrix.tobytes())
+        with open(self._log_path(new_gen), "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(e) + "\n" for e in entries))
+            f.flush()
+            os.fsync(f.fileno())
+        self._write_manifest(self.dim, new_gen)
+
+        # Readers that still map the old files keep them alive until they refresh
+        for path in self._generation_files(old_gen):
+            path.unlink(missing_ok=True)
+        dropped = self.dead
+        self._refresh()
+        logger.info(f"Compacted {self.directory}: dropped {dropped} tombstoned rows, {len(live)} live")
+
+    # ── Reading ──────────────────────────────────────────────────
+
+    def refresh(self) -> int:
+        """Catch up with the files on disk and map the rows; returns the live row count.
+
+        Does all of a query's file I/O, so ``search()`` right after it is pure
+        in-memory work.
+        """
+        with self._lock:
+            self._refresh()
+            self._mapped()
+            return len(self._row_of)
+
+    def query(self, embedding: list[float], top_k: int = 5) -> list[dict]:
+        """Cosine top-k over live rows: ``[{"id", "score", "text", "metadata"}]``."""
+        with self._lock:
+            self._refresh()
+            return self.search(embedding, top_k)
+
+    def search(self, embedding: list[float], top_k: int = 5) -> list[dict]:
+        """``query()`` against the state loaded by the last refresh, without touching the log."""
+        with self._lock:
+            if not self._row_of:
+                return []
+            q = _normalise(np.asarray(embedding, dtype=np.float32))
+            if q.shape[0] != self.dim:
+                raise ValueError(f"Query dimension {q.shape[0]} does not match index dimension {self.dim}")
+
+            rows = self._candidate_rows(q)
+            if rows is None:
+                scores = self._mapped() @ q
+                if self.dead:
+                    scores[~self._alive[:len(scores)]] = -np.inf
+            else:
+                rows = rows[self._alive[rows]]
+                if not len(rows):
+                    return []
+                scores = self._mapped()[rows] @ q
+
+            k = min(top_k, len(scores), len(self._row_of))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            return [
+                {
+                    "id": self._ids[r],
+                    "score": float(scores[i]),
+                    "text": self._metadata[r].get("text", ""),
+                    "metadata": self._metadata[r],
+                }
+                for i, r in zip(top, top if rows is None else rows[top])
+            ]
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._row_of)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return {
+                "live": len(self._row_of),
+                "tombstoned": self.dead,
+                "dim": self.dim,
+                "generation": self.generation,
+            }
+
+
+class IVFVectorStore(LocalVectorStore):
+    """Inverted-file (IVF) approximate index over the same on-disk layout.
+
+    Rows are partitioned by spherical k-means into ``nlist`` clusters; a query
+    scores only the rows in the ``nprobe`` clusters whose centroids are
+    closest to it. ``nprobe`` is the recall/latency knob: higher scans more
+    rows and misses fewer true neighbours.
+
+    Each row's cluster is stored in its log entry, so new rows are assigned
+    incrementally on upsert. Centroids are (re)trained during compaction —
+    first once the namespace reaches ``_IVF_MIN_TRAIN_ROWS`` live rows (below
+    that a full scan is already fast and this behaves like the flat store),
+    then whenever it has grown ``_IVF_RETRAIN_GROWTH``-fold since the last
+    training. They persist as ``ivf-<gen>.npz`` next to the generation's files.
+    """
+
+    def __init__(self, directory: str | Path, nlist: int | None = None, nprobe: int = _IVF_DEFAULT_NPROBE):
+        self.nlist_config = nlist
+        self.nprobe = nprobe
+        super().__init__(directory)
+
+    def _reset_state(self) -> None:
+        super()._reset_state()
+        self._centroids: np.ndarray | None = None
+        self._trained_rows = 0
+        self._lists = np.full(0, -1, dtype=np.int32)
+        self._inverted: tuple[np.ndarray, np.ndarray, np.ndarray] | None = None
+        self._retrain = False
+
+    def _ivf_path(self, generation: int) -> Path:
+        return self.directory / f"ivf-{generation}.npz"
+
+    def _generation_files(self, generation: int) -> list[Path]:
+        return super()._generation_files(generation) + [self._ivf_path(generation)]
+
+    # ── Hooks ────────────────────────────────────────────────────
+
+    def _load_generation(self) -> None:
+        try:
+            with np.load(self._ivf_path(self.generation)) as data:
+                self._centroids = data["centroids"]
+                self._trained_rows = int(data["trained_rows"])
+        except FileNotFoundError:
+            self._centroids = None
+
+    def _apply(self, entry: dict) -> None:
+        super()._apply(entry)
+        if entry["op"] != "put":
+            return
+        row = entry["row"]
+        if row >= len(self._lists):
+            grown = np.full(max(row + 1, len(self._lists) * 2, _INITIAL_CAPACITY), -1, dtype=np.int32)
+            grown[:len(self._lists)] = self._lists
+            self._lists = grown
+        self._lists[row] = entry.get("list", -1)
+        self._inverted = None
+
+    def _assign(self, matrix: np.ndarray) -> np.ndarray | None:
+        if self._centroids is None:
+            return None
+        return _nearest_centroid(matrix, self._centroids)
+
+    def _prepare_generation(self, generation: int, matrix: np.ndarray) -> None:
+        if not self._retrain:
+            return
+        self._retrain = False
+        nlist = self.nlist_config or int(np.clip(4 * np.sqrt(len(matrix)), 16, 4096))
+        nlist = min(nlist, len(matrix))
+        started = time.perf_counter()
+        self._centroids = _train_centroids(matrix, nlist)
+        self._trained_rows = len(matrix)
+        np.savez(self._ivf_path(generation), centroids=self._centroids, trained_rows=self._trained_rows)
+        logger.info(
+            f"Trained IVF index for {self.directory}: {nlist} lists over {len(matrix)} rows "
+            f"in {time.perf_counter() - started:.1f}s"
+        )
+
+    def _maybe_compact(self) -> None:
+        live = len(self._row_of)
+        if self._centroids is None:
+            self._retrain = live >= _IVF_MIN_TRAIN_ROWS
+        else:
+            self._retrain = live >= _IVF_RETRAIN_GROWTH * self._trained_rows
+        if self._retrain:
+            self._compact_locked()
+        else:
+            super()._maybe_compact()
+
+    def _compact_locked(self) -> None:
+        # Carry the current centroids into the new generation unless retraining
+        if self._centroids is not None and not self._retrain:
+            np.savez(self._ivf_path(self.generation + 1), centroids=self._centroids, trained_rows=self._trained_rows)
+        super()._compact_locked()
+
+    def _candidate_rows(self, q: np.ndarray) -> np.ndarray | None:
+        if self._centroids is None:
+            return None
+        order, starts, ends = self._inverted_lists()
+        nprobe = min(self.nprobe, len(self._centroids))
+        probe = np.argpartition(-(self._centroids @ q), nprobe - 1)[:nprobe]
+        # Rows without a list (written before training) are always scanned
+        parts = [order[:starts[0]]] + [order[starts[c + 1]:ends[c + 1]] for c in probe]
+        return np.concatenate(parts)
+
+    def _inverted_lists(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Rows grouped by list: ``order`` plus per-list [start, end) (index 0 = unassigned)."""
+        if self._inverted is None:
+            lists = self._lists[:len(self._ids)]
+            order = np.argsort(lists, kind="stable")
+            sorted_lists = lists[order]
+            ids = np.arange(-1, len(self._centroids))
+            self._inverted = (
+                order,
+                np.searchsorted(sorted_lists, ids, side="left"),
+                np.searchsorted(sorted_lists, ids, side="right"),
+            )
+        return self._inverted
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        with self._lock:
+            stats.update({
+                "index": "ivf",
+                "nlist": len(self._centroids) if self._centroids is not None else None,
+                "nprobe": self.nprobe,
+                "trained_rows": self._trained_rows,
+            })
+        return stats
+
+
+def _nearest_centroid(matrix: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+    out = np.empty(len(matrix), dtype=np.int32)
+    for i in range(0, len(matrix), chunk):
+        out[i:i + chunk] = np.argmax(matrix[i:i + chunk] @ centroids.T, axis=1)
+    return out
+
+
+def _train_centroids(matrix: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on (a sample of) L2-normalised rows."""
+    rng = np.random.default_rng(seed)
+    sample_size = min(len(matrix), nlist * _IVF_SAMPLE_PER_LIST)
+    sample = matrix[rng.choice(len(matrix), sample_size, replace=False)] if sample_size < len(matrix) else matrix
+    centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        assign = _nearest_centroid(sample, centroids)
+        order = np.argsort(assign, kind="stable")
+        counts = np.bincount(assign, minlength=nlist)
+        sums = np.zeros_like(centroids)
+        nonempty = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))[nonempty]
+        sums[nonempty] = np.add.reduceat(sample[order], starts, axis=0)
+        # Re-seed empty lists from random rows so every list stays useful
+        empty = np.flatnonzero(counts == 0)
+        if len(empty):
+            sums[empty] = sample[rng.choice(len(sample), len(empty))]
+        centroids = _normalise(sums)
+    return centroids
+
+
+class _FileLock:
+    """Exclusive ``flock`` held for the duration of a write."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._fd: int | None = None
+
+    def __enter__(self):
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self._fd, fcntl.LOCK_UN)
+        os.close(self._fd)
+        self._fd = None
+
+
+# One store per namespace directory per process, shared by every provider instance
+_stores: dict[Path, LocalVectorStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(directory: str | Path, index_type: str = "flat", nlist: int | None = None,
+              nprobe: int | None = None) -> LocalVectorStore:
+    """Shared store for a namespace directory; ``index_type`` is ``flat`` or ``ivf``."""
+    directory = Path(directory).resolve()
+    with _stores_lock:
+        store = _stores.get(directory)
+        if index_type == "ivf":
+            nprobe = nprobe or _IVF_DEFAULT_NPROBE
+            if not (isinstance(store, IVFVectorStore) and store.nlist_config == nlist and store.nprobe == nprobe):
+                store = IVFVectorStore(directory, nlist=nlist, nprobe=nprobe)
+        elif index_type == "flat":
+            if store is None or type(store) is not LocalVectorStore:
+                store = LocalVectorStore(directory)
+        else:
+            raise ValueError(f"Unsupported local index type: {index_type}. Available: ['flat', 'ivf']")
+        _stores[directory] = store
+        return store
@@ -0,0 +1,307 @@
+"""Post-call pipeline: durable job queue + stage handlers.
+
+When a call ends the voice worker only updates the call record and enqueues
+one ``post_call_jobs`` row per applicable stage. The stages — ``call_ended``
+and ``transcript_ready`` webhooks and LLM ``extraction`` — are run by a
+separate consumer (``python -m app.tasks.post_call_worker``) so voice worker
+capacity is never spent on post-call work, and each stage can be scaled
+independently by running consumers restricted to it.
+
+Jobs are claimed with a conditional update (``status = pending`` →
+``running``), so any number of consumers can poll the same table. A job that
+fails is put back to ``pending`` with exponential backoff in ``run_after``
+until ``max_attempts`` is reached. Jobs left ``running`` by a crashed consumer
+become claimable again after ``POST_CALL_VISIBILITY_TIMEOUT_SECONDS``.
+"""
+import json
+import logging
+from datetime import datetime, timezone, timedelta
+
+from app.config import settings
+from app.database import get_supabase, run_query
+from app.services import config_cache
+from app.services.webhooks import fire_webhook, get_http_session
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("call_ended", "transcript_ready", "extraction")
+
+
+# ── Stage handlers ────────────────────────────────────────────────
+# Each handler raises on a retryable failure and returns normally otherwise.
+
+async def _stage_call_ended(call_id: str, agent_config: dict, payload: dict) -> None:
+    delivered = await fire_webhook(agent_config, "call_ended", {
+        "call_id": call_id,
+        "duration_seconds": payload.get("duration_seconds"),
+        "end_reason": payload.get("end_reason"),
+    }, attempts=1)
+    if not delivered:
+        raise RuntimeError("call_ended webhook delivery failed")
+
+
+async def _stage_transcript_ready(call_id: str, agent_config: dict, payload: dict) -> None:
+    db = get_supabase()
+    transcript_result = await run_query(
+        db.table("transcript_entries")
+        .select("role,content,timestamp")
+        .eq("call_id", call_id)
+        .order("timestamp")
+    )
+    transcript = transcript_result.data or []
+    if not transcript:
+        return
+    delivered = await fire_webhook(agent_config, "transcript_ready", {
+        "call_id": call_id,
+        "transcript": transcript,
+        "turn_count": len(transcript),
+    }, attempts=1)
+    if not delivered:
+        raise RuntimeError("transcript_ready webhook delivery failed")
+
+
+async def _stage_extraction(call_id: str, agent_config: dict, payload: dict) -> None:
+    await run_post_call_extraction(call_id, agent_config)
+
+
+_HANDLERS = {
+    "call_ended": _stage_call_ended,
+    "transcript_ready": _stage_transcript_ready,
+    "extraction": _stage_extraction,
+}
+
+
+async def run_post_call_extraction(call_id: str, agent_config: dict) -> None:
+    """Extract structured data from call transcript using LLM and save to call metadata.
+
+    Returns quietly when extraction is not configured or there is nothing to
+    extract; raises when the transcript, LLM call or save fails so the job is retried.
+    """
+    extraction_cfg = (agent_config.get("metadata") or {}).get("post_call_extraction", {})
+    if not extraction_cfg.get("enabled"):
+        return
+
+    fields = extraction_cfg.get("fields", [])
+    if not fields:
+        return
+
+    db = get_supabase()
+
+    # Load transcript
+    transcript_result = await run_query(
+        db.table("transcript_entries")
+        .select("role,content")
+        .eq("call_id", call_id)
+        .order("timestamp")
+    )
+    entries = transcript_result.data or []
+
+    if not entries:
+        logger.info(f"Post-call extraction: no transcript for call {call_id}, skipping")
+        return
+
+    # Build transcript text
+    transcript_text = "\n".join(
+        f"{e['role'].upper()}: {e['content']}" for e in entries
+    )
+
+    # Build field schema description
+    fields_desc = "\n".join(
+        f"- {f['name']} ({f.get('type', 'string')}): {f.get('description', '')}"
+        for f in fields
+    )
+
+    prompt = (
+        f"You are a data extraction assistant. Given the following call transcript, "
+        f"extract the requested fields and return ONLY a valid JSON object with those fields.\n\n"
+        f"Fields to extract:\n{fields_desc}\n\n"
+        f"If a field cannot be determined from the transcript, use null.\n\n"
+        f"Transcript:\n{transcript_text}\n\n"
+        f"Return only the JSON object, no explanation."
+    )
+
+    import openai as openai_sdk
+    client = openai_sdk.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    response = await client.chat.completions.create(
+        model="gpt-4o-mini",
+        messages=[{"role": "user", "content": prompt}],
+        temperature=0,
+        response_format={"type": "json_object"},
+    )
+    extracted = json.loads(response.choices[0].message.content)
+    logger.info(f"Post-call extraction for {call_id}: {extracted}")
+
+    # Save extracted data to call metadata
+    call_result = await run_query(db.table("calls").select("metadata").eq("id", call_id))
+    existing_meta = (call_result.data[0].get("metadata") or {}) if call_result.data else {}
+    existing_meta["extracted_data"] = extracted
+    await run_query(db.table("calls").update({"metadata": existing_meta}).eq("id", call_id))
+
+    # POST to extraction-specific webhook if configured
+    webhook_url = extraction_cfg.get("webhook_url", "").strip()
+    if webhook_url:
+        try:
+            import aiohttp
+            payload = {"call_id": call_id, "extracted_data": extracted}
+            http = get_http_session()
+            async with http.post(webhook_url, json=payload, timeout=aiohttp.ClientTimeout(total=10)):
+                pass
+            logger.info(f"Post-call extraction webhook sent for {call_id}")
+        except Exception as e:
+            logger.error(f"Post-call extraction: webhook failed for {call_id}: {e}")
+
+    # Fire agent-level extraction_completed webhook event
+    await fire_webhook(agent_config, "extraction_completed", {
+        "call_id": call_id,
+        "extracted_data": extracted,
+    })
+
+
+# ── Producer side (voice worker) ─────────────────────────────────
+
+def applicable_stages(agent_config: dict) -> list[str]:
+    """Stages worth enqueueing for this agent's configuration."""
+    metadata = agent_config.get("metadata") or {}
+    stages = []
+    if (metadata.get("webhook_settings", {}).get("url") or "").strip():
+        stages += ["call_ended", "transcript_ready"]
+    extraction_cfg = metadata.get("post_call_extraction", {})
+    if extraction_cfg.get("enabled") and extraction_cfg.get("fields"):
+        stages.append("extraction")
+    return stages
+
+
+async def enqueue_post_call(call_id: str, agent_config: dict, payload: dict) -> None:
+    """Enqueue post-call stages for a finished call.
+
+    Falls back to running the stages inline if the queue is disabled or the
+    insert fails, so post-call events are never silently lost.
+    """
+    stages = applicable_stages(agent_config)
+    if not stages:
+        return
+
+    if settings.POST_CALL_QUEUE_ENABLED:
+        try:
+            await run_query(get_supabase().table("post_call_jobs").insert([
+                {
+                    "call_id": call_id,
+                    "agent_id": agent_config.get("id"),
+                    "stage": stage,
+                    "payload": payload,
+                    "max_attempts": settings.POST_CALL_MAX_ATTEMPTS,
+                }
+                for stage in stages
+            ]))
+            logger.info(f"Post-call jobs enqueued for {call_id}: {stages}")
+            await _warn_if_unclaimed()
+            return
+        except Exception as e:
+            logger.error(f"Failed to enqueue post-call jobs for {call_id}, running inline: {e}")
+
+    for stage in stages:
+        try:
+            await _HANDLERS[stage](call_id, agent_config, payload)
+        except Exception as e:
+            logger.error(f"Post-call stage '{stage}' failed for {call_id}: {e}")
+
+
+async def _warn_if_unclaimed() -> None:
+    """Log a warning if a due job has gone unclaimed, which means no consumer is running."""
+    overdue = datetime.now(timezone.utc) - timedelta(seconds=settings.POST_CALL_UNCLAIMED_WARN_SECONDS)
+    try:
+        result = await run_query(
+            get_supabase().table("post_call_jobs")
+            .select("id,stage,run_after")
+            .eq("status", "pending")
+            .lt("run_after", overdue.isoformat())
+            .order("run_after")
+            .limit(1)
+        )
+    except Exception as e:
+        logger.debug(f"Post-call backlog check failed: {e}")
+        return
+    if result.data:
+        job = result.data[0]
+        logger.warning(
+            f"Post-call job {job['id']} ({job['stage']}) has been due since {job['run_after']} and is still "
+            f"unclaimed — is the consumer running? Start it with: python -m app.tasks.post_call_worker"
+        )
+
+
+# ── Consumer side ────────────────────────────────────────────────
+
+async def claim_jobs(stages: list[str], limit: int) -> list[dict]:
+    """Claim up to ``limit`` due jobs for the given stages. Safe across consumers."""
+    db = get_supabase()
+    now = datetime.now(timezone.utc)
+    # 'Z' suffix rather than '+00:00' — values are embedded in a PostgREST or() filter
+    due = now.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+    stale_before = (now - timedelta(seconds=settings.POST_CALL_VISIBILITY_TIMEOUT_SECONDS)).strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+    candidates = await run_query(
+        db.table("post_call_jobs")
+        .select("id,status,attempts")
+        .in_("stage", stages)
+        .or_(f"and(status.eq.pending,run_after.lte.{due}),"
+             f"and(status.eq.running,locked_at.lt.{stale_before})")
+        .order("created_at")
+        .limit(limit)
+    )
+
+    claimed = []
+    for job in candidates.data or []:
+        # Conditional update on the status we saw — only one consumer wins
+        result = await run_query(
+            db.table("post_call_jobs")
+            .update({
+                "status": "running",
+                "attempts": (job.get("attempts") or 0) + 1,
+                "locked_at": now.isoformat(),
+                "updated_at": now.isoformat(),
+            })
+            .eq("id", job["id"])
+            .eq("status", job["status"])
+            .eq("attempts", job.get("attempts") or 0)
+        )
+        if result.data:
+            claimed.append(result.data[0])
+    return claimed
+
+
+async def run_job(job: dict) -> None:
+    """Run one claimed job and record its outcome (completed / retry / failed)."""
+    db = get_supabase()
+    stage = job["stage"]
+    call_id = job["call_id"]
+    try:
+        handler = _HANDLERS.get(stage)
+        if handler is None:
+            raise ValueError(f"Unknown post-call stage: {stage}")
+        agent_config = await config_cache.agents.get(job["agent_id"]) if job.get("agent_id") else None
+        if not agent_config:
+            raise ValueError(f"Agent not found: {job.get('agent_id')}")
+
+        await handler(call_id, agent_config, job.get("payload") or {})
+        await run_query(db.table("post_call_jobs").update({
+            "status": "completed",
+            "last_error": None,
+            "updated_at": datetime.now(timezone.utc).isoformat(),
+        }).eq("id", job["id"]))
+        logger.info(f"Post-call [{stage}] completed for call {call_id}")
+    except Exception as e:
+        attempts = job.get("attempts") or 1
+        now = datetime.now(timezone.utc)
+        update = {"last_error": str(e)[:1000], "updated_at": now.isoformat()}
+        if attempts >= (job.get("max_attempts") or settings.POST_CALL_MAX_ATTEMPTS):
+            update["status"] = "failed"
+            logger.error(f"Post-call [{stage}] failed permanently for call {call_id}: {e}")
+        else:
+            backoff = min(2 ** attempts * 5, 900)  # 10s, 20s, 40s ... capped at 15 min
+            update["status"] = "pending"
+            update["run_after"] = (now + timedelta(seconds=backoff)).isoformat()
+            logger.warning(f"Post-call [{stage}] attempt {attempts} failed for call {call_id}, retry in {backoff}s: {e}")
+        try:
+            await run_query(db.table("post_call_jobs").update(update).eq("id", job["id"]))
+        except Exception as db_err:
+            logger.error(f"Post-call: failed to record outcome for job {job['id']}: {db_err}")
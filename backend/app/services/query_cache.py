@@ -0,0 +1,284 @@
+"""Two-level cache for in-call RAG lookups, shared by every job process on a host.
+
+Callers ask the same few questions ("opening hours", "pricing") over and
+over, across calls. ``rag.KnowledgeRetriever`` consults two levels before
+doing any work:
+
+1. **query embeddings** — normalized query text → embedding. Case,
+   punctuation and spacing differences share one entry, and a hit skips the
+   ``generate_embedding`` round-trip.
+2. **retrieval results** — (kb_id, top_k, embedding bucket) → top-k matches.
+   The bucket is a SimHash of the embedding (sign bits of fixed random
+   projections, the same in every process), so near-identical query
+   embeddings land together; within a bucket an entry is used only if its
+   embedding's cosine similarity to the query is at least
+   ``RAG_QUERY_CACHE_MIN_SIMILARITY``.
+
+livekit-agents runs each call in its own job process, so both levels live in
+a SQLite file (``RAG_QUERY_CACHE_PATH``, WAL mode, like ``embedding_cache``)
+rather than in memory: a question answered on one call is a hit on the next.
+Entries expire after ``RAG_QUERY_CACHE_TTL_SECONDS``; every
+``_PRUNE_EVERY`` writes expired entries are deleted and each level is
+trimmed to ``RAG_QUERY_CACHE_MAX_ENTRIES``, oldest first. Lookups and writes
+run in a thread so the event loop never waits on disk.
+
+Results are stamped with the KB row's ``updated_at``. ``knowledge_base_changed()``
+bumps it whenever a file is added, replaced or deleted, and deletes the KB's
+results from this host's file. Workers on other hosts stop serving results for
+the old version once their config cache revalidates the row. The retriever reads
+the row through ``config_cache.knowledge_bases.get()`` on every lookup, so this
+happens within ``CONFIG_CACHE_TTL_SECONDS``, even mid-call.
+"""
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+from app.database import get_supabase, run_query
+from app.services import config_cache
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_embeddings (
+    model TEXT NOT NULL,
+    query TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (model, query)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS query_results (
+    kb_id TEXT NOT NULL,
+    top_k INTEGER NOT NULL,
+    bucket INTEGER NOT NULL,
+    version TEXT,
+    vector BLOB NOT NULL,
+    matches TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_query_results_bucket ON query_results(kb_id, top_k, bucket);
+"""
+
+_NON_WORD_RE = re.compile(r"[^\w']+")
+
+_BUCKET_BITS = 12
+
+# Entries kept per bucket; a bucket holds a few paraphrases at most
+_MAX_PER_BUCKET = 8
+
+# Writes between deleting expired entries and trimming each level to its bound
+_PRUNE_EVERY = 100
+
+
+def normalize_query(text: str) -> str:
+    return _NON_WORD_RE.sub(" ", text.lower()).strip()
+
+
+def _unit(embedding: list[float]) -> np.ndarray:
+    vector = np.asarray(embedding, dtype=np.float32)
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class QueryCache:
+    def __init__(self, path: str | Path, ttl: float, max_entries: int, min_similarity: float):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.min_similarity = min_similarity
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._writes_since_prune = 0
+        self._planes: dict[int, np.ndarray] = {}
+        self.embedding_hits = 0
+        self.embedding_misses = 0
+        self.result_hits = 0
+        self.result_misses = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def _bucket(self, vector: np.ndarray) -> int:
+        planes = self._planes.get(vector.shape[0])
+        if planes is None:
+            # Fixed seed: every process buckets an embedding the same way
+            planes = self._planes[vector.shape[0]] = (
+                np.random.default_rng(0).standard_normal((_BUCKET_BITS, vector.shape[0])).astype(np.float32)
+            )
+        bits = np.packbits(planes @ vector > 0)
+        return int.from_bytes(bits.tobytes(), "big")
+
+    def _prune(self, conn: sqlite3.Connection) -> None:
+        self._writes_since_prune += 1
+        if self._writes_since_prune < _PRUNE_EVERY:
+            return
+        self._writes_since_prune = 0
+        now = time.time()
+        for table, key, columns in (("query_embeddings", "(model, query)", "model, query"),
+                                    ("query_results", "rowid", "rowid")):
+            conn.execute(f"DELETE FROM {table} WHERE expires < ?", (now,))
+            excess = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - self.max_entries
+            if excess > 0:
+                conn.execute(
+                    f"DELETE FROM {table} WHERE {key} IN (SELECT {columns} FROM {table} ORDER BY expires LIMIT ?)",
+                    (excess,),
+                )
+
+    # ── Sync API (run in a thread by the async wrappers) ─────────
+
+    def get_embedding_sync(self, text: str, model: str | None = None) -> list[float] | None:
+        with self._lock:
+            row = self._connect().execute(
+                "SELECT vector FROM query_embeddings WHERE model = ? AND query = ? AND expires >= ?",
+                (model or settings.EMBEDDING_MODEL, normalize_query(text), time.time()),
+            ).fetchone()
+        if row is None:
+            self.embedding_misses += 1
+            return None
+        self.embedding_hits += 1
+        return np.frombuffer(row[0], dtype=np.float32).tolist()
+
+    def put_embedding_sync(self, text: str, embedding: list[float], model: str | None = None) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO query_embeddings (model, query, vector, expires) VALUES (?, ?, ?, ?)",
+                (model or settings.EMBEDDING_MODEL, normalize_query(text),
+                 np.asarray(embedding, dtype=np.float32).tobytes(), time.time() + self.ttl),
+            )
+            self._prune(conn)
+            conn.commit()
+
+    def get_results_sync(self, kb_id: str, top_k: int, version, embedding: list[float]) -> list[dict] | None:
+        vector = _unit(embedding)
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT vector, matches FROM query_results "
+                "WHERE kb_id = ? AND top_k = ? AND bucket = ? AND version IS ? AND expires >= ?",
+                (str(kb_id), top_k, self._bucket(vector), version, time.time()),
+            ).fetchall()
+        best, best_similarity = None, self.min_similarity
+        for blob, matches in rows:
+            similarity = float(np.frombuffer(blob, dtype=np.float32) @ vector)
+            if similarity >= best_similarity:
+                best, best_similarity = matches, similarity
+        if best is None:
+            self.result_misses += 1
+            return None
+        self.result_hits += 1
+        return json.loads(best)
+
+    def put_results_sync(self, kb_id: str, top_k: int, version, embedding: list[float], matches: list[dict]) -> None:
+        vector = _unit(embedding)
+        key = (str(kb_id), top_k, self._bucket(vector))
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT INTO query_results (kb_id, top_k, bucket, version, vector, matches, expires) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, version, vector.tobytes(), json.dumps(matches), time.time() + self.ttl),
+            )
+            conn.execute(
+                "DELETE FROM query_results WHERE rowid IN (SELECT rowid FROM query_results "
+                "WHERE kb_id = ? AND top_k = ? AND bucket = ? ORDER BY expires DESC LIMIT -1 OFFSET ?)",
+                (*key, _MAX_PER_BUCKET),
+            )
+            self._prune(conn)
+            conn.commit()
+
+    def invalidate_kb_sync(self, kb_id: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            conn.execute("DELETE FROM query_results WHERE kb_id = ?", (str(kb_id),))
+            conn.commit()
+
+    # ── Async API ────────────────────────────────────────────────
+    # A failing cache never fails a lookup: reads miss and writes are dropped.
+
+    async def get_embedding(self, text: str, model: str | None = None) -> list[float] | None:
+        try:
+            return await asyncio.to_thread(self.get_embedding_sync, text, model)
+        except sqlite3.Error as e:
+            logger.warning(f"Query cache read failed: {e}")
+            return None
+
+    async def put_embedding(self, text: str, embedding: list[float], model: str | None = None) -> None:
+        try:
+            await asyncio.to_thread(self.put_embedding_sync, text, embedding, model)
+        except sqlite3.Error as e:
+            logger.warning(f"Query cache write failed: {e}")
+
+    async def get_results(self, kb_id: str, top_k: int, version, embedding: list[float]) -> list[dict] | None:
+        try:
+            return await asyncio.to_thread(self.get_results_sync, kb_id, top_k, version, embedding)
+        except sqlite3.Error as e:
+            logger.warning(f"Query cache read failed: {e}")
+            return None
+
+    async def put_results(self, kb_id: str, top_k: int, version, embedding: list[float], matches: list[dict]) -> None:
+        try:
+            await asyncio.to_thread(self.put_results_sync, kb_id, top_k, version, embedding, matches)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            # TypeError / ValueError: matches that don't serialize to JSON
+            logger.warning(f"Query cache write failed: {e}")
+
+    async def invalidate_kb(self, kb_id: str) -> None:
+        await asyncio.to_thread(self.invalidate_kb_sync, kb_id)
+
+    def stats(self) -> dict:
+        """Hit and miss counts for this process's lookups."""
+        return {
+            "embedding_hits": self.embedding_hits,
+            "embedding_misses": self.embedding_misses,
+            "result_hits": self.result_hits,
+            "result_misses": self.result_misses,
+        }
+
+
+_cache: QueryCache | None = None
+
+
+def get_query_cache() -> QueryCache | None:
+    """Return the process-wide handle on the shared cache, or None when disabled."""
+    global _cache
+    if not settings.RAG_QUERY_CACHE_ENABLED:
+        return None
+    if _cache is None:
+        _cache = QueryCache(
+            settings.RAG_QUERY_CACHE_PATH,
+            settings.RAG_QUERY_CACHE_TTL_SECONDS,
+            settings.RAG_QUERY_CACHE_MAX_ENTRIES,
+            settings.RAG_QUERY_CACHE_MIN_SIMILARITY,
+        )
+    return _cache
+
+
+async def knowledge_base_changed(kb_id: str) -> None:
+    """Record that a KB's files changed so cached retrieval results for it are no longer served."""
+    cache = get_query_cache()
+    if cache is not None:
+        try:
+            await cache.invalidate_kb(kb_id)
+        except sqlite3.Error as e:
+            logger.warning(f"Failed to drop cached results for knowledge base {kb_id}: {e}")
+    config_cache.knowledge_bases.invalidate(kb_id)
+    try:
+        db = get_supabase()
+        await run_query(db.table("knowledge_bases").update({"updated_at": "now()"}).eq("id", kb_id))
+    except Exception as e:
+        # Workers still drop the stale results when they expire
+        logger.warning(f"Failed to bump knowledge base {kb_id} version: {e}")
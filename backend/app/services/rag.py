@@ -0,0 +1,310 @@
+"""Per-turn knowledge base retrieval for voice calls.
+
+A ``KnowledgeRetriever`` is created per call for the agent's knowledge base.
+For each user turn it embeds the transcript, queries the KB's vector
+provider for the top-k chunks, and hands them to the agent to inject into
+the chat context before the LLM runs.
+
+Retrieval must not add dead air, so it is:
+
+- **speculative** — ``speculate()`` is called with interim and final STT
+  transcripts, so the embedding + vector query run while the turn detector
+  is still waiting out the endpointing delay. When the turn completes,
+  ``retrieve_for_turn()`` reuses the in-flight or finished lookup if its text
+  matches the final transcript. Each lookup is a paid embedding call, so
+  interim text must stay unchanged for ``RAG_SPECULATE_DEBOUNCE_MS`` before
+  a lookup starts. Text that the running lookup would still cover does not
+  start a new one, and at most ``RAG_SPECULATE_MAX_PER_TURN`` start per turn.
+- **budgeted** — the turn waits at most ``RAG_LATENCY_BUDGET_MS`` for
+  results. If the lookup would take longer the turn proceeds without KB
+  context.
+- **hybrid** — with ``RAG_HYBRID_ENABLED``, the KB's BM25 index
+  (``lexical_index``) is searched alongside the vector query and the two
+  rankings are merged by reciprocal rank fusion, so product codes, names
+  and numbers that embeddings match poorly still surface. If the vector
+  side has not answered within ``RAG_HYBRID_VECTOR_WAIT_MS`` of the turn
+  asking for it, that turn uses the lexical hits alone; the vector side
+  still finishes in the background and caches its result.
+- **cached** — frequent questions are served from ``query_cache``: the
+  query embedding by normalized text, and the matches by embedding for the
+  KB's current version, skipping both the embedding call and the searches.
+"""
+import asyncio
+import logging
+import re
+import time
+
+from app.config import settings
+from app.services import config_cache
+from app.services.document_processor import generate_embedding
+from app.services.lexical_index import get_lexical_index
+from app.services.query_cache import get_query_cache
+from app.services.vector_db import acquire_provider
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[\w']+")
+
+# A speculative lookup is reused if its words are a prefix of the final
+# transcript covering at least this share of it
+_MIN_PREFIX_COVERAGE = 0.8
+
+
+# Each side of a hybrid search returns this many times top_k candidates for fusion
+_FUSION_CANDIDATES = 2
+
+# Lookups outlive the turn that stopped waiting for them; keep them referenced until done
+_background: set[asyncio.Task] = set()
+
+
+def _words(text: str) -> list[str]:
+    return _WORD_RE.findall(text.lower())
+
+
+def fuse_rankings(rankings: list[list[dict]], top_k: int, k: int | None = None) -> list[dict]:
+    """Reciprocal rank fusion: score each id by ``sum(1 / (k + rank))`` over the rankings it appears in.
+
+    The first ranking's match dict is kept for ids found by several (vector
+    matches carry the full metadata); ``score`` becomes the fused score.
+    """
+    k = k or settings.RAG_RRF_K
+    fused: dict[str, tuple[float, dict]] = {}
+    for ranking in rankings:
+        for rank, match in enumerate(ranking, start=1):
+            score, first = fused.get(match["id"], (0.0, match))
+            fused[match["id"]] = (score + 1 / (k + rank), first)
+    ordered = sorted(fused.values(), key=lambda item: item[0], reverse=True)[:top_k]
+    return [{**match, "score": score} for score, match in ordered]
+
+
+def _matches(speculative: list[str], final: list[str]) -> bool:
+    if not speculative or not final:
+        return False
+    if speculative == final:
+        return True
+    return (
+        final[:len(speculative)] == speculative
+        and len(speculative) / len(final) >= _MIN_PREFIX_COVERAGE
+    )
+
+
+class KnowledgeRetriever:
+    def __init__(self, knowledge_base: dict, top_k: int | None = None, budget_ms: float | None = None):
+        config = knowledge_base.get("config") or {}
+        self.name = knowledge_base.get("name", "")
+        self.provider_name = knowledge_base["provider"]
+        self.provider_config = config
+        self.namespace = config.get("namespace")
+        self.top_k = top_k or settings.RAG_TOP_K
+        self.budget = (budget_ms if budget_ms is not None else settings.RAG_LATENCY_BUDGET_MS) / 1000
+        self.min_score = settings.RAG_MIN_SCORE
+        self.kb_id = knowledge_base.get("id")
+        self.kb_version = knowledge_base.get("updated_at")
+        self.lexical_index = get_lexical_index(self.kb_id)
+        self.query_cache = get_query_cache()
+        self.vector_wait = min(settings.RAG_HYBRID_VECTOR_WAIT_MS / 1000, self.budget)
+        # (words, (lexical task, vector task)) of the latest speculative lookup
+        self._speculative: tuple[list[str], tuple[asyncio.Task | None, asyncio.Task]] | None = None
+        # (words, timer) of an interim transcript waiting out the debounce
+        self._debounce: tuple[list[str], asyncio.TimerHandle] | None = None
+        self._speculations = 0
+        self.debounce = settings.RAG_SPECULATE_DEBOUNCE_MS / 1000
+        self.max_speculations = settings.RAG_SPECULATE_MAX_PER_TURN
+        self.turns = 0
+        self.hits = 0
+        self.reused = 0
+        self.over_budget = 0
+        self.lexical_only = 0
+        self.cache_hits = 0
+
+    async def warm_up(self) -> None:
+        """Connect the KB provider before the first turn needs it."""
+        try:
+            await acquire_provider(self.provider_name, self.provider_config)
+        except Exception as e:
+            logger.error(f"Failed to connect knowledge base provider '{self.provider_name}': {e}")
+
+    async def _kb_version(self):
+        # get() revalidates the row once CONFIG_CACHE_TTL_SECONDS have passed, picking up
+        # knowledge_base_changed()'s updated_at bump from the API process within a call
+        try:
+            row = await config_cache.knowledge_bases.get(self.kb_id)
+        except Exception as e:
+            logger.warning(f"Failed to load knowledge base {self.kb_id} for its version: {e}")
+            row = None
+        return (row or {}).get("updated_at", self.kb_version)
+
+    async def _embed(self, text: str) -> list[float]:
+        cached = await self.query_cache.get_embedding(text) if self.query_cache is not None else None
+        if cached is not None:
+            return cached
+        embedding = await generate_embedding(text)
+        if self.query_cache is not None:
+            await self.query_cache.put_embedding(text, embedding)
+        return embedding
+
+    async def _vector_search(self, embedding: list[float], top_k: int) -> list[dict]:
+        """Top-k vector matches above ``RAG_MIN_SCORE``."""
+        # The registry hands back the worker's warm provider for this KB config
+        provider = await acquire_provider(self.provider_name, self.provider_config)
+        matches = await provider.query(embedding, top_k=top_k, namespace=self.namespace)
+        return [m for m in matches if m.get("text") and (m.get("score") or 0) >= self.min_score]
+
+    async def _semantic(self, text: str, candidates: int, lexical: asyncio.Task | None) -> list[dict]:
+        """Embed, search the vectors and (with ``lexical``) fuse, caching both the embedding and the matches.
+
+        Runs as its own task and is never cancelled by a caller that stops
+        waiting for it, so a slow embedding still fills the caches for the
+        next time the question is asked.
+        """
+        version = await self._kb_version()
+        embedding = await self._embed(text)
+        if self.query_cache is not None:
+            cached = await self.query_cache.get_results(self.kb_id, self.top_k, version, embedding)
+            if cached is not None:
+                self.cache_hits += 1
+                return cached
+        vector = await self._vector_search(embedding, candidates)
+        if lexical is not None:
+            try:
+                matches = fuse_rankings([vector, await lexical], self.top_k)
+            except Exception as e:
+                # Degraded results are not cached
+                logger.error(f"RAG lexical search failed: {e}")
+                return vector[:self.top_k]
+        else:
+            matches = vector
+        if self.query_cache is not None:
+            await self.query_cache.put_results(self.kb_id, self.top_k, version, embedding, matches)
+        return matches
+
+    def _lookup(self, text: str) -> tuple[asyncio.Task | None, asyncio.Task]:
+        """Start the lexical and vector sides of a lookup for ``text``; ``_resolve()`` picks the answer."""
+        hybrid = self.lexical_index is not None and self.lexical_index.exists()
+        candidates = self.top_k * _FUSION_CANDIDATES if hybrid else self.top_k
+        lexical = asyncio.create_task(self.lexical_index.search(text, candidates)) if hybrid else None
+        semantic = asyncio.create_task(self._semantic(text, candidates, lexical))
+        for task in (lexical, semantic):
+            if task is not None:
+                _background.add(task)
+                task.add_done_callback(_background.discard)
+                task.add_done_callback(_consume_exception)
+        return lexical, semantic
+
+    async def _resolve(self, lexical: asyncio.Task | None, semantic: asyncio.Task) -> list[dict]:
+        """Vector (fused) matches, or the lexical matches alone if they are not ready within ``vector_wait``.
+
+        The wait starts when the turn asks for the matches, not when a
+        speculative lookup started, and falling back only affects this turn:
+        the vector side keeps running and caches its result.
+        """
+        try:
+            return await asyncio.wait_for(asyncio.shield(semantic), timeout=self.vector_wait if lexical else None)
+        except asyncio.TimeoutError:
+            self.lexical_only += 1
+            logger.info(f"RAG vector search exceeded {self.vector_wait * 1000:.0f} ms — using lexical matches only")
+        except Exception as e:
+            if lexical is None:
+                raise
+            self.lexical_only += 1
+            logger.error(f"RAG vector search failed, using lexical matches only: {e}")
+        return (await lexical)[:self.top_k]
+
+    async def search(self, text: str) -> list[dict]:
+        """Top-k matches for ``text``: vector and BM25 results fused, or vector only without a lexical index.
+
+        A repeated question is answered from the query cache: its embedding
+        by normalized text, then its matches by embedding for this KB version.
+        Degraded (single-sided) hybrid results are not cached.
+        """
+        return await self._resolve(*self._lookup(text))
+
+    def speculate(self, text: str, is_final: bool = False) -> None:
+        """Schedule a lookup for an interim or final transcript. Never blocks."""
+        words = _words(text)
+        if not words:
+            return
+        # The running lookup still covers this text (retrieve_for_turn would reuse it)
+        if self._speculative is not None and _matches(self._speculative[0], words):
+            return
+        if self._debounce is not None:
+            if self._debounce[0] == words and not is_final:
+                return
+            self._debounce[1].cancel()
+            self._debounce = None
+        if is_final or self.debounce <= 0:
+            self._start_speculative(text, words)
+        else:
+            timer = asyncio.get_running_loop().call_later(self.debounce, self._start_speculative, text, words)
+            self._debounce = (words, timer)
+
+    def _start_speculative(self, text: str, words: list[str]) -> None:
+        self._debounce = None
+        if self._speculations >= self.max_speculations:
+            return
+        # A superseded lookup is left to finish: its embedding is paid for, and it fills the caches
+        self._speculations += 1
+        self._speculative = (words, self._lookup(text))
+
+    async def retrieve_for_turn(self, text: str) -> list[dict]:
+        """Matches for a completed user turn, waiting no longer than the latency budget."""
+        self.turns += 1
+        started = time.perf_counter()
+        words = _words(text)
+        self._speculations = 0
+        if self._debounce is not None:
+            self._debounce[1].cancel()
+            self._debounce = None
+        if not words:
+            return []
+
+        reused = self._speculative is not None and _matches(self._speculative[0], words)
+        if reused:
+            self.reused += 1
+            lookup = self._speculative[1]
+        else:
+            lookup = self._lookup(text)
+        self._speculative = None
+
+        try:
+            matches = await asyncio.wait_for(self._resolve(*lookup), timeout=self.budget)
+        except asyncio.TimeoutError:
+            self.over_budget += 1
+            logger.warning(f"RAG lookup exceeded {self.budget * 1000:.0f} ms budget — answering without KB context")
+            return []
+        except Exception as e:
+            logger.error(f"RAG lookup failed: {e}")
+            return []
+
+        if matches:
+            self.hits += 1
+        logger.info(
+            f"RAG [{self.name}]: {len(matches)} chunks in {(time.perf_counter() - started) * 1000:.0f} ms "
+            f"(speculative={reused})"
+        )
+        return matches
+
+    def stats(self) -> dict:
+        return {
+            "turns": self.turns,
+            "with_context": self.hits,
+            "speculative_reused": self.reused,
+            "over_budget": self.over_budget,
+            "lexical_only": self.lexical_only,
+            "cache_hits": self.cache_hits,
+        }
+
+
+def format_context(matches: list[dict]) -> str:
+    """Render retrieved chunks as a context message for the LLM."""
+    excerpts = "\n\n".join(f"[{i + 1}] {m['text'].strip()}" for i, m in enumerate(matches))
+    return (
+        "Relevant excerpts from the knowledge base for the caller's last message "
+        "(use them if they help answer; do not read out the numbering):\n\n" + excerpts
+    )
+
+
+def _consume_exception(task: asyncio.Task) -> None:
+    # Lookups may fail after every turn waiting on them has moved on
+    if not task.cancelled():
+        task.exception()
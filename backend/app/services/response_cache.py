@@ -0,0 +1,140 @@
+"""Opt-in response cache for custom function webhooks.
+
+Lookup-style functions (availability checks, GET endpoints) often return the
+same data for the same arguments within seconds of each other. A function
+opts in through its ``response_cache`` column::
+
+    {"enabled": true, "ttl_seconds": 10, "key_fields": ["date"], "max_entries": 256}
+
+- ``ttl_seconds``  — how long a response is served from cache (default 10)
+- ``key_fields``   — argument names that make up the cache key; omitted or
+  empty means all arguments
+- ``max_entries``  — per-function bound, least recently used entries are
+  evicted first (default 256)
+- ``read_only``    — required for methods other than GET/HEAD/OPTIONS:
+  confirms the endpoint is a side-effect-free lookup (e.g. a POST search)
+
+The cache key is the arguments alone, so caching is refused when the
+request carries more than that: functions with ``payload_mode:
+"full_context"`` send the caller's call context, and a response computed
+for one caller must never be served to another. Non-read-only methods are
+refused too, since serving a cached response would skip the side effect.
+
+Caches are in process memory. livekit-agents runs each call in its own job
+process, so a cache only serves repeats within one call (e.g. the caller
+asking about the same date twice); nothing carries over to other calls.
+Only successful responses are stored. A cache is reset when
+its function's definition changes (``updated_at`` or the cache config), so
+an edited webhook never serves responses from the old one.
+"""
+import copy
+import json
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_TTL_SECONDS = 10.0
+_DEFAULT_MAX_ENTRIES = 256
+_READ_ONLY_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+
+class ResponseCache:
+    """TTL + LRU cache of webhook responses for one custom function."""
+
+    def __init__(self, ttl: float, max_entries: int, key_fields: list[str] | None = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.key_fields = key_fields or None
+        self._entries: OrderedDict[str, tuple[float, dict]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, args: dict) -> str:
+        if self.key_fields:
+            args = {f: args.get(f) for f in self.key_fields}
+        return json.dumps(args, sort_keys=True, default=str)
+
+    def get(self, args: dict) -> dict | None:
+        key = self.key(args)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        # Callers annotate results (e.g. _stored_variables) — hand out a copy
+        return copy.deepcopy(entry[1])
+
+    def put(self, args: dict, result: dict) -> None:
+        key = self.key(args)
+        self._entries[key] = (time.monotonic() + self.ttl, copy.deepcopy(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
+
+
+# function name → (definition fingerprint, cache)
+_caches: dict[str, tuple[str, ResponseCache]] = {}
+
+
+def get_cache(func: dict) -> ResponseCache | None:
+    """Return the response cache for a custom function row, or None if it hasn't opted in."""
+    cfg = func.get("response_cache") or {}
+    if not cfg.get("enabled"):
+        return None
+
+    name = func.get("name") or ""
+    if func.get("payload_mode") == "full_context":
+        _warn_once(name, "payload_mode is full_context (responses depend on the caller)")
+        return None
+    method = (func.get("method") or "POST").upper()
+    if method not in _READ_ONLY_METHODS and cfg.get("read_only") is not True:
+        _warn_once(name, f"{method} is not marked read_only")
+        return None
+
+    fingerprint = json.dumps([func.get("updated_at"), cfg], sort_keys=True, default=str)
+    existing = _caches.get(name)
+    if existing is not None and existing[0] == fingerprint:
+        return existing[1]
+
+    try:
+        cache = ResponseCache(
+            ttl=float(cfg.get("ttl_seconds", _DEFAULT_TTL_SECONDS)),
+            max_entries=max(1, int(cfg.get("max_entries", _DEFAULT_MAX_ENTRIES))),
+            key_fields=cfg.get("key_fields"),
+        )
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Invalid response_cache config for function '{name}': {e}")
+        return None
+    _caches[name] = (fingerprint, cache)
+    return cache
+
+
+_warned: set[str] = set()
+
+
+def _warn_once(name: str, reason: str) -> None:
+    if name not in _warned:
+        _warned.add(name)
+        logger.warning(f"Response cache disabled for function '{name}': {reason}")
+
+
+def get_response_cache_stats() -> dict:
+    """Hit/miss/eviction counters per function for this process."""
+    return {name: cache.stats() for name, (_, cache) in _caches.items()}
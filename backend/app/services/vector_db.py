@@ -1,6 +1,14 @@
 """Vector DB provider abstraction for RAG."""
+import asyncio
+import hashlib
+import json
 import logging
+import threading
+import time
 from abc import ABC, abstractmethod
+from pathlib import Path
+
+from app.config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -24,34 +32,107 @@ class VectorDBProvider(ABC):
     async def delete(self, ids: list[str] | None = None, namespace: str | None = None, delete_all: bool = False):
         pass
 
+    async def health_check(self) -> bool:
+        """True if the backing index is reachable. Used by the provider registry."""
+        return True
+
+    async def close(self):
+        """Release connections when the registry evicts this provider."""
+        pass
+
+
+# One Pinecone index handle per (api key, index, host) per process. The SDK
+# keeps a pooled HTTP session behind each handle, so sharing it across
+# provider instances means KB operations reuse warm connections.
+_pinecone_indexes: dict[tuple[str, str, str], object] = {}
+_pinecone_lock = threading.Lock()
+
+
+def _pinecone_index(api_key: str, index_name: str, host: str):
+    key = (api_key, index_name, host)
+    with _pinecone_lock:
+        index = _pinecone_indexes.get(key)
+        if index is None:
+            from pinecone import Pinecone
+            pc = Pinecone(api_key=api_key)
+            index = pc.Index(index_name, host=host) if host else pc.Index(index_name)
+            _pinecone_indexes[key] = index
+            logger.info(f"Connected to Pinecone index: {index_name}")
+        return index
+
 
 class PineconeProvider(VectorDBProvider):
+    """Pinecone via its synchronous SDK, with every call run in a worker thread.
+
+    Upserts and deletes are split into batches sent with bounded concurrency
+    (``PINECONE_UPSERT_CONCURRENCY``); the throughput of the last upsert is
+    kept in ``last_upsert`` and logged.
+    """
+
+    _DELETE_BATCH_SIZE = 1000  # Pinecone's per-request id limit
+
     def __init__(self, config: dict):
-        self.api_key = config.get("api_key", "")
+        self.api_key = config.get("api_key") or settings.PINECONE_API_KEY
         self.index_name = config.get("index_name", "knowledge-base")
         self.host = config.get("host", "")
         self._index = None
+        self.last_upsert: dict | None = None
 
     async def connect(self):
-        from pinecone import Pinecone
-        pc = Pinecone(api_key=self.api_key)
-        self._index = pc.Index(self.index_name, host=self.host) if self.host else pc.Index(self.index_name)
-        logger.info(f"Connected to Pinecone index: {self.index_name}")
+        if self._index is None:
+            self._index = await asyncio.to_thread(_pinecone_index, self.api_key, self.index_name, self.host)
 
-    async def upsert(self, vectors: list[dict], namespace: str | None = None):
-        if not self._index:
+    async def health_check(self) -> bool:
+        try:
             await self.connect()
-        batch_size = 100
-        for i in range(0, len(vectors), batch_size):
-            batch = vectors[i:i + batch_size]
-            upsert_data = [(v["id"], v["values"], v.get("metadata", {})) for v in batch]
-            self._index.upsert(vectors=upsert_data, namespace=namespace or "")
-        logger.info(f"Upserted {len(vectors)} vectors to Pinecone")
+            await asyncio.to_thread(self._index.describe_index_stats)
+            return True
+        except Exception as e:
+            logger.warning(f"Pinecone health check failed for {self.index_name}: {e}")
+            return False
+
+    async def close(self):
+        with _pinecone_lock:
+            _pinecone_indexes.pop((self.api_key, self.index_name, self.host), None)
+        self._index = None
+
+    async def _gather_batches(self, fn, batches: list) -> None:
+        sem = asyncio.Semaphore(settings.PINECONE_UPSERT_CONCURRENCY)
+
+        async def _send(batch):
+            async with sem:
+                await asyncio.to_thread(fn, batch)
+
+        await asyncio.gather(*(_send(b) for b in batches))
+
+    async def upsert(self, vectors: list[dict], namespace: str | None = None):
+        await self.connect()
+        started = time.perf_counter()
+        batch_size = settings.PINECONE_UPSERT_BATCH_SIZE
+        batches = [
+            [(v["id"], v["values"], v.get("metadata", {})) for v in vectors[i:i + batch_size]]
+            for i in range(0, len(vectors), batch_size)
+        ]
+        await self._gather_batches(
+            lambda batch: self._index.upsert(vectors=batch, namespace=namespace or ""),
+            batches,
+        )
+        elapsed = time.perf_counter() - started
+        self.last_upsert = {
+            "vectors": len(vectors),
+            "batches": len(batches),
+            "seconds": round(elapsed, 3),
+            "vectors_per_second": round(len(vectors) / elapsed, 1) if elapsed > 0 else None,
+        }
+        logger.info(
+            f"Upserted {len(vectors)} vectors to Pinecone in {elapsed:.2f}s "
+            f"({self.last_upsert['vectors_per_second']} vectors/s, {len(batches)} batches)"
+        )
 
     async def query(self, embedding: list[float], top_k: int = 5, namespace: str | None = None) -> list[dict]:
-        if not self._index:
-            await self.connect()
-        result = self._index.query(
+        await self.connect()
+        result = await asyncio.to_thread(
+            self._index.query,
             vector=embedding,
             top_k=top_k,
             include_metadata=True,
@@ -68,20 +149,167 @@ class PineconeProvider(VectorDBProvider):
         ]
 
     async def delete(self, ids: list[str] | None = None, namespace: str | None = None, delete_all: bool = False):
-        if not self._index:
-            await self.connect()
+        await self.connect()
+        if delete_all:
+            await asyncio.to_thread(self._index.delete, delete_all=True, namespace=namespace or "")
+        elif ids:
+            batches = [ids[i:i + self._DELETE_BATCH_SIZE] for i in range(0, len(ids), self._DELETE_BATCH_SIZE)]
+            await self._gather_batches(
+                lambda batch: self._index.delete(ids=batch, namespace=namespace or ""),
+                batches,
+            )
+
+
+class LocalProvider(VectorDBProvider):
+    """Embedded on-disk index (see ``app.services.local_vectors``) — no external service.
+
+    Config: ``index_name`` and ``namespace`` pick the directory under ``path``
+    (default ``LOCAL_VECTOR_DIR``). ``index_type`` is ``flat`` (exact scan,
+    default) or ``ivf`` (approximate; tune with ``nlist`` / ``nprobe``). Loading
+    and refreshing a store always run in a thread; the scan itself runs inline
+    for small indexes and in a thread for larger ones, so neither file I/O nor
+    a long scan stalls the event loop.
+    """
+
+    _INLINE_QUERY_MAX_ROWS = 20_000
+
+    def __init__(self, config: dict):
+        self.root = config.get("path") or settings.LOCAL_VECTOR_DIR
+        self.index_name = config.get("index_name", "knowledge-base")
+        self.default_namespace = config.get("namespace")
+        self.index_type = config.get("index_type", "flat")
+        self.nlist = int(config["nlist"]) if config.get("nlist") else None
+        self.nprobe = int(config["nprobe"]) if config.get("nprobe") else None
+
+    def _store(self, namespace: str | None):
+        from app.services.local_vectors import get_store, namespace_dir
+        directory = namespace_dir(self.root, self.index_name, namespace or self.default_namespace)
+        return get_store(directory, self.index_type, nlist=self.nlist, nprobe=self.nprobe)
+
+    def _refreshed_store(self, namespace: str | None):
+        store = self._store(namespace)
+        return store, store.refresh()
+
+    async def connect(self):
+        pass  # stores load lazily on first use
+
+    async def health_check(self) -> bool:
+        root = Path(self.root)
+        return root.is_dir() or not root.exists()  # not created yet is fine; a file in its place is not
+
+    async def upsert(self, vectors: list[dict], namespace: str | None = None):
+        await asyncio.to_thread(self._store(namespace).upsert, vectors)
+        logger.info(f"Upserted {len(vectors)} vectors to local index {self.index_name}")
+
+    async def query(self, embedding: list[float], top_k: int = 5, namespace: str | None = None) -> list[dict]:
+        # Loading and catching up on the log read files — always off the loop
+        store, rows = await asyncio.to_thread(self._refreshed_store, namespace)
+        if rows <= self._INLINE_QUERY_MAX_ROWS:
+            return store.search(embedding, top_k)
+        return await asyncio.to_thread(store.search, embedding, top_k)
+
+    async def delete(self, ids: list[str] | None = None, namespace: str | None = None, delete_all: bool = False):
+        store = self._store(namespace)
         if delete_all:
-            self._index.delete(delete_all=True, namespace=namespace or "")
+            await asyncio.to_thread(store.clear)
         elif ids:
-            self._index.delete(ids=ids, namespace=namespace or "")
+            await asyncio.to_thread(store.delete, ids)
 
 
 def get_provider(name: str, config: dict) -> VectorDBProvider:
     """Factory function to get a vector DB provider by name."""
     providers = {
         "pinecone": PineconeProvider,
+        "local": LocalProvider,
     }
     provider_cls = providers.get(name)
     if not provider_cls:
         raise ValueError(f"Unsupported vector DB provider: {name}. Available: {list(providers.keys())}")
     return provider_cls(config)
+
+
+# ── Provider registry ────────────────────────────────────────────
+# Connected providers shared per process, keyed by (provider name, config
+# hash), so KB routes and in-call retrieval reuse warm clients. Entries
+# unused for VECTOR_PROVIDER_IDLE_SECONDS are closed; entries are
+# health-checked in the background every VECTOR_PROVIDER_HEALTH_INTERVAL_SECONDS
+# and dropped if the check fails, so the next caller gets a fresh one.
+
+class _RegistryEntry:
+    def __init__(self, provider: VectorDBProvider):
+        self.provider = provider
+        now = time.monotonic()
+        self.last_used = now
+        self.last_checked = now
+        self.checking = False
+
+
+_registry: dict[str, _RegistryEntry] = {}
+_registry_lock = asyncio.Lock()
+_registry_metrics = {"created": 0, "reused": 0, "evicted": 0, "unhealthy": 0}
+_background: set[asyncio.Task] = set()
+
+
+def _registry_key(name: str, config: dict) -> str:
+    digest = hashlib.sha256(json.dumps(config or {}, sort_keys=True, default=str).encode()).hexdigest()
+    return f"{name}:{digest[:16]}"
+
+
+async def acquire_provider(name: str, config: dict) -> VectorDBProvider:
+    """Return a connected provider for this KB config, reusing the process-wide instance."""
+    key = _registry_key(name, config)
+    now = time.monotonic()
+    entry = _registry.get(key)
+    if entry is None:
+        async with _registry_lock:
+            entry = _registry.get(key)
+            if entry is None:
+                provider = get_provider(name, config)
+                await provider.connect()
+                entry = _RegistryEntry(provider)
+                _registry[key] = entry
+                _registry_metrics["created"] += 1
+    else:
+        _registry_metrics["reused"] += 1
+        if not entry.checking and now - entry.last_checked >= settings.VECTOR_PROVIDER_HEALTH_INTERVAL_SECONDS:
+            entry.checking = True
+            task = asyncio.create_task(_check_health(key, entry))
+            _background.add(task)
+            task.add_done_callback(_background.discard)
+
+    entry.last_used = now
+    await _evict_idle(now)
+    return entry.provider
+
+
+async def _check_health(key: str, entry: _RegistryEntry) -> None:
+    try:
+        healthy = await entry.provider.health_check()
+    except Exception:
+        healthy = False
+    entry.checking = False
+    entry.last_checked = time.monotonic()
+    if not healthy and _registry.get(key) is entry:
+        _registry_metrics["unhealthy"] += 1
+        del _registry[key]
+        logger.warning(f"Vector provider {key} failed its health check — dropped from registry")
+        await entry.provider.close()
+
+
+async def _evict_idle(now: float) -> None:
+    idle = [
+        key for key, entry in _registry.items()
+        if now - entry.last_used > settings.VECTOR_PROVIDER_IDLE_SECONDS
+    ]
+    for key in idle:
+        entry = _registry.pop(key)
+        _registry_metrics["evicted"] += 1
+        logger.info(f"Evicting idle vector provider {key}")
+        try:
+            await entry.provider.close()
+        except Exception as e:
+            logger.debug(f"Error closing vector provider {key}: {e}")
+
+
+def get_registry_stats() -> dict:
+    return {**_registry_metrics, "active": len(_registry)}
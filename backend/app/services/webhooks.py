@@ -0,0 +1,237 @@
+"""Agent-level webhook delivery (call_started, call_ended, transcript_ready, ...).
+
+All deliveries in a process share one pooled ``aiohttp.ClientSession`` with
+keep-alive, so repeat events to the same host reuse an open TLS connection
+instead of paying DNS + TCP + TLS every time. Concurrency per destination
+host is capped by ``WEBHOOK_MAX_CONCURRENCY_PER_HOST``.
+
+Two entry points:
+
+- ``enqueue_webhook()`` — fire-and-forget. Puts the event on a bounded
+  in-process queue drained by background delivery workers. Retries are
+  rescheduled with a timer rather than sleeping, so neither the caller nor a
+  delivery worker is held during backoff. When the queue is full the event is
+  dropped and counted.
+- ``fire_webhook()`` — awaitable delivery for callers that need the outcome
+  (the post-call job queue uses it to decide whether to retry a job).
+
+``get_webhook_metrics()`` reports delivered / failed / retries / dropped counts and
+delivery latency percentiles for this process.
+"""
+import asyncio
+import logging
+import time
+from collections import deque
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
+import aiohttp
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+_session: aiohttp.ClientSession | None = None
+_session_loop: asyncio.AbstractEventLoop | None = None
+_host_limits: dict[str, asyncio.Semaphore] = {}
+
+_queue: asyncio.Queue | None = None
+_workers: list[asyncio.Task] = []
+
+_metrics = {"delivered": 0, "failed": 0, "retries": 0, "dropped": 0}
+_latencies_ms: deque[float] = deque(maxlen=1000)
+
+
+# ── Shared HTTP session ──────────────────────────────────────────
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Return the process-wide pooled session, creating it for the running loop."""
+    global _session, _session_loop, _queue, _workers
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=settings.WEBHOOK_MAX_CONNECTIONS,
+            limit_per_host=settings.WEBHOOK_MAX_CONCURRENCY_PER_HOST,
+            keepalive_timeout=settings.WEBHOOK_KEEPALIVE_SECONDS,
+            ttl_dns_cache=300,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        _session_loop = loop
+        # Semaphores and the queue are bound to the loop too — start fresh
+        _host_limits.clear()
+        _queue = None
+        _workers = []
+    return _session
+
+
+async def close_http_session(drain_timeout: float = 0.0) -> None:
+    """Close the pooled session at process shutdown, first giving queued deliveries up to ``drain_timeout``."""
+    global _session
+    if _queue is not None and drain_timeout > 0:
+        try:
+            await asyncio.wait_for(_queue.join(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Closing webhook session with {_queue.qsize()} deliveries still queued")
+    for task in _workers:
+        task.cancel()
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    host = urlparse(url).netloc
+    sem = _host_limits.get(host)
+    if sem is None:
+        sem = asyncio.Semaphore(settings.WEBHOOK_MAX_CONCURRENCY_PER_HOST)
+        _host_limits[host] = sem
+    return sem
+
+
+# ── Delivery ─────────────────────────────────────────────────────
+
+def _build_request(agent_config: dict, event: str, payload: dict) -> dict | None:
+    """Resolve URL/body/timeout for an event, or None if the agent isn't subscribed."""
+    wh = (agent_config.get("metadata") or {}).get("webhook_settings", {})
+    url = (wh.get("url") or "").strip()
+    if not url:
+        return None
+
+    subscribed = wh.get("events", [])
+    if subscribed and event not in subscribed:
+        return None
+
+    return {
+        "url": url,
+        "event": event,
+        "timeout": float(wh.get("timeout_seconds", 5)),
+        "body": {
+            "event": event,
+            "agent_id": agent_config.get("id"),
+            "agent_name": agent_config.get("name"),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            **payload,
+        },
+    }
+
+
+async def _deliver_once(req: dict, attempt: int) -> bool:
+    """One POST attempt. True on success or a non-retryable (< 500) response."""
+    url, event = req["url"], req["event"]
+    http = get_http_session()
+    started = time.perf_counter()
+    try:
+        async with _host_limit(url):
+            async with http.post(
+                url,
+                json=req["body"],
+                timeout=aiohttp.ClientTimeout(total=req["timeout"]),
+                headers={"Content-Type": "application/json", "X-Webhook-Event": event},
+            ) as resp:
+                if resp.status < 500:
+                    _latencies_ms.append((time.perf_counter() - started) * 1000)
+                    logger.info(f"Webhook [{event}] → {url} — {resp.status}")
+                    return True
+                logger.warning(f"Webhook [{event}] attempt {attempt} — server error {resp.status}")
+    except Exception as e:
+        logger.warning(f"Webhook [{event}] attempt {attempt} failed: {e}")
+    return False
+
+
+async def fire_webhook(agent_config: dict, event: str, payload: dict, attempts: int = 3) -> bool:
+    """Fire a webhook event to the agent-level webhook URL and wait for the outcome.
+
+    - Reads webhook_settings from agent metadata
+    - Only fires if the event is in the subscribed events list
+    - Retries up to ``attempts`` times with exponential backoff
+    - Never raises — logs errors so the agent is never blocked
+
+    Returns False only if delivery was attempted and failed, so queued callers
+    can schedule a retry.
+    """
+    req = _build_request(agent_config, event, payload)
+    if req is None:
+        return True
+
+    for attempt in range(1, attempts + 1):
+        if await _deliver_once(req, attempt):
+            _metrics["delivered"] += 1
+            return True
+        if attempt < attempts:
+            _metrics["retries"] += 1
+            await asyncio.sleep(2 ** attempt)  # 2s, 4s backoff
+
+    _metrics["failed"] += 1
+    logger.error(f"Webhook [{event}] failed after {attempts} attempts — {req['url']}")
+    return False
+
+
+# ── Background delivery queue ────────────────────────────────────
+
+def enqueue_webhook(agent_config: dict, event: str, payload: dict) -> None:
+    """Queue a webhook event for background delivery. Never blocks, never raises."""
+    req = _build_request(agent_config, event, payload)
+    if req is None:
+        return
+    req["attempt"] = 1
+    _put(req)
+
+
+def _ensure_workers() -> asyncio.Queue:
+    global _queue
+    get_http_session()  # resets loop-bound state if the loop changed
+    if _queue is None:
+        _queue = asyncio.Queue(maxsize=settings.WEBHOOK_QUEUE_SIZE)
+    if not _workers or all(t.done() for t in _workers):
+        _workers[:] = [
+            asyncio.create_task(_delivery_worker(_queue))
+            for _ in range(settings.WEBHOOK_DELIVERY_WORKERS)
+        ]
+    return _queue
+
+
+def _put(req: dict) -> None:
+    queue = _ensure_workers()
+    try:
+        queue.put_nowait(req)
+    except asyncio.QueueFull:
+        _metrics["dropped"] += 1
+        logger.error(f"Webhook queue full — dropped [{req['event']}] → {req['url']}")
+
+
+async def _delivery_worker(queue: asyncio.Queue) -> None:
+    loop = asyncio.get_running_loop()
+    while True:
+        req = await queue.get()
+        try:
+            attempt = req["attempt"]
+            if await _deliver_once(req, attempt):
+                _metrics["delivered"] += 1
+            elif attempt < settings.WEBHOOK_MAX_ATTEMPTS:
+                _metrics["retries"] += 1
+                req["attempt"] = attempt + 1
+                # Reschedule instead of sleeping so this worker keeps draining the queue
+                loop.call_later(2 ** attempt, _put, req)
+            else:
+                _metrics["failed"] += 1
+                logger.error(f"Webhook [{req['event']}] failed after {attempt} attempts — {req['url']}")
+        finally:
+            queue.task_done()
+
+
+def get_webhook_metrics() -> dict:
+    """Delivery counters and latency percentiles (ms) for this process."""
+    samples = sorted(_latencies_ms)
+
+    def pct(p: float) -> float | None:
+        if not samples:
+            return None
+        return round(samples[min(len(samples) - 1, int(len(samples) * p))], 1)
+
+    return {
+        **_metrics,
+        "queued": _queue.qsize() if _queue is not None else 0,
+        "latency_p50_ms": pct(0.50),
+        "latency_p95_ms": pct(0.95),
+        "latency_p99_ms": pct(0.99),
+    }
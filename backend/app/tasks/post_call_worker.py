@@ -0,0 +1,101 @@
+"""Post-call job consumer — runs call_ended / transcript_ready / extraction stages.
+
+Runs separately from the LiveKit voice worker so post-call work never takes
+voice capacity. Each process polls ``post_call_jobs`` and runs up to
+``--concurrency`` jobs at once; ``--processes`` forks a pool of such consumers.
+Restrict a deployment to some stages with ``--stages`` to scale them
+independently (e.g. a larger pool for LLM extraction).
+
+Run via: python -m app.tasks.post_call_worker [--processes 2] [--concurrency 8] [--stages extraction]
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+
+from app.config import settings
+from app.services.post_call import STAGES, claim_jobs, run_job
+from app.services.webhooks import close_http_session
+
+logger = logging.getLogger(__name__)
+
+
+async def consume(stages: list[str], concurrency: int) -> None:
+    """Poll for due jobs and run them with bounded concurrency, forever."""
+    inflight: set[asyncio.Task] = set()
+    logger.info(f"Post-call consumer started: stages={stages}, concurrency={concurrency}")
+
+    while True:
+        free = concurrency - len(inflight)
+        claimed = []
+        if free > 0:
+            try:
+                claimed = await claim_jobs(stages, free)
+            except Exception as e:
+                logger.error(f"Post-call consumer: failed to claim jobs: {e}")
+
+        for job in claimed:
+            task = asyncio.create_task(run_job(job))
+            inflight.add(task)
+            task.add_done_callback(inflight.discard)
+
+        # Poll again right away if we filled every free slot — there may be more
+        if claimed and len(claimed) == free:
+            await asyncio.sleep(0)
+            continue
+
+        if inflight and len(inflight) >= concurrency:
+            await asyncio.wait(inflight, return_when=asyncio.FIRST_COMPLETED)
+        else:
+            await asyncio.sleep(settings.POST_CALL_POLL_INTERVAL_SECONDS)
+
+
+def _run_process(stages: list[str], concurrency: int) -> None:
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s [%(processName)s %(name)s] %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    asyncio.run(_consume_until_stopped(stages, concurrency))
+
+
+async def _consume_until_stopped(stages: list[str], concurrency: int) -> None:
+    try:
+        await consume(stages, concurrency)
+    finally:
+        await close_http_session()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Post-call job consumer")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=settings.POST_CALL_CONCURRENCY)
+    parser.add_argument("--stages", default=",".join(STAGES), help=f"comma-separated subset of {STAGES}")
+    args = parser.parse_args()
+
+    stages = [s.strip() for s in args.stages.split(",") if s.strip()]
+    unknown = set(stages) - set(STAGES)
+    if unknown:
+        parser.error(f"unknown stages: {sorted(unknown)}")
+
+    if args.processes <= 1:
+        _run_process(stages, args.concurrency)
+        return
+
+    procs = [
+        multiprocessing.Process(
+            target=_run_process,
+            args=(stages, args.concurrency),
+            name=f"post-call-{i}",
+        )
+        for i in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+
+
+if __name__ == "__main__":
+    main()
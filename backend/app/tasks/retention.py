@@ -9,7 +9,7 @@ import logging
 from datetime import datetime, timezone, timedelta
 
 from app.config import settings
-from app.database import get_supabase
+from app.database import get_supabase, run_query
 from app.pii import redact_pii_from_transcript
 
 logger = logging.getLogger(__name__)
@@ -51,12 +51,11 @@ async def run_retention_cleanup() -> dict:
     ).isoformat()
 
     # Find calls older than cutoff that haven't been redacted yet
-    calls_result = (
+    calls_result = await run_query(
         db.table("calls")
         .select("id, caller_number")
         .lt("started_at", cutoff)
         .or_("pii_redacted.is.null,pii_redacted.eq.false")
-        .execute()
     )
 
     calls = calls_result.data or []
@@ -76,26 +75,24 @@ async def run_retention_cleanup() -> dict:
     redacted_function_logs = 0
 
     # ── Redact transcript entries in bulk ────────────────────────
-    transcripts = (
+    transcripts = await run_query(
         db.table("transcript_entries")
         .select("id, content")
         .in_("call_id", call_ids)
-        .execute()
     )
     for entry in (transcripts.data or []):
         redacted_content = redact_pii_from_transcript(entry["content"])
         if redacted_content != entry["content"]:
-            db.table("transcript_entries").update({
+            await run_query(db.table("transcript_entries").update({
                 "content": redacted_content,
-            }).eq("id", entry["id"]).execute()
+            }).eq("id", entry["id"]))
             redacted_transcripts += 1
 
     # ── Redact PII from function_call_logs arguments and results ─
-    fn_logs = (
+    fn_logs = await run_query(
         db.table("function_call_logs")
         .select("id, arguments, result")
         .in_("call_id", call_ids)
-        .execute()
     )
     for log in (fn_logs.data or []):
         update_payload = {}
@@ -111,15 +108,15 @@ async def run_retention_cleanup() -> dict:
                 update_payload["result"] = redacted_result
 
         if update_payload:
-            db.table("function_call_logs").update(update_payload).eq("id", log["id"]).execute()
+            await run_query(db.table("function_call_logs").update(update_payload).eq("id", log["id"]))
             redacted_function_logs += 1
 
     # ── Null out caller_number and mark calls as redacted in bulk ─
-    db.table("calls").update({
+    await run_query(db.table("calls").update({
         "caller_number": None,
         "pii_redacted": True,
         "retention_expires_at": datetime.now(timezone.utc).isoformat(),
-    }).in_("id", call_ids).execute()
+    }).in_("id", call_ids))
     redacted_calls = len(call_ids)
 
     result = {
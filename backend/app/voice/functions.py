@@ -1,33 +1,118 @@
 """Tool/function execution handlers."""
 import asyncio
 import logging
+import time
+from datetime import datetime, timezone
+from urllib.parse import urlparse
+
 import httpx
-from app.database import get_supabase
+from app.config import settings
+from app.services import circuit_breaker, config_cache, response_cache
+from app.services.batch_writer import get_function_log_sink
 
 logger = logging.getLogger(__name__)
 
+# Methods safe to send twice — only these are ever hedged
+_IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+# ── Shared HTTP client for custom function webhooks ──────────────
+# One long-lived pooled client per process: tool calls reuse warm keep-alive
+# (and, when the optional `h2` package is installed, multiplexed HTTP/2)
+# connections instead of paying a TLS handshake while the caller waits.
+
+_http_client: httpx.AsyncClient | None = None
+_http_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def get_webhook_client() -> httpx.AsyncClient:
+    """Return the process-wide pooled client, creating it for the running loop."""
+    global _http_client, _http_client_loop
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client.is_closed or _http_client_loop is not loop:
+        _http_client = httpx.AsyncClient(
+            http2=_http2_available(),
+            limits=httpx.Limits(
+                max_connections=settings.TOOL_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.TOOL_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=settings.TOOL_HTTP_KEEPALIVE_SECONDS,
+            ),
+        )
+        _http_client_loop = loop
+    return _http_client
+
+
+async def warm_up_connections(funcs: list[dict]) -> None:
+    """Open pooled connections to the webhook hosts of an agent's custom functions.
+
+    Sends a HEAD to each distinct origin (never the webhook path itself, so no
+    function is triggered) and ignores the response — the point is the TCP/TLS
+    connection left in the pool for the first real tool call.
+    """
+    origins = set()
+    for func in funcs:
+        parsed = urlparse(func.get("webhook_url") or "")
+        if parsed.scheme in ("http", "https") and parsed.netloc:
+            origins.add(f"{parsed.scheme}://{parsed.netloc}/")
+            # Creating the breaker now loads its endpoint's shared state before the first tool call
+            circuit_breaker.get_breaker(func["webhook_url"])
+    if not origins:
+        return
+
+    client = get_webhook_client()
+
+    async def _warm(origin: str) -> None:
+        try:
+            await client.head(origin, timeout=5.0)
+        except Exception as e:
+            logger.debug(f"Webhook warmup failed for {origin}: {e}")
+
+    await asyncio.gather(*(_warm(o) for o in origins))
+    logger.info(f"Warmed webhook connections: {sorted(origins)}")
+
+
+async def execute_tool(
+    call_id: str | None,
+    function_name: str,
+    arguments: dict,
+    call_context: dict | None = None,
+    func_def: dict | None = None,
+) -> dict:
+    """Run a tool and log the call.
 
-async def execute_tool(call_id: str | None, function_name: str, arguments: dict, call_context: dict | None = None) -> dict:
-    db = get_supabase()
-    log_data = {"function_name": function_name, "arguments": arguments, "status": "executing"}
+    ``func_def`` is the custom function row already resolved when the agent was
+    built; passing it skips the per-invocation lookup. The log row is written
+    once, with its final status, by the batched function-log writer — nothing
+    on this path waits for the database.
+    """
+    log_data = {
+        "function_name": function_name,
+        "arguments": arguments,
+        "executed_at": datetime.now(timezone.utc).isoformat(),
+    }
     if call_id:
         log_data["call_id"] = call_id
-    log_result = db.table("function_call_logs").insert(log_data).execute()
-    log_id = log_result.data[0]["id"] if log_result.data else None
 
     try:
-        result = await _run_function(function_name, arguments, call_context)
-        if log_id:
-            db.table("function_call_logs").update({"result": result, "status": "completed"}).eq("id", log_id).execute()
+        result = await _run_function(function_name, arguments, call_context, func_def)
+        log_data.update({"result": result, "status": "completed"})
         return result
     except Exception as e:
         logger.error(f"Tool execution error: {function_name}: {e}")
-        if log_id:
-            db.table("function_call_logs").update({"status": "failed", "error_message": str(e)}).eq("id", log_id).execute()
+        log_data.update({"status": "failed", "error_message": str(e)})
         return {"error": str(e)}
+    finally:
+        get_function_log_sink().add(log_data)
 
 
-async def _run_function(name: str, args: dict, call_context: dict | None = None) -> dict:
+async def _run_function(name: str, args: dict, call_context: dict | None = None, func_def: dict | None = None) -> dict:
     if name == "end_call":
         return {"action": "end_call", "reason": args.get("reason", "completed")}
     if name == "transfer_call":
@@ -37,11 +122,11 @@ async def _run_function(name: str, args: dict, call_context: dict | None = None)
     if name == "book_appointment":
         return {"booked": True, "confirmation": f"Appointment for {args.get('name')} on {args.get('date')} at {args.get('time')}"}
 
-    # Check custom functions
-    db = get_supabase()
-    func_result = db.table("custom_functions").select("*").eq("name", name).eq("is_active", True).execute()
-    if func_result.data:
-        return await _call_webhook(func_result.data[0], args, call_context)
+    # Check custom functions — pre-resolved definition first, then the config cache
+    if func_def is None:
+        func_def = await config_cache.custom_functions.get(name)
+    if func_def:
+        return await _call_webhook(func_def, args, call_context)
 
     return {"error": f"Unknown function: {name}"}
 
@@ -69,13 +154,50 @@ def _apply_response_mapping(data: dict, mapping: dict) -> dict:
     return extracted
 
 
+async def _send_hedged(send, breaker, delay: float) -> httpx.Response:
+    """Send a request; if it hasn't answered within ``delay``, race a second copy.
+
+    Returns the first response to arrive (an exception from one copy is only
+    raised if the other fails too). The loser is cancelled.
+    """
+    first = asyncio.create_task(send())
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done:
+        return first.result()
+
+    breaker.hedges += 1
+    second = asyncio.create_task(send())
+    pending = {first, second}
+    error: BaseException | None = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is second:
+                        breaker.hedge_wins += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        for task in pending:
+            task.cancel()
+
+
 async def _call_webhook(func: dict, args: dict, call_context: dict | None = None) -> dict:
     url = func.get("webhook_url")
     if not url:
         return {"error": "No webhook URL configured"}
 
+    # Opt-in per-function response cache, shared by all calls in this worker
+    cache = response_cache.get_cache(func)
+    if cache is not None:
+        cached = cache.get(args)
+        if cached is not None:
+            return cached
+
     method = func.get("method", "POST").upper()
-    headers = func.get("headers") or {}
+    headers = dict(func.get("headers") or {})  # never mutate the cached definition
     headers.setdefault("Content-Type", "application/json")
     timeout = func.get("timeout_seconds", 30)
     retries = func.get("retry_count", 0)
@@ -105,39 +227,58 @@ async def _call_webhook(func: dict, args: dict, call_context: dict | None = None
         new_query = urlencode({k: v[0] for k, v in existing_params.items()})
         url = urlunparse(parsed._replace(query=new_query))
 
+    breaker = circuit_breaker.get_breaker(url)
+    hedge = bool(func.get("hedge_requests")) and method in _IDEMPOTENT_METHODS
+
+    async def _send() -> httpx.Response:
+        client = get_webhook_client()
+        if method == "GET":
+            return await client.get(url, params=args, headers=headers, timeout=float(timeout))
+        return await client.request(method, url, json=body, headers=headers, timeout=float(timeout))
+
     last_error = None
     for attempt in range(retries + 1):
+        # Fail fast while the endpoint's breaker is open — no dead air waiting on timeouts
+        if not breaker.allow():
+            last_error = f"Circuit open for {breaker.endpoint}"
+            break
+
+        started = time.perf_counter()
         try:
-            async with httpx.AsyncClient(timeout=float(timeout)) as client:
-                if method == "GET":
-                    resp = await client.get(url, params=args, headers=headers)
-                else:
-                    resp = await client.request(method, url, json=body, headers=headers)
+            if hedge:
+                resp = await _send_hedged(_send, breaker, breaker.hedge_delay(float(timeout)))
+            else:
+                resp = await _send()
+            breaker.record(resp.status_code >= 500, (time.perf_counter() - started) * 1000)
 
-                if resp.status_code < 400:
-                    try:
-                        data = resp.json()
-                    except Exception:
-                        data = {"response": resp.text}
+            if resp.status_code < 400:
+                try:
+                    data = resp.json()
+                except Exception:
+                    data = {"response": resp.text}
 
-                    # Apply response mapping if configured
-                    if response_mapping and isinstance(data, dict):
-                        mapped = _apply_response_mapping(data, response_mapping)
-                        data = {"_raw": data, **mapped}
+                # Apply response mapping if configured
+                if response_mapping and isinstance(data, dict):
+                    mapped = _apply_response_mapping(data, response_mapping)
+                    data = {"_raw": data, **mapped}
 
-                    result = data if isinstance(data, dict) else {"response": data}
+                result = data if isinstance(data, dict) else {"response": data}
 
-                    # Extract and store variables from response
-                    if store_variables and isinstance(data, dict):
-                        stored = _apply_response_mapping(data if "_raw" not in data else data["_raw"], store_variables)
-                        result["_stored_variables"] = stored
+                # Extract and store variables from response
+                if store_variables and isinstance(data, dict):
+                    stored = _apply_response_mapping(data if "_raw" not in data else data["_raw"], store_variables)
+                    result["_stored_variables"] = stored
 
-                    return result
+                if cache is not None:
+                    cache.put(args, result)
+                return result
 
-                last_error = f"Webhook returned {resp.status_code}: {resp.text[:200]}"
+            last_error = f"Webhook returned {resp.status_code}: {resp.text[:200]}"
         except httpx.TimeoutException:
+            breaker.record(True, (time.perf_counter() - started) * 1000)
             last_error = f"Timeout after {timeout}s"
         except Exception as e:
+            breaker.record(True, (time.perf_counter() - started) * 1000)
             last_error = str(e)
 
         if attempt < retries:
@@ -6,12 +6,23 @@ provider in the voice pipeline.
 
 Model is lazy-loaded on first use and cached as a module-level singleton
 so it is only loaded once per worker process.
+
+livekit-agents runs every job (call) in its own process, so utterances
+from concurrent calls can only share a forward pass outside the job
+processes. With ``NEPALI_STT_SERVER_SOCKET`` set, utterances are sent to the
+model server (``app.voice.nepali_stt_server``), which holds the one copy of
+the model and micro-batches them (``_InferenceBatcher``). Otherwise, the
+default, each job transcribes with its own model, one utterance per forward
+pass. Throughput vs added latency: ``python -m app.benchmarks.nepali_stt_batching``.
 """
 from __future__ import annotations
 
 import asyncio
 import logging
-from typing import AsyncIterable
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterable, Callable
 
 import numpy as np
 
@@ -23,6 +34,8 @@ from livekit.agents.stt import (
     SpeechEventType,
 )
 
+from app.config import settings
+
 logger = logging.getLogger(__name__)
 
 # ── Model singleton (lazy-loaded) ────────────────────────────────
@@ -64,6 +77,14 @@ async def _ensure_model_loaded() -> None:
             ) from e
 
 
+def prewarm() -> None:
+    """Load the model synchronously (worker prewarm, before any event loop runs jobs)."""
+    global _processor, _model
+    if _model is None:
+        _processor, _model = _load_model_sync()
+        logger.info("Nepali STT model loaded and ready")
+
+
 def _load_model_sync():
     from transformers import Wav2Vec2ForCTC, Wav2Vec2Processor
     import torch
@@ -80,23 +101,158 @@ def _load_model_sync():
 
 
 def _transcribe_sync(audio_float32: np.ndarray, sample_rate: int) -> str:
-    """Synchronous inference — called from a thread pool executor."""
+    """Synchronous inference for one utterance."""
+    return _transcribe_batch_sync([audio_float32], sample_rate)[0]
+
+
+def _transcribe_batch_sync(audios: list[np.ndarray], sample_rate: int) -> list[str]:
+    """One padded forward pass over several utterances — called from the inference thread."""
     import torch
 
-    input_values = _processor(
-        audio_float32,
+    features = _processor(
+        audios,
         sampling_rate=sample_rate,
         return_tensors="pt",
-    ).input_values
+        padding=True,
+        return_attention_mask=True,
+    )
+    input_values = features.input_values
+    attention_mask = features.attention_mask
 
     if torch.cuda.is_available():
         input_values = input_values.cuda()
+        attention_mask = attention_mask.cuda()
 
-    with torch.no_grad():
-        logits = _model(input_values).logits
+    # Checkpoints whose feature encoder uses group norm were trained without an
+    # attention mask and expect plain zero padding; the others need the mask
+    use_mask = getattr(_processor.feature_extractor, "return_attention_mask", False)
+    with torch.inference_mode():
+        logits = _model(input_values, attention_mask=attention_mask if use_mask else None).logits
 
     predicted_ids = torch.argmax(logits, dim=-1)
-    return _processor.decode(predicted_ids[0], skip_special_tokens=True)
+    # Drop the frames computed over padding before CTC decoding
+    lengths = _model._get_feat_extract_output_lengths(attention_mask.sum(-1)).tolist()
+    return [
+        _processor.decode(ids[:n], skip_special_tokens=True)
+        for ids, n in zip(predicted_ids, lengths)
+    ]
+
+
+# ── Micro-batching inference server ───────────────────────────────
+
+class _InferenceBatcher:
+    """Runs concurrent utterances through the model as padded batches.
+
+    ``transcribe()`` queues an utterance and waits for its text. One server
+    task takes queued utterances in arrival order and runs them as a single
+    forward pass on a dedicated inference thread. When it has fewer than
+    ``max_batch`` it first waits until the oldest utterance is ``wait``
+    seconds old, for others to join. Utterances arriving while a batch runs
+    form the next one, so under load batches fill without waiting, and at
+    low load an utterance pays at most ``wait``. A batch is also capped at
+    ``max_batch_samples`` of padded audio, bounding the work wasted on
+    padding when lengths differ widely.
+    """
+
+    def __init__(
+        self,
+        run_batch: Callable[[list[np.ndarray]], list[str]],
+        max_batch: int,
+        wait: float,
+        max_batch_samples: int,
+    ) -> None:
+        self._run_batch = run_batch
+        self.max_batch = max_batch
+        self.wait = wait
+        self.max_batch_samples = max_batch_samples
+        self._pending: deque[tuple[np.ndarray, asyncio.Future, float]] = deque()
+        self._wakeup = asyncio.Event()
+        self._server: asyncio.Task | None = None
+        # One forward pass at a time: torch already spreads a pass over the cores
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nepali-stt")
+        self.batches = 0
+        self.utterances = 0
+
+    async def transcribe(self, audio: np.ndarray) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((audio, future, loop.time()))
+        if self._server is None or self._server.done():
+            self._server = asyncio.create_task(self._serve())
+        self._wakeup.set()
+        return await future
+
+    def _take_batch(self) -> list[tuple[np.ndarray, asyncio.Future]]:
+        batch = []
+        longest = 0
+        while self._pending and len(batch) < self.max_batch:
+            audio, future, _ = self._pending[0]
+            if future.done():
+                # The caller stopped waiting (turn interrupted, call ended)
+                self._pending.popleft()
+                continue
+            padded = max(longest, len(audio)) * (len(batch) + 1)
+            if batch and padded > self.max_batch_samples:
+                break
+            self._pending.popleft()
+            batch.append((audio, future))
+            longest = max(longest, len(audio))
+        return batch
+
+    async def _serve(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            if len(self._pending) < self.max_batch:
+                delay = self._pending[0][2] + self.wait - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            batch = self._take_batch()
+            if not batch:
+                continue
+            try:
+                texts = await loop.run_in_executor(self._executor, self._run_batch, [a for a, _ in batch])
+            except Exception as e:
+                logger.error(f"Nepali STT batch of {len(batch)} failed: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.batches += 1
+            self.utterances += len(batch)
+            for (_, future), text in zip(batch, texts):
+                if not future.done():
+                    future.set_result(text)
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.cancel()
+        self._executor.shutdown(wait=False)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "utterances": self.utterances,
+            "mean_batch": round(self.utterances / self.batches, 2) if self.batches else 0.0,
+            "pending": len(self._pending),
+        }
+
+
+async def _transcribe(audio_float32: np.ndarray) -> str:
+    """Text for one 16 kHz utterance: from the model server if configured, else from this process's model."""
+    if settings.NEPALI_STT_SERVER_SOCKET:
+        from app.voice import nepali_stt_server
+        try:
+            return await nepali_stt_server.transcribe(audio_float32)
+        except (OSError, asyncio.IncompleteReadError) as e:
+            logger.error(f"Nepali STT server unreachable ({e}) — transcribing in this process")
+
+    await _ensure_model_loaded()
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, _transcribe_sync, audio_float32, NepaliSTT.TARGET_SAMPLE_RATE)
 
 
 # ── LiveKit STT plugin ────────────────────────────────────────────
@@ -125,8 +281,6 @@ class NepaliSTT(stt.STT):
         language: str | None = "ne",
         conn_options=None,
     ) -> SpeechEvent:
-        await _ensure_model_loaded()
-
         # In livekit-agents v1.4, buffer is a single AudioFrame
         from livekit import rtc
         if isinstance(buffer, rtc.AudioFrame):
@@ -149,10 +303,12 @@ class NepaliSTT(stt.STT):
                 alternatives=[SpeechData(text="", language="ne", confidence=0.0)],
             )
 
-        # Run inference off the event loop
-        loop = asyncio.get_event_loop()
-        transcription = await loop.run_in_executor(
-            None, _transcribe_sync, audio_float32, self.TARGET_SAMPLE_RATE
+        # Off the event loop; batched with other calls' utterances by the model server
+        started = time.perf_counter()
+        transcription = await _transcribe(audio_float32)
+        logger.debug(
+            f"Nepali STT: {audio_float32.size / self.TARGET_SAMPLE_RATE:.1f}s utterance transcribed "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
         )
 
         # Transliterate Devanagari → Latin (ITRANS) so LLM receives plain ASCII
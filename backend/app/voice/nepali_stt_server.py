@@ -0,0 +1,143 @@
+"""Nepali STT model server — one wav2vec2 model shared by every voice job process.
+
+livekit-agents runs each job (call) in its own process, so a batcher inside
+a job only ever sees that call's utterances. With ``NEPALI_STT_SERVER_SOCKET``
+set, ``NepaliSTT`` sends each utterance over that Unix socket to this
+process instead. It holds the only copy of the model and runs utterances
+through ``nepali_stt._InferenceBatcher``, so concurrent calls share forward
+passes, and job processes no longer load the model themselves. If the
+server cannot be reached, jobs fall back to transcribing in-process.
+
+Protocol, one request per connection: ``<u32 samples><float32 16 kHz audio>``
+→ ``<u8 status><u32 length><utf-8 text, or the error if status is 1>``.
+
+Run via: python -m app.voice.nepali_stt_server [--socket /run/nepali-stt.sock]
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import struct
+from pathlib import Path
+
+import numpy as np
+
+from app.config import settings
+from app.voice import nepali_stt
+
+logger = logging.getLogger(__name__)
+
+_REQUEST = struct.Struct("<I")
+_REPLY = struct.Struct("<BI")
+
+# Refuse requests claiming more audio than this (10 minutes) rather than allocating for them
+_MAX_SAMPLES = 600 * nepali_stt.NepaliSTT.TARGET_SAMPLE_RATE
+
+_STATS_INTERVAL_SECONDS = 60.0
+
+
+# ── Client (voice job processes) ─────────────────────────────────
+
+async def transcribe(audio: np.ndarray, socket_path: str | None = None) -> str:
+    """Send one 16 kHz float32 utterance to the server and return its text."""
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    reader, writer = await asyncio.open_unix_connection(socket_path or settings.NEPALI_STT_SERVER_SOCKET)
+    try:
+        writer.write(_REQUEST.pack(audio.size))
+        writer.write(audio.tobytes())
+        await writer.drain()
+        status, length = _REPLY.unpack(await reader.readexactly(_REPLY.size))
+        body = (await reader.readexactly(length)).decode("utf-8")
+    finally:
+        writer.close()
+    if status:
+        raise RuntimeError(f"Nepali STT server: {body}")
+    return body
+
+
+# ── Server ───────────────────────────────────────────────────────
+
+def new_batcher() -> nepali_stt._InferenceBatcher:
+    rate = nepali_stt.NepaliSTT.TARGET_SAMPLE_RATE
+    return nepali_stt._InferenceBatcher(
+        lambda audios: nepali_stt._transcribe_batch_sync(audios, rate),
+        max_batch=settings.NEPALI_STT_MAX_BATCH,
+        wait=settings.NEPALI_STT_BATCH_WAIT_MS / 1000,
+        max_batch_samples=int(settings.NEPALI_STT_BATCH_MAX_SECONDS * rate),
+    )
+
+
+async def _handle(batcher: nepali_stt._InferenceBatcher, reader: asyncio.StreamReader,
+                  writer: asyncio.StreamWriter) -> None:
+    try:
+        (samples,) = _REQUEST.unpack(await reader.readexactly(_REQUEST.size))
+        if samples > _MAX_SAMPLES:
+            status, body = 1, f"utterance of {samples} samples exceeds the {_MAX_SAMPLES} limit"
+        else:
+            audio = np.frombuffer(await reader.readexactly(samples * 4), dtype=np.float32)
+            try:
+                status, body = 0, await batcher.transcribe(audio)
+            except Exception as e:
+                status, body = 1, str(e)
+        data = body.encode("utf-8")
+        writer.write(_REPLY.pack(status, len(data)) + data)
+        await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass  # the job went away mid-request (call ended)
+    finally:
+        writer.close()
+
+
+async def _log_stats(batcher: nepali_stt._InferenceBatcher) -> None:
+    reported = 0
+    while True:
+        await asyncio.sleep(_STATS_INTERVAL_SECONDS)
+        stats = batcher.stats()
+        if stats["utterances"] != reported:
+            reported = stats["utterances"]
+            logger.info(f"Nepali STT server: {stats}")
+
+
+async def serve(socket_path: str, batcher: nepali_stt._InferenceBatcher | None = None) -> None:
+    """Serve transcriptions on ``socket_path`` until cancelled."""
+    if batcher is None:
+        await nepali_stt._ensure_model_loaded()
+        batcher = new_batcher()
+    path = Path(socket_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # A socket file left by a previous run would make the bind fail
+    path.unlink(missing_ok=True)
+    server = await asyncio.start_unix_server(lambda r, w: _handle(batcher, r, w), path=socket_path)
+    stats = asyncio.create_task(_log_stats(batcher))
+    logger.info(
+        f"Nepali STT server listening on {socket_path} (max batch {batcher.max_batch}, "
+        f"wait {batcher.wait * 1000:.0f} ms)"
+    )
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        stats.cancel()
+        batcher.close()
+        path.unlink(missing_ok=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--socket", default=settings.NEPALI_STT_SERVER_SOCKET, required=not settings.NEPALI_STT_SERVER_SOCKET,
+                        help="Unix socket to listen on (default: NEPALI_STT_SERVER_SOCKET)")
+    args = parser.parse_args()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s %(levelname)s [%(name)s] %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    try:
+        asyncio.run(serve(args.socket))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
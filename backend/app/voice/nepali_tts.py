@@ -61,6 +61,14 @@ async def _ensure_model_loaded() -> None:
         logger.info("Nepali TTS model loaded and ready")
 
 
+def prewarm() -> None:
+    """Load the model synchronously (worker prewarm, before any event loop runs jobs)."""
+    global _processor, _model, _vocoder, _speaker_embeddings
+    if _model is None:
+        _processor, _model, _vocoder, _speaker_embeddings = _load_model_sync()
+        logger.info("Nepali TTS model loaded and ready")
+
+
 def _load_model_sync():
     import torch
     from transformers import SpeechT5Processor, SpeechT5ForTextToSpeech, SpeechT5HifiGan
@@ -3,7 +3,6 @@ import asyncio
 import json
 import logging
 import time
-import aiohttp
 from datetime import datetime, timezone
 from dotenv import load_dotenv
 
@@ -14,14 +13,31 @@ from livekit.agents import AgentSession, Agent
 from livekit.agents.llm import function_tool
 from livekit.plugins import deepgram, openai, cartesia, silero, anthropic
 
-from app.database import get_supabase
+from app.database import get_supabase, run_query
 from app.config import settings
-from app.voice.functions import execute_tool
+from app.voice.functions import execute_tool, warm_up_connections
 from app.voice.tools import get_tools_for_agent, BUILT_IN_TOOLS
 from app.services.livekit_service import transfer_sip_participant, create_sip_participant_with_headers
+from app.services import config_cache
+from app.services.response_cache import get_response_cache_stats
+from app.services.rag import KnowledgeRetriever, format_context
+from app.services.circuit_breaker import publish_breaker_states
+from app.services.batch_writer import get_transcript_sink, get_function_log_sink, flush_all
+from app.services.webhooks import close_http_session, fire_webhook, enqueue_webhook, get_webhook_metrics
+from app.services.post_call import enqueue_post_call
 
 logger = logging.getLogger(__name__)
 
+# Fire-and-forget session tasks; referenced here so they are not garbage-collected mid-run
+_background: set[asyncio.Task] = set()
+
+
+def _spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_background.discard)
+    return task
+
 import re
 
 def _to_e164(number: str) -> str:
@@ -88,8 +104,9 @@ async def _execute_transfer(agent_ref, cid: str, reason: str, transfer_cfg: dict
         transcript = ""
         if cid:
             try:
-                result = db.table("transcript_entries").select("role,content") \
-                    .eq("call_id", cid).order("timestamp", desc=True).limit(10).execute()
+                await get_transcript_sink().flush()
+                result = await run_query(db.table("transcript_entries").select("role,content")
+                                         .eq("call_id", cid).order("timestamp", desc=True).limit(10))
                 entries = list(reversed(result.data or []))
                 transcript = "\n".join(f"{e['role'].upper()}: {e['content']}" for e in entries)
             except Exception:
@@ -152,17 +169,14 @@ async def _execute_transfer(agent_ref, cid: str, reason: str, transfer_cfg: dict
                 if three_way_msg and session:
                     await session.say(three_way_msg, add_to_chat_ctx=False)
 
-    # Log to DB
-    try:
-        db.table("function_call_logs").insert({
-            "call_id": cid,
-            "function_name": "transfer_call",
-            "arguments": {"to_number": destination, "reason": reason, "type": transfer_type},
-            "result": {"transferred": True},
-            "status": "completed",
-        }).execute()
-    except Exception:
-        pass
+    # Log to DB (batched, off the call path)
+    get_function_log_sink().add({
+        "call_id": cid,
+        "function_name": "transfer_call",
+        "arguments": {"to_number": destination, "reason": reason, "type": transfer_type},
+        "result": {"transferred": True},
+        "status": "completed",
+    })
 
     return json.dumps({"transferred": True, "to": destination, "type": transfer_type})
 
@@ -350,41 +364,83 @@ def _build_tts(agent_config: dict):
     return cartesia.TTS(**tts_kwargs)
 
 
-def _load_rag_context(agent_config: dict) -> str:
-    """Load RAG context from knowledge base if configured."""
-    kb_id = agent_config.get("knowledge_base_id")
-    if not kb_id:
+def _load_rag_context(knowledge_base: dict | None) -> str:
+    """Build the RAG note for the system prompt from a pre-loaded knowledge base row."""
+    if not knowledge_base:
         return ""
 
+    # Actual retrieval happens per user turn (VoiceAgent.on_user_turn_completed)
+    return (
+        f"\n\n[Knowledge Base '{knowledge_base['name']}' is connected. Relevant excerpts from it "
+        f"are provided with the caller's messages — use them when they help answer.]"
+    )
+
+
+def _build_retriever(knowledge_base: dict | None, agent_config: dict) -> KnowledgeRetriever | None:
+    """Create the per-call KB retriever, honouring per-agent RAG overrides in metadata."""
+    if not knowledge_base:
+        return None
+    metadata = agent_config.get("metadata") or {}
     try:
-        db = get_supabase()
-        kb_result = db.table("knowledge_bases").select("*").eq("id", kb_id).eq("is_active", True).execute()
-        if not kb_result.data:
-            return ""
-
-        kb = kb_result.data[0]
-        # Return a note that RAG is available — actual retrieval happens at query time
-        return f"\n\n[Knowledge Base '{kb['name']}' is connected. Use information from it when relevant.]"
+        return KnowledgeRetriever(
+            knowledge_base,
+            top_k=metadata.get("rag_top_k"),
+            budget_ms=metadata.get("rag_latency_budget_ms"),
+        )
     except Exception as e:
         logger.error(f"Failed to load RAG context: {e}")
-        return ""
+        return None
 
 
-def _load_custom_functions(tool_names: list[str]) -> dict[str, dict]:
-    """Batch-load all custom function definitions in a single DB query."""
+async def _load_custom_functions(tool_names: list[str]) -> dict[str, dict]:
+    """Resolve custom function definitions via the config cache (one batched query on miss)."""
     custom_names = [n for n in tool_names if n not in BUILT_IN_TOOLS]
     if not custom_names:
         return {}
 
     try:
-        db = get_supabase()
-        result = db.table("custom_functions").select("name,description").eq("is_active", True).in_("name", custom_names).execute()
-        return {f["name"]: f for f in (result.data or [])}
+        return await config_cache.custom_functions.get_many(custom_names)
     except Exception as e:
         logger.error(f"Failed to batch-load custom functions: {e}")
         return {}
 
 
+async def _load_knowledge_base(agent_config: dict) -> dict | None:
+    """Resolve the agent's active knowledge base via the config cache."""
+    kb_id = agent_config.get("knowledge_base_id")
+    if not kb_id:
+        return None
+
+    try:
+        return await config_cache.knowledge_bases.get(kb_id)
+    except Exception as e:
+        logger.error(f"Failed to load RAG context: {e}")
+        return None
+
+
+async def _record_call_start(call_id: str) -> None:
+    """Mark the call in-progress and record implicit consent (runs off the critical path)."""
+    db = get_supabase()
+    try:
+        await run_query(db.table("calls").update({"status": "in-progress"}).eq("id", call_id))
+    except Exception as e:
+        logger.error(f"Failed to update call status: {e}")
+
+    # Record implicit consent for call recording
+    try:
+        call_data = await run_query(db.table("calls").select("caller_number").eq("id", call_id))
+        caller_number = call_data.data[0].get("caller_number", "") if call_data.data else ""
+        await run_query(db.table("consent_records").insert({
+            "call_id": call_id,
+            "caller_number": caller_number,
+            "consent_type": "call_recording",
+            "consent_given": True,
+            "consent_method": "implicit_continued_participation",
+        }))
+    except Exception as e:
+        logger.error(f"Failed to record consent: {e}")
+
+
 async def _create_mcp_servers(mcp_configs: list[dict]) -> list:
     """Connect to configured MCP servers. Returns a list of server objects."""
     if not mcp_configs:
@@ -426,14 +482,25 @@ async def _create_mcp_servers(mcp_configs: list[dict]) -> list:
     return servers
 
 
-def _build_agent(agent_config: dict, call_id: str, mcp_servers: list | None = None) -> Agent:
-    """Build a LiveKit Agent with instructions and tools from agent config."""
+def _build_agent(
+    agent_config: dict,
+    call_id: str,
+    mcp_servers: list | None = None,
+    knowledge_base: dict | None = None,
+    custom_funcs: dict[str, dict] | None = None,
+) -> Agent:
+    """Build a LiveKit Agent with instructions and tools from agent config.
+
+    ``knowledge_base`` and ``custom_funcs`` are resolved by the caller (from the
+    config cache) so building the agent never touches the database.
+    """
     system_prompt = agent_config.get("system_prompt", "You are a helpful voice AI assistant.")
-    rag_context = _load_rag_context(agent_config)
+    retriever = _build_retriever(knowledge_base, agent_config)
+    rag_context = _load_rag_context(knowledge_base) if retriever else ""
     instructions = system_prompt + rag_context
 
     tools_enabled = agent_config.get("tools_enabled", [])
-    custom_funcs = _load_custom_functions(tools_enabled)
+    custom_funcs = custom_funcs or {}
 
     # Mutable state for late-bound session/room (set after session.start())
     state: dict = {"session": None, "room": None}
@@ -488,18 +555,20 @@ def _build_agent(agent_config: dict, call_id: str, mcp_servers: list | None = No
 
             # Use a factory to properly capture the closure and avoid **kwargs
             # (livekit-agents v1.4 strict schema builder crashes on **kwargs)
-            def _make_custom_tool(tn: str, desc: str):
+            # The resolved definition is bound into the tool, so invoking it
+            # needs no custom_functions lookup
+            def _make_custom_tool(tn: str, desc: str, fdef: dict):
                 @function_tool(name=tn, description=desc)
                 async def _tool(arguments: str = "{}") -> str:
                     try:
                         kwargs = json.loads(arguments) if arguments else {}
                     except Exception:
                         kwargs = {}
-                    result = await execute_tool(call_id, tn, kwargs)
+                    result = await execute_tool(call_id, tn, kwargs, func_def=fdef)
                     return json.dumps(result)
                 return _tool
 
-            tools.append(_make_custom_tool(_name, _desc))
+            tools.append(_make_custom_tool(_name, _desc, func_def))
 
         else:
             logger.warning(f"Tool '{tool_name}' not found in built-in or custom functions — skipping")
@@ -517,6 +586,18 @@ def _build_agent(agent_config: dict, call_id: str, mcp_servers: list | None = No
             self._state = state   # shared mutable dict — session/room set after start()
             self._call_id = call_id
             self._agent_config = agent_config
+            self._retriever = retriever
+
+        async def on_user_turn_completed(self, turn_ctx, new_message):
+            """Inject knowledge base excerpts for this turn before the LLM runs."""
+            if self._retriever is None:
+                return
+            text = new_message.text_content
+            if not text:
+                return
+            matches = await self._retriever.retrieve_for_turn(text)
+            if matches:
+                turn_ctx.add_message(role="assistant", content=format_context(matches))
 
         @property
         def _session(self):
@@ -537,143 +618,6 @@ def _build_agent(agent_config: dict, call_id: str, mcp_servers: list | None = No
     return VoiceAgent()
 
 
-async def _fire_webhook(agent_config: dict, event: str, payload: dict) -> None:
-    """Fire a webhook event to the agent-level webhook URL with retry logic.
-
-    - Reads webhook_settings from agent metadata
-    - Only fires if the event is in the subscribed events list
-    - Retries up to 3 times with exponential backoff
-    - Never raises — logs errors silently so the agent is never blocked
-    """
-    wh = (agent_config.get("metadata") or {}).get("webhook_settings", {})
-    url = (wh.get("url") or "").strip()
-    if not url:
-        return
-
-    subscribed = wh.get("events", [])
-    if subscribed and event not in subscribed:
-        return
-
-    timeout_s = float(wh.get("timeout_seconds", 5))
-    body = {
-        "event": event,
-        "agent_id": agent_config.get("id"),
-        "agent_name": agent_config.get("name"),
-        "timestamp": datetime.now(timezone.utc).isoformat(),
-        **payload,
-    }
-
-    for attempt in range(1, 4):
-        try:
-            async with aiohttp.ClientSession() as http:
-                async with http.post(
-                    url,
-                    json=body,
-                    timeout=aiohttp.ClientTimeout(total=timeout_s),
-                    headers={"Content-Type": "application/json", "X-Webhook-Event": event},
-                ) as resp:
-                    if resp.status < 500:
-                        logger.info(f"Webhook [{event}] → {url} — {resp.status}")
-                        return
-                    logger.warning(f"Webhook [{event}] attempt {attempt} — server error {resp.status}")
-        except Exception as e:
-            logger.warning(f"Webhook [{event}] attempt {attempt} failed: {e}")
-
-        if attempt < 3:
-            await asyncio.sleep(2 ** attempt)  # 2s, 4s backoff
-
-    logger.error(f"Webhook [{event}] failed after 3 attempts — {url}")
-
-
-async def _run_post_call_extraction(call_id: str, agent_config: dict, db) -> None:
-    """Extract structured data from call transcript using LLM and save to call metadata."""
-    extraction_cfg = (agent_config.get("metadata") or {}).get("post_call_extraction", {})
-    if not extraction_cfg.get("enabled"):
-        return
-
-    fields = extraction_cfg.get("fields", [])
-    if not fields:
-        return
-
-    # Load transcript
-    try:
-        transcript_result = db.table("transcript_entries") \
-            .select("role,content") \
-            .eq("call_id", call_id) \
-            .order("timestamp") \
-            .execute()
-        entries = transcript_result.data or []
-    except Exception as e:
-        logger.error(f"Post-call extraction: failed to load transcript for {call_id}: {e}")
-        return
-
-    if not entries:
-        logger.info(f"Post-call extraction: no transcript for call {call_id}, skipping")
-        return
-
-    # Build transcript text
-    transcript_text = "\n".join(
-        f"{e['role'].upper()}: {e['content']}" for e in entries
-    )
-
-    # Build field schema description
-    fields_desc = "\n".join(
-        f"- {f['name']} ({f.get('type', 'string')}): {f.get('description', '')}"
-        for f in fields
-    )
-
-    prompt = (
-        f"You are a data extraction assistant. Given the following call transcript, "
-        f"extract the requested fields and return ONLY a valid JSON object with those fields.\n\n"
-        f"Fields to extract:\n{fields_desc}\n\n"
-        f"If a field cannot be determined from the transcript, use null.\n\n"
-        f"Transcript:\n{transcript_text}\n\n"
-        f"Return only the JSON object, no explanation."
-    )
-
-    try:
-        import openai as openai_sdk
-        client = openai_sdk.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-        response = await client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0,
-            response_format={"type": "json_object"},
-        )
-        extracted = json.loads(response.choices[0].message.content)
-        logger.info(f"Post-call extraction for {call_id}: {extracted}")
-    except Exception as e:
-        logger.error(f"Post-call extraction: LLM call failed for {call_id}: {e}")
-        return
-
-    # Save extracted data to call metadata
-    try:
-        call_result = db.table("calls").select("metadata").eq("id", call_id).execute()
-        existing_meta = (call_result.data[0].get("metadata") or {}) if call_result.data else {}
-        existing_meta["extracted_data"] = extracted
-        db.table("calls").update({"metadata": existing_meta}).eq("id", call_id).execute()
-    except Exception as e:
-        logger.error(f"Post-call extraction: failed to save results for {call_id}: {e}")
-        return
-
-    # POST to extraction-specific webhook if configured
-    webhook_url = extraction_cfg.get("webhook_url", "").strip()
-    if webhook_url:
-        try:
-            payload = {"call_id": call_id, "extracted_data": extracted}
-            async with aiohttp.ClientSession() as http:
-                await http.post(webhook_url, json=payload, timeout=aiohttp.ClientTimeout(total=10))
-            logger.info(f"Post-call extraction webhook sent for {call_id}")
-        except Exception as e:
-            logger.error(f"Post-call extraction: webhook failed for {call_id}: {e}")
-
-    # Fire agent-level extraction_completed webhook event
-    await _fire_webhook(agent_config, "extraction_completed", {
-        "call_id": call_id,
-        "extracted_data": extracted,
-    })
-
-
 async def entrypoint(ctx: agents.JobContext):
     """Main entrypoint for the LiveKit agent worker."""
     await ctx.connect()
@@ -693,33 +637,18 @@ async def entrypoint(ctx: agents.JobContext):
         logger.error("No agent_id in room metadata, cannot start session")
         return
 
-    # Load agent config from Supabase
+    # Load agent config — served from the in-process cache on a warm worker
     db = get_supabase()
-    agent_result = db.table("agents").select("*").eq("id", agent_id).execute()
-    if not agent_result.data:
+    agent_config = await config_cache.agents.get(agent_id)
+    if not agent_config:
         logger.error(f"Agent not found: {agent_id}")
         return
 
-    agent_config = agent_result.data[0]
     logger.info(f"Starting voice session: agent={agent_config['name']}, call={call_id}")
 
-    # Update call status and record consent entry
+    # Update call status and record consent entry — off the critical path
     if call_id:
-        db.table("calls").update({"status": "in-progress"}).eq("id", call_id).execute()
-
-        # Record implicit consent for call recording
-        try:
-            call_data = db.table("calls").select("caller_number").eq("id", call_id).execute()
-            caller_number = call_data.data[0].get("caller_number", "") if call_data.data else ""
-            db.table("consent_records").insert({
-                "call_id": call_id,
-                "caller_number": caller_number,
-                "consent_type": "call_recording",
-                "consent_given": True,
-                "consent_method": "implicit_continued_participation",
-            }).execute()
-        except Exception as e:
-            logger.error(f"Failed to record consent: {e}")
+        _spawn(_record_call_start(call_id))
 
     # Build pipeline components
     stt = _build_stt(agent_config)
@@ -739,8 +668,23 @@ async def entrypoint(ctx: agents.JobContext):
     mcp_configs = agent_metadata.get("mcp_servers", [])
     mcp_servers = await _create_mcp_servers(mcp_configs)
 
-    # Build agent with tools and MCP servers
-    agent = _build_agent(agent_config, call_id, mcp_servers=mcp_servers)
+    # Resolve KB + custom function definitions (cached) and build agent with tools and MCP servers
+    knowledge_base, custom_funcs = await asyncio.gather(
+        _load_knowledge_base(agent_config),
+        _load_custom_functions(agent_config.get("tools_enabled", [])),
+    )
+    agent = _build_agent(
+        agent_config, call_id,
+        mcp_servers=mcp_servers,
+        knowledge_base=knowledge_base,
+        custom_funcs=custom_funcs,
+    )
+
+    # Open pooled connections to this agent's webhook hosts before the first tool call
+    if custom_funcs:
+        _spawn(warm_up_connections(list(custom_funcs.values())))
+    if agent._retriever is not None:
+        _spawn(agent._retriever.warm_up())
 
     # Speech session settings from agent metadata
     allow_interruptions = agent_metadata.get("allow_interruptions", True)
@@ -761,7 +705,10 @@ async def entrypoint(ctx: agents.JobContext):
 
     started_at = time.time()
 
-    # Register transcript event handler (livekit-agents v1.0+)
+    # Register transcript event handler (livekit-agents v1.0+) — entries are
+    # buffered and bulk-inserted by the per-worker transcript sink
+    transcript_sink = get_transcript_sink()
+
     @session.on("conversation_item_added")
     def on_conversation_item(event):
         if not call_id:
@@ -770,14 +717,19 @@ async def entrypoint(ctx: agents.JobContext):
             role = event.item.role
             text = event.item.text_content
             if role in ("user", "assistant") and text:
-                db.table("transcript_entries").insert({
-                    "call_id": call_id,
-                    "role": role,
-                    "content": text,
-                }).execute()
-                logger.info(f"Transcript saved [{role}]: {text[:80]}")
+                transcript_sink.add({"call_id": call_id, "role": role, "content": text})
+                logger.info(f"Transcript queued [{role}]: {text[:80]}")
         except Exception as e:
-            logger.error(f"Failed to save transcript: {e}")
+            logger.error(f"Failed to queue transcript: {e}")
+
+    # Start KB retrieval on interim transcripts so it overlaps endpointing
+    if agent._retriever is not None:
+        @session.on("user_input_transcribed")
+        def on_user_input_transcribed(event):
+            try:
+                agent._retriever.speculate(event.transcript, is_final=event.is_final)
+            except Exception as e:
+                logger.debug(f"Speculative RAG lookup not started: {e}")
 
     # Start the session
     try:
@@ -787,14 +739,14 @@ async def entrypoint(ctx: agents.JobContext):
         )
     except Exception as e:
         logger.error(f"Session start failed: {e}")
-        await _fire_webhook(agent_config, "call_failed", {
+        await fire_webhook(agent_config, "call_failed", {
             "call_id": call_id,
             "error": str(e),
             "stage": "session_start",
         })
         if call_id:
             try:
-                db.table("calls").update({"status": "failed"}).eq("id", call_id).execute()
+                await run_query(db.table("calls").update({"status": "failed"}).eq("id", call_id))
             except Exception:
                 pass
         raise
@@ -803,85 +755,120 @@ async def entrypoint(ctx: agents.JobContext):
     agent._session = session
     agent._room = ctx.room
 
-    # Fire call_started webhook
-    asyncio.create_task(_fire_webhook(agent_config, "call_started", {"call_id": call_id}))
+    # Fire call_started webhook (background delivery queue, pooled connection)
+    enqueue_webhook(agent_config, "call_started", {"call_id": call_id})
 
-    # Send welcome message so the agent speaks first (reduces perceived latency)
-    welcome_msg = agent_metadata.get("welcome_message", "")
-    ai_speaks_first = agent_metadata.get("ai_speaks_first", True)
-    if ai_speaks_first and welcome_msg:
-        await session.say(welcome_msg)
-    elif ai_speaks_first:
-        await session.say("Hello! How can I help you today?")
+    # ── Call teardown — driven by room events, no polling ────────
+    # When the last remote participant leaves, a reconnect grace timer starts;
+    # a participant (re)joining cancels it. Room disconnect ends the call at
+    # once, and the job shutdown callback guarantees end-of-call processing
+    # runs (and finishes) even if the worker is stopped mid-call.
+    reconnect_grace = float(agent_metadata.get("reconnect_grace_seconds", settings.CALL_RECONNECT_GRACE_SECONDS))
+    teardown: dict = {"timer": None, "task": None}
 
-    # Wait for the session to end (participant disconnects)
-    async def _monitor_disconnect():
-        """Update call record when the session ends."""
-        # Wait for all participants to leave
-        while True:
-            participants = ctx.room.remote_participants
-            if len(participants) == 0:
-                # Give a grace period for reconnection
-                await asyncio.sleep(5)
-                if len(ctx.room.remote_participants) == 0:
-                    break
-            await asyncio.sleep(1)
-
-        # Session ended — update call record
+    async def _finalize_call(end_reason: str):
+        """Update the call record and enqueue end-of-call webhooks + extraction."""
         duration = int(time.time() - started_at)
         if call_id:
             try:
-                db.table("calls").update({
+                await run_query(db.table("calls").update({
                     "status": "completed",
                     "duration_seconds": duration,
                     "ended_at": datetime.now(timezone.utc).isoformat(),
-                    "end_reason": "participant_left",
-                }).eq("id", call_id).execute()
+                    "end_reason": end_reason,
+                }).eq("id", call_id))
             except Exception as e:
                 logger.error(f"Failed to update call record: {e}")
 
-        logger.info(f"Session ended: call={call_id}, duration={duration}s")
+        logger.info(f"Session ended: call={call_id}, duration={duration}s, reason={end_reason}")
+        logger.info(f"Webhook delivery metrics: {get_webhook_metrics()}")
+        if agent._retriever is not None:
+            logger.info(f"RAG stats: {agent._retriever.stats()}")
+        cache_stats = get_response_cache_stats()
+        if cache_stats:
+            logger.info(f"Function response cache: {cache_stats}")
 
-        # Fire call_ended webhook
-        await _fire_webhook(agent_config, "call_ended", {
-            "call_id": call_id,
+        # Write buffered transcript entries and function call logs before
+        # post-call stages read them
+        await flush_all()
+
+        # Hand call_ended / transcript_ready / extraction to the post-call consumer
+        await enqueue_post_call(call_id, agent_config, {
             "duration_seconds": duration,
-            "end_reason": "participant_left",
+            "end_reason": end_reason,
         })
 
-        # Fire transcript_ready webhook — batch full transcript
-        if call_id:
-            try:
-                transcript_result = db.table("transcript_entries") \
-                    .select("role,content,timestamp") \
-                    .eq("call_id", call_id) \
-                    .order("timestamp") \
-                    .execute()
-                transcript = transcript_result.data or []
-                if transcript:
-                    await _fire_webhook(agent_config, "transcript_ready", {
-                        "call_id": call_id,
-                        "transcript": transcript,
-                        "turn_count": len(transcript),
-                    })
-            except Exception as e:
-                logger.error(f"Failed to fetch transcript for webhook: {e}")
+        # Report webhook circuit breaker state for the admin API
+        await publish_breaker_states()
+
+    def _end_call(end_reason: str) -> asyncio.Task:
+        """Start end-of-call processing exactly once; returns the running task."""
+        if teardown["timer"] is not None:
+            teardown["timer"].cancel()
+            teardown["timer"] = None
+        if teardown["task"] is None:
+            teardown["task"] = asyncio.create_task(_finalize_call(end_reason))
+        return teardown["task"]
+
+    def _start_grace_timer() -> None:
+        if teardown["task"] is not None or teardown["timer"] is not None:
+            return
+        if ctx.room.remote_participants:
+            return
+        loop = asyncio.get_event_loop()
+        teardown["timer"] = loop.call_later(reconnect_grace, _end_call, "participant_left")
+
+    @ctx.room.on("participant_disconnected")
+    def _on_participant_disconnected(participant):
+        _start_grace_timer()
+
+    @ctx.room.on("participant_connected")
+    def _on_participant_connected(participant):
+        if teardown["timer"] is not None:
+            teardown["timer"].cancel()
+            teardown["timer"] = None
+            logger.info(f"Participant reconnected within grace period: call={call_id}")
 
-        # Run post-call data extraction if configured
-        await _run_post_call_extraction(call_id, agent_config, db)
+    @ctx.room.on("disconnected")
+    def _on_room_disconnected(*_):
+        _end_call("participant_left")
 
-    # Run disconnect monitor in background
-    asyncio.create_task(_monitor_disconnect())
+    async def _on_shutdown(*_):
+        await _end_call("worker_shutdown")
+        # The job process is going away — send what is still queued, then close the pooled session
+        await close_http_session(drain_timeout=5.0)
 
+    ctx.add_shutdown_callback(_on_shutdown)
+
+    # The caller may already have gone while the session was starting
+    _start_grace_timer()
+
+    # Send welcome message so the agent speaks first (reduces perceived latency)
+    welcome_msg = agent_metadata.get("welcome_message", "")
+    ai_speaks_first = agent_metadata.get("ai_speaks_first", True)
+    if ai_speaks_first and welcome_msg:
+        await session.say(welcome_msg)
+    elif ai_speaks_first:
+        await session.say("Hello! How can I help you today?")
+
+
+def _prewarm(proc: agents.JobProcess) -> None:
+    """Pre-load config rows and heavy models at worker startup so first call has no cold-start delay.
+
+    LiveKit calls this synchronously in each new job process, so everything here blocks.
+    """
+    try:
+        config_cache.prime_all()
+    except Exception as e:
+        logger.warning(f"Config cache prime failed (non-fatal): {e}")
 
-async def _prewarm(proc: agents.JobProcess) -> None:
-    """Pre-load heavy models at worker startup so first call has no cold-start delay."""
-    import asyncio
     try:
-        from app.voice.nepali_tts import _ensure_model_loaded as _tts_load
-        from app.voice.nepali_stt import _ensure_model_loaded as _stt_load
+        from app.voice import nepali_stt, nepali_tts
         logger.info("Pre-warming Nepali STT + TTS models...")
-        await asyncio.gather(_tts_load(), _stt_load())
+        nepali_tts.prewarm()
+        # With the STT model server configured, jobs send it their audio and need no model of their own
+        if not settings.NEPALI_STT_SERVER_SOCKET:
+            nepali_stt.prewarm()
         logger.info("Nepali models pre-warmed and ready")
     except Exception as e:
         logger.warning(f"Model pre-warm failed (non-fatal): {e}")
@@ -0,0 +1,95 @@
+import asyncio
+
+from postgrest.exceptions import APIError
+
+from app.services import batch_writer
+from app.services.batch_writer import BatchWriter, is_permanent_error
+
+
+class _FakeTable:
+    """Records inserted rows; rejects any batch containing a poisoned row, or fails transiently on demand."""
+
+    def __init__(self):
+        self.rows: list[dict] = []
+        self.transient_failures = 0
+
+    def insert(self, rows):
+        table = self
+
+        class _Query:
+            def execute(self):
+                if table.transient_failures:
+                    table.transient_failures -= 1
+                    raise APIError({"message": "upstream timeout", "code": "504"})
+                if any(r.get("poison") for r in rows):
+                    raise APIError({"message": "violates foreign key constraint", "code": "23503"})
+                table.rows.extend(rows)
+
+        return _Query()
+
+
+class _FakeDB:
+    def __init__(self, table: _FakeTable):
+        self._table = table
+
+    def table(self, name):
+        return self._table
+
+
+def _writer(monkeypatch, table: _FakeTable, **kwargs) -> BatchWriter:
+    monkeypatch.setattr(batch_writer, "get_supabase", lambda: _FakeDB(table))
+    return BatchWriter("transcript_entries", timestamp_column="timestamp", batch_size=10, **kwargs)
+
+
+def test_classifies_errors():
+    assert is_permanent_error(APIError({"code": "23503"}))
+    assert is_permanent_error(APIError({"code": "PGRST204"}))
+    assert is_permanent_error(APIError({"code": 400}))
+    assert not is_permanent_error(APIError({"code": "503"}))
+    assert not is_permanent_error(APIError({"code": "429"}))
+    assert not is_permanent_error(APIError({"code": "PGRST000"}))
+    assert not is_permanent_error(ConnectionError("reset"))
+
+
+def test_poisoned_row_is_dropped_and_good_rows_written(monkeypatch):
+    table = _FakeTable()
+
+    async def run():
+        writer = _writer(monkeypatch, table)
+        for i in range(25):
+            writer.add({"call_id": f"c{i}", "seq": i, "poison": i == 13})
+        assert await writer.flush()
+        return writer
+
+    writer = asyncio.run(run())
+    assert [r["seq"] for r in table.rows] == [i for i in range(25) if i != 13]
+    assert writer.stats() == {"pending": 0, "written": 24, "dropped": 0, "rejected": 1}
+
+
+def test_transient_failure_keeps_rows_then_gives_up(monkeypatch):
+    table = _FakeTable()
+
+    async def run():
+        writer = _writer(monkeypatch, table, max_attempts=3)
+        for i in range(5):
+            writer.add({"call_id": "c", "seq": i})
+        table.transient_failures = 1
+        assert not await writer.flush()
+        assert writer.stats()["pending"] == 5
+        assert await writer.flush()
+        assert [r["seq"] for r in table.rows] == list(range(5))
+
+        for i in range(5, 8):
+            writer.add({"call_id": "c", "seq": i})
+        table.transient_failures = 3
+        assert not await writer.flush()
+        assert not await writer.flush()
+        # Third attempt gives up on the batch instead of blocking later rows
+        assert await writer.flush()
+        writer.add({"call_id": "c", "seq": 8})
+        assert await writer.flush()
+        return writer
+
+    writer = asyncio.run(run())
+    assert [r["seq"] for r in table.rows] == [0, 1, 2, 3, 4, 8]
+    assert writer.stats()["dropped"] == 3
@@ -0,0 +1,26 @@
+import re
+
+import numpy as np
+
+from app.services import document_processor
+
+
+def _word_tokens(monkeypatch):
+    # One "token" per word, so chunk sizes are easy to read
+    monkeypatch.setattr(document_processor, "get_encoder", lambda: None)
+    monkeypatch.setattr(
+        document_processor, "_token_starts",
+        lambda enc, text: np.array([m.start() for m in re.finditer(r"\S+", text)], dtype=np.int64),
+    )
+
+
+def test_explicit_zero_overlap_is_respected(monkeypatch):
+    _word_tokens(monkeypatch)
+    monkeypatch.setattr(document_processor.settings, "CHUNK_OVERLAP", 2)
+    text = " ".join(f"w{i}" for i in range(10))
+
+    assert document_processor.chunk_text(text, chunk_size=4, chunk_overlap=0, snap=False) == [
+        "w0 w1 w2 w3", "w4 w5 w6 w7", "w8 w9",
+    ]
+    # None still means the configured default
+    assert document_processor.chunk_text(text, chunk_size=4, snap=False)[:2] == ["w0 w1 w2 w3", "w2 w3 w4 w5"]
@@ -0,0 +1,107 @@
+import asyncio
+
+from app.config import settings
+from app.services import circuit_breaker
+
+URL = "https://api.example.com/slots?date=today"
+
+
+class _Query:
+    def __init__(self, rows: dict[str, dict]):
+        self._rows = rows
+        self._endpoints = None
+        self._upsert = None
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, values):
+        self._endpoints = values
+        return self
+
+    def upsert(self, rows, on_conflict):
+        assert on_conflict == "endpoint"
+        self._upsert = rows
+        return self
+
+    def execute(self):
+        if self._upsert is not None:
+            for row in self._upsert:
+                self._rows[row["endpoint"]] = dict(row)
+            matched = self._upsert
+        else:
+            matched = [r for e, r in self._rows.items() if e in self._endpoints]
+
+        class _Result:
+            data = [dict(r) for r in matched]
+
+        return _Result()
+
+
+class _FakeDB:
+    def __init__(self):
+        self.rows: dict[str, dict] = {}
+
+    def table(self, name):
+        assert name == "webhook_circuit_breakers"
+        return _Query(self.rows)
+
+
+async def _new_job_process() -> circuit_breaker.EndpointBreaker:
+    """A breaker as a fresh job process sees it, once its shared state has loaded."""
+    circuit_breaker._breakers.clear()
+    breaker = circuit_breaker.get_breaker(URL)
+    await asyncio.gather(*circuit_breaker._background)
+    return breaker
+
+
+def test_calls_in_separate_processes_share_the_window_and_counters(monkeypatch):
+    db = _FakeDB()
+    monkeypatch.setattr(circuit_breaker, "get_supabase", lambda: db)
+
+    async def main():
+        first = await _new_job_process()
+        for _ in range(6):
+            first.record(False, 100.0)
+        first.hedges += 1
+        await circuit_breaker.publish_breaker_states()
+
+        second = await _new_job_process()
+        for _ in range(5):
+            second.record(False, 400.0)
+        # 11 requests across both calls: enough for a p95 instead of the default delay
+        assert second.hedge_delay(10.0) == 0.4
+        second.hedges += 2
+        await circuit_breaker.publish_breaker_states()
+        await circuit_breaker.publish_breaker_states()
+
+    asyncio.run(main())
+    row = db.rows[circuit_breaker.endpoint_key(URL)]
+    assert len(db.rows) == 1
+    assert row["requests"] == 11 and len(row["samples"]) == 11
+    assert row["hedges"] == 3
+
+
+def test_failures_across_calls_open_the_breaker_for_later_calls(monkeypatch):
+    db = _FakeDB()
+    monkeypatch.setattr(circuit_breaker, "get_supabase", lambda: db)
+    monkeypatch.setattr(settings, "TOOL_BREAKER_MIN_REQUESTS", 5)
+
+    async def main():
+        first = await _new_job_process()
+        for _ in range(3):
+            first.record(True, 50.0)
+        await circuit_breaker.publish_breaker_states()
+        assert first.state == circuit_breaker.CLOSED
+
+        second = await _new_job_process()
+        second.record(True, 50.0)
+        second.record(True, 50.0)
+        assert second.state == circuit_breaker.OPEN
+        await asyncio.gather(*circuit_breaker._background)
+
+        third = await _new_job_process()
+        assert third.state == circuit_breaker.OPEN
+        assert not third.allow()
+
+    asyncio.run(main())
@@ -0,0 +1,51 @@
+from app.services import embedding_cache
+from app.services.embedding_cache import EmbeddingCache
+
+
+class _CountingConnection:
+    """Wraps a sqlite3 connection, recording the statements executed."""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.statements: list[str] = []
+
+    def execute(self, sql, *args):
+        self.statements.append(sql)
+        return self._conn.execute(sql, *args)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _counts(conn: _CountingConnection) -> int:
+    return sum("COUNT(*)" in s for s in conn.statements)
+
+
+def test_writes_keep_a_running_count_and_evict_lru(tmp_path):
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", max_entries=3)
+    conn = cache._conn = _CountingConnection(cache._connect())
+
+    for i in range(5):
+        cache.put_many_sync("m", [f"text {i}"], [[float(i), 1.0]])
+    # Re-putting an existing key doesn't grow the cache
+    cache.put_many_sync("m", ["text 4"], [[4.0, 1.0]])
+
+    assert _counts(conn) == 1
+    assert cache._entries == 3
+    assert cache.evictions == 2
+    assert cache.get_many_sync("m", ["text 0", "text 1", "text 4"]) == [None, None, [4.0, 1.0]]
+    assert cache.stats_sync()["entries"] == 3
+
+
+def test_running_count_is_resynced_periodically(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "_RECOUNT_EVERY", 2)
+    cache = EmbeddingCache(tmp_path / "cache.sqlite3", max_entries=100)
+    cache.put_many_sync("m", ["a"], [[1.0]])
+    # Another process sharing the file adds rows this one didn't see
+    other = EmbeddingCache(tmp_path / "cache.sqlite3", max_entries=100)
+    other.put_many_sync("m", ["b", "c"], [[2.0], [3.0]])
+
+    cache.put_many_sync("m", ["d"], [[4.0]])
+    assert cache._entries == 2
+    cache.put_many_sync("m", ["e"], [[5.0]])
+    assert cache._entries == 5
@@ -0,0 +1,29 @@
+import asyncio
+
+from app.services import embedding_client
+
+
+def test_concurrency_limit_is_shared_by_concurrent_callers(monkeypatch):
+    monkeypatch.setattr(embedding_client.settings, "EMBEDDING_CONCURRENCY", 2)
+    monkeypatch.setattr(embedding_client, "plan_batches", lambda texts: [[i] for i in range(len(texts))])
+    in_flight = peak = 0
+
+    async def embed_batch(batch: list[str], model: str) -> list[list[float]]:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return [[float(len(t))] for t in batch]
+
+    monkeypatch.setattr(embedding_client, "_embed_batch", embed_batch)
+
+    async def run():
+        # Two ingestion jobs embedding at once
+        return await asyncio.gather(
+            embedding_client.embed_texts(["a", "bb", "ccc"]),
+            embedding_client.embed_texts(["dddd", "eeeee", "ffffff"]),
+        )
+
+    assert asyncio.run(run()) == [[[1.0], [2.0], [3.0]], [[4.0], [5.0], [6.0]]]
+    assert peak == 2
@@ -0,0 +1,103 @@
+import asyncio
+import fcntl
+import os
+
+from app.config import settings
+from app.services import ingestion_jobs
+
+
+class _Query:
+    def __init__(self, rows: list[dict]):
+        self._rows = rows
+        self._filters = []
+        self._update = None
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, values):
+        self._filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def eq(self, column, value):
+        self._filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def update(self, data):
+        self._update = data
+        return self
+
+    def execute(self):
+        matched = [r for r in self._rows if all(f(r) for f in self._filters)]
+        for row in matched:
+            row.update(self._update or {})
+
+        class _Result:
+            data = [dict(r) for r in matched]
+
+        return _Result()
+
+
+class _FakeDB:
+    def __init__(self, tables: dict[str, list[dict]]):
+        self.tables = tables
+
+    def table(self, name):
+        return _Query(self.tables[name])
+
+
+def test_restart_requeues_spooled_files_fails_the_rest_and_clears_orphans(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(ingestion_jobs, "_dir_lock", None)
+    files = [
+        {"id": "f1", "knowledge_base_id": "kb", "filename": "a.pdf", "file_type": "pdf", "status": "processing",
+         "chunk_ids": ["f1_x"]},
+        {"id": "f2", "knowledge_base_id": "kb", "filename": "b.txt", "file_type": "txt", "status": "queued"},
+        {"id": "f3", "knowledge_base_id": "kb", "filename": "c.txt", "file_type": "txt", "status": "completed"},
+        # A replacement of a file indexed before chunk ids were recorded
+        {"id": "f4", "knowledge_base_id": "kb", "filename": "d.txt", "file_type": "txt", "status": "queued",
+         "chunk_count": 2, "chunk_ids": None},
+    ]
+    db = _FakeDB({"knowledge_base_files": files, "knowledge_bases": [{"id": "kb", "provider": "local"}]})
+    monkeypatch.setattr(ingestion_jobs, "get_supabase", lambda: db)
+    submitted = []
+    monkeypatch.setattr(ingestion_jobs, "submit", lambda *args, **kwargs: submitted.append((args, kwargs)))
+
+    (tmp_path / "f1.pdf").write_bytes(b"%PDF")
+    (tmp_path / "f1.pdf.chunks-0.jsonl").write_text("{}\n")
+    (tmp_path / "f4.txt").write_text("revised")
+    (tmp_path / "tmpabc.txt").write_text("never claimed")
+
+    asyncio.run(ingestion_jobs.recover())
+
+    kb = {"id": "kb", "provider": "local"}
+    assert submitted == [
+        (("f1", kb, str(tmp_path / "f1.pdf"), "a.pdf"), {"existing_ids": ["f1_x"]}),
+        (("f4", kb, str(tmp_path / "f4.txt"), "d.txt"), {"existing_ids": ["f4_0", "f4_1"]}),
+    ]
+    assert files[1]["status"] == "failed" and "restart" in files[1]["error_message"]
+    assert files[2]["status"] == "completed"
+    assert sorted(p.name for p in tmp_path.iterdir()) == [".lock", "f1.pdf", "f4.txt"]
+
+
+def test_recovery_is_skipped_while_another_api_process_is_running(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "INGEST_UPLOAD_DIR", str(tmp_path))
+    monkeypatch.setattr(ingestion_jobs, "_dir_lock", None)
+    files = [{"id": "f1", "knowledge_base_id": "kb", "filename": "a.pdf", "file_type": "pdf", "status": "processing"}]
+    db = _FakeDB({"knowledge_base_files": files, "knowledge_bases": [{"id": "kb", "provider": "local"}]})
+    monkeypatch.setattr(ingestion_jobs, "get_supabase", lambda: db)
+    submitted = []
+    monkeypatch.setattr(ingestion_jobs, "submit", lambda *args, **kwargs: submitted.append(args))
+    (tmp_path / "tmpabc.pdf").write_text("being spooled by the other process")
+
+    # The other process's lifetime lock
+    other = os.open(tmp_path / ".lock", os.O_RDWR | os.O_CREAT)
+    fcntl.flock(other, fcntl.LOCK_SH)
+    try:
+        asyncio.run(ingestion_jobs.recover())
+    finally:
+        os.close(other)
+
+    assert submitted == []
+    assert files[0]["status"] == "processing"
+    assert (tmp_path / "tmpabc.pdf").exists()
@@ -0,0 +1,32 @@
+import asyncio
+import threading
+
+from app.services import local_vectors
+from app.services.vector_db import LocalProvider
+
+
+def test_query_reads_files_off_the_event_loop(tmp_path, monkeypatch):
+    provider = LocalProvider({"path": str(tmp_path), "index_name": "kb"})
+    asyncio.run(provider.upsert([
+        {"id": "a", "values": [1.0, 0.0], "metadata": {"text": "alpha"}},
+        {"id": "b", "values": [0.0, 1.0], "metadata": {"text": "beta"}},
+    ]))
+    # A fresh process: the store is loaded lazily by the first query
+    local_vectors._stores.clear()
+
+    refresh_threads = []
+    original = local_vectors.LocalVectorStore._refresh
+
+    def recording_refresh(self):
+        refresh_threads.append(threading.current_thread())
+        return original(self)
+
+    monkeypatch.setattr(local_vectors.LocalVectorStore, "_refresh", recording_refresh)
+
+    async def query():
+        return await provider.query([0.9, 0.1], top_k=1)
+
+    matches = asyncio.run(query())
+    assert [m["id"] for m in matches] == ["a"]
+    assert refresh_threads
+    assert threading.main_thread() not in refresh_threads
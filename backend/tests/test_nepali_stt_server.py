@@ -0,0 +1,34 @@
+import asyncio
+import os
+import tempfile
+
+import numpy as np
+import pytest
+
+pytest.importorskip("livekit.agents")
+
+from app.voice import nepali_stt, nepali_stt_server  # noqa: E402
+
+
+def test_concurrent_clients_share_forward_passes():
+    batches: list[int] = []
+
+    def run_batch(audios: list[np.ndarray]) -> list[str]:
+        batches.append(len(audios))
+        return [f"{a.size} samples" for a in audios]
+
+    async def run():
+        socket_path = os.path.join(tempfile.mkdtemp(), "stt.sock")
+        batcher = nepali_stt._InferenceBatcher(run_batch, max_batch=8, wait=0.05, max_batch_samples=10**6)
+        server = asyncio.create_task(nepali_stt_server.serve(socket_path, batcher))
+        while not os.path.exists(socket_path):
+            await asyncio.sleep(0.01)
+        try:
+            audios = [np.zeros(1600 * (i + 1), dtype=np.float32) for i in range(4)]
+            texts = await asyncio.gather(*(nepali_stt_server.transcribe(a, socket_path) for a in audios))
+        finally:
+            server.cancel()
+        return texts
+
+    assert asyncio.run(run()) == ["1600 samples", "3200 samples", "4800 samples", "6400 samples"]
+    assert batches == [4]
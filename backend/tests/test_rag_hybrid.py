@@ -0,0 +1,50 @@
+import asyncio
+
+from app.services import config_cache, rag
+from app.services.query_cache import QueryCache
+
+
+class _FakeLexicalIndex:
+    def exists(self) -> bool:
+        return True
+
+    async def search(self, text: str, top_k: int) -> list[dict]:
+        return [{"id": "lexical", "text": "BM25 hit", "score": 3.0}]
+
+
+def test_slow_embedding_falls_back_for_one_turn_and_fills_the_caches(tmp_path, monkeypatch):
+    monkeypatch.setattr(rag.settings, "RAG_HYBRID_VECTOR_WAIT_MS", 20)
+    embedded: list[str] = []
+
+    async def slow_embedding(text: str) -> list[float]:
+        embedded.append(text)
+        await asyncio.sleep(0.1)
+        return [1.0, 0.0, 0.0]
+
+    async def vector_search(embedding: list[float], top_k: int) -> list[dict]:
+        return [{"id": "vector", "text": "embedding hit", "score": 0.9}]
+
+    monkeypatch.setattr(rag, "generate_embedding", slow_embedding)
+    knowledge_bases = config_cache.RowCache("knowledge_bases")
+    knowledge_bases.prime([{"id": "kb", "updated_at": "v1"}])
+    monkeypatch.setattr(config_cache, "knowledge_bases", knowledge_bases)
+
+    async def run():
+        retriever = rag.KnowledgeRetriever({"id": "kb", "provider": "local", "config": {}})
+        retriever.lexical_index = _FakeLexicalIndex()
+        retriever.query_cache = QueryCache(tmp_path / "query_cache.sqlite3", ttl=60, max_entries=100, min_similarity=0.97)
+        retriever._vector_search = vector_search
+
+        first = await retriever.retrieve_for_turn("What are your opening hours?")
+        assert [m["id"] for m in first] == ["lexical"]
+        assert retriever.stats()["lexical_only"] == 1
+
+        # The vector side was not cancelled: it finishes and caches the embedding and fused matches
+        await asyncio.sleep(0.15)
+        second = await retriever.retrieve_for_turn("what are your opening hours")
+        assert {m["id"] for m in second} == {"vector", "lexical"}
+        assert retriever.stats()["cache_hits"] == 1
+        assert retriever.stats()["lexical_only"] == 1
+        assert embedded == ["What are your opening hours?"]
+
+    asyncio.run(run())
@@ -0,0 +1,102 @@
+import asyncio
+
+from app.services import config_cache, rag
+from app.services.query_cache import QueryCache
+
+
+class _Query:
+    def __init__(self, rows: list[dict]):
+        self._rows = rows
+        self._filters = []
+
+    def select(self, columns):
+        return self
+
+    def in_(self, column, values):
+        self._filters.append(lambda r: r.get(column) in values)
+        return self
+
+    def eq(self, column, value):
+        self._filters.append(lambda r: r.get(column) == value)
+        return self
+
+    def execute(self):
+        class _Result:
+            data = [dict(r) for r in self._rows if all(f(r) for f in self._filters)]
+
+        return _Result()
+
+
+class _FakeDB:
+    def __init__(self, rows: list[dict]):
+        self.rows = rows
+
+    def table(self, name):
+        return _Query(self.rows)
+
+
+def test_reindex_mid_call_stops_serving_cached_results(tmp_path, monkeypatch):
+    kb_row = {"id": "kb", "provider": "local", "is_active": True, "updated_at": "v1"}
+    monkeypatch.setattr(config_cache, "get_supabase", lambda: _FakeDB([kb_row]))
+    monkeypatch.setattr(config_cache.settings, "CONFIG_CACHE_TTL_SECONDS", 0.05)
+    monkeypatch.setattr(rag.settings, "RAG_HYBRID_ENABLED", False)
+    knowledge_bases = config_cache.RowCache("knowledge_bases", filters={"is_active": True})
+    knowledge_bases.prime([dict(kb_row)])
+    monkeypatch.setattr(config_cache, "knowledge_bases", knowledge_bases)
+    searches = []
+
+    async def embedding(text: str) -> list[float]:
+        return [1.0, 0.0]
+
+    async def vector_search(embedding: list[float], top_k: int) -> list[dict]:
+        searches.append(embedding)
+        return [{"id": f"chunk-{len(searches)}", "text": "hours", "score": 0.9}]
+
+    monkeypatch.setattr(rag, "generate_embedding", embedding)
+
+    async def run():
+        retriever = rag.KnowledgeRetriever(dict(kb_row))
+        retriever.query_cache = QueryCache(tmp_path / "query_cache.sqlite3", ttl=600, max_entries=100, min_similarity=0.97)
+        retriever._vector_search = vector_search
+
+        assert (await retriever.retrieve_for_turn("opening hours"))[0]["id"] == "chunk-1"
+        assert (await retriever.retrieve_for_turn("opening hours"))[0]["id"] == "chunk-1"
+        assert retriever.stats()["cache_hits"] == 1
+
+        # The API re-indexes a file: knowledge_base_changed() bumps the row's updated_at
+        kb_row["updated_at"] = "v2"
+        await asyncio.sleep(0.06)
+        # The config cache serves the stale row while it revalidates in the background
+        await retriever.retrieve_for_turn("opening hours")
+        await asyncio.sleep(0.01)
+
+        matches = await retriever.retrieve_for_turn("opening hours")
+        assert matches[0]["id"] == "chunk-2"
+        assert retriever.query_cache.stats()["result_misses"] == 2
+
+    asyncio.run(run())
+
+
+def test_later_calls_hit_entries_cached_by_an_earlier_call(tmp_path):
+    path = tmp_path / "query_cache.sqlite3"
+    # Each call runs in its own job process, with its own handle on the file
+    first = QueryCache(path, ttl=600, max_entries=100, min_similarity=0.97)
+    second = QueryCache(path, ttl=600, max_entries=100, min_similarity=0.97)
+    matches = [{"id": "chunk-1", "text": "We open at 9am", "score": 0.9, "metadata": {"page": 2}}]
+
+    async def run():
+        await first.put_embedding("Opening hours?", [0.6, 0.8])
+        await first.put_results("kb", 3, "v1", [0.6, 0.8], matches)
+
+        embedding = await second.get_embedding("opening   HOURS")
+        assert embedding == [0.6000000238418579, 0.800000011920929]
+        assert await second.get_results("kb", 3, "v1", embedding) == matches
+        # A near-identical paraphrase is served too, a new KB version is not
+        assert await second.get_results("kb", 3, "v1", [0.61, 0.8]) == matches
+        assert await second.get_results("kb", 3, "v2", embedding) is None
+
+        await first.invalidate_kb("kb")
+        assert await second.get_results("kb", 3, "v1", embedding) is None
+
+    asyncio.run(run())
+    assert second.stats() == {"embedding_hits": 1, "embedding_misses": 0, "result_hits": 2, "result_misses": 2}
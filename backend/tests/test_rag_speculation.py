@@ -0,0 +1,56 @@
+import asyncio
+
+from app.services import rag
+
+
+def _retriever(monkeypatch) -> tuple[rag.KnowledgeRetriever, list[str]]:
+    monkeypatch.setattr(rag.settings, "RAG_HYBRID_ENABLED", False)
+    monkeypatch.setattr(rag.settings, "RAG_QUERY_CACHE_ENABLED", False)
+    monkeypatch.setattr(rag.settings, "RAG_SPECULATE_DEBOUNCE_MS", 50)
+    monkeypatch.setattr(rag.settings, "RAG_SPECULATE_MAX_PER_TURN", 2)
+    retriever = rag.KnowledgeRetriever({"id": "kb", "provider": "local", "config": {}})
+    searched: list[str] = []
+
+    async def semantic(text: str, candidates: int, lexical) -> list[dict]:
+        searched.append(text)
+        await asyncio.sleep(0.01)
+        return [{"id": "1", "text": text, "score": 1.0}]
+
+    retriever._semantic = semantic
+    return retriever, searched
+
+
+def test_interim_transcripts_are_debounced(monkeypatch):
+    async def run():
+        retriever, searched = _retriever(monkeypatch)
+        # A burst of partial results, each replacing the last within the debounce window
+        for text in ["what", "what are", "what are your", "what are your opening hours"]:
+            retriever.speculate(text)
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.1)
+        return searched
+
+    assert asyncio.run(run()) == ["what are your opening hours"]
+
+
+def test_covered_text_does_not_restart_and_turns_cap_speculation(monkeypatch):
+    async def run():
+        retriever, searched = _retriever(monkeypatch)
+        retriever.speculate("what are your opening hours on", is_final=True)
+        # Still covered by the running lookup (prefix, >= 80% of the words)
+        retriever.speculate("what are your opening hours on sunday", is_final=True)
+        await asyncio.sleep(0)
+        retriever.speculate("pricing for the premium plan", is_final=True)
+        retriever.speculate("do you deliver to kathmandu", is_final=True)  # over the per-turn cap
+        await asyncio.sleep(0.05)
+        assert searched == ["what are your opening hours on", "pricing for the premium plan"]
+
+        matches = await retriever.retrieve_for_turn("pricing for the premium plan")
+        assert matches[0]["text"] == "pricing for the premium plan"
+        assert retriever.stats()["speculative_reused"] == 1
+        # The cap is per turn
+        retriever.speculate("do you deliver to kathmandu", is_final=True)
+        await asyncio.sleep(0.05)
+        return searched
+
+    assert asyncio.run(run())[-1] == "do you deliver to kathmandu"
@@ -0,0 +1,27 @@
+from app.services.response_cache import get_cache
+
+
+def _func(**overrides) -> dict:
+    return {
+        "name": "check_availability",
+        "method": "GET",
+        "updated_at": "2026-01-01T00:00:00Z",
+        "response_cache": {"enabled": True, "ttl_seconds": 30},
+        **overrides,
+    }
+
+
+def test_get_lookup_is_cached():
+    cache = get_cache(_func())
+    cache.put({"date": "2026-02-01"}, {"slots": 3})
+    assert cache.get({"date": "2026-02-01"}) == {"slots": 3}
+
+
+def test_full_context_payload_is_never_cached():
+    assert get_cache(_func(name="with_context", payload_mode="full_context")) is None
+
+
+def test_unsafe_methods_need_read_only():
+    assert get_cache(_func(name="book", method="POST")) is None
+    search = _func(name="search", method="POST", response_cache={"enabled": True, "read_only": True})
+    assert get_cache(search) is not None
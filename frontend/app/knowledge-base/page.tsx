@@ -4,11 +4,12 @@ import { api } from "@/lib/api";
 import { KnowledgeBase, KnowledgeBaseFile } from "@/types";
 import {
   Database, Plus, Pencil, Trash2, X, Upload, FileText, Loader2,
-  ChevronDown, ChevronRight, AlertCircle, CheckCircle2,
+  ChevronDown, ChevronRight, AlertCircle, CheckCircle2, Clock, RefreshCw,
 } from "lucide-react";
 
 const PROVIDERS = [
   { value: "pinecone", label: "Pinecone", fields: ["api_key", "index_name", "host", "namespace"] },
+  { value: "local", label: "Local (on-disk)", fields: ["index_name", "namespace", "index_type", "nprobe"] },
 ];
 
 export default function KnowledgeBasePage() {
@@ -20,6 +21,8 @@ export default function KnowledgeBasePage() {
   const [files, setFiles] = useState<Record<string, KnowledgeBaseFile[]>>({});
   const [uploading, setUploading] = useState<string | null>(null);
   const fileInputRef = useRef<HTMLInputElement>(null);
+  const replaceInputRef = useRef<HTMLInputElement>(null);
+  const [replaceTarget, setReplaceTarget] = useState<string | null>(null);
 
   const [form, setForm] = useState({
     name: "",
@@ -53,6 +56,16 @@ export default function KnowledgeBasePage() {
     }
   };
 
+  // Uploads are ingested in the background — refresh the open KB's files until they finish
+  const ingesting = expandedKB
+    ? (files[expandedKB] || []).some((f) => f.status === "queued" || f.status === "processing")
+    : false;
+  useEffect(() => {
+    if (!expandedKB || !ingesting) return;
+    const timer = setInterval(() => loadFiles(expandedKB), 2000);
+    return () => clearInterval(timer);
+  }, [expandedKB, ingesting]);
+
   const toggleExpand = (kbId: string) => {
     if (expandedKB === kbId) {
       setExpandedKB(null);
@@ -122,10 +135,10 @@ export default function KnowledgeBasePage() {
     }
   };
 
-  const handleFileUpload = async (kbId: string, file: File) => {
+  const handleFileUpload = async (kbId: string, file: File, fileId?: string) => {
     setUploading(kbId);
     try {
-      await api.uploadKBFile(kbId, file);
+      await api.uploadKBFile(kbId, file, fileId);
       loadFiles(kbId);
       loadKBs();
     } catch (e) {
@@ -233,6 +246,18 @@ export default function KnowledgeBasePage() {
                           e.target.value = "";
                         }}
                       />
+                      <input
+                        ref={replaceInputRef}
+                        type="file"
+                        accept=".pdf,.txt,.docx,.csv"
+                        className="hidden"
+                        onChange={(e) => {
+                          const f = e.target.files?.[0];
+                          if (f && replaceTarget) handleFileUpload(kb.id, f, replaceTarget);
+                          setReplaceTarget(null);
+                          e.target.value = "";
+                        }}
+                      />
                       <button
                         onClick={() => fileInputRef.current?.click()}
                         disabled={uploading === kb.id}
@@ -257,17 +282,32 @@ export default function KnowledgeBasePage() {
                               <div className="flex items-center gap-3 text-xs text-gray-400">
                                 <span>{formatFileSize(file.file_size)}</span>
                                 <span>{file.chunk_count} chunks</span>
+                                {file.status === "processing" && file.progress?.fraction != null && (
+                                  <span>{Math.round(file.progress.fraction * 100)}%</span>
+                                )}
                               </div>
                             </div>
                           </div>
                           <div className="flex items-center gap-2">
                             {file.status === "completed" && <CheckCircle2 className="w-4 h-4 text-green-400" />}
+                            {file.status === "queued" && <Clock className="w-4 h-4 text-gray-400" />}
                             {file.status === "processing" && <Loader2 className="w-4 h-4 text-blue-400 animate-spin" />}
                             {file.status === "failed" && (
                               <span title={file.error_message || "Failed"}>
                                 <AlertCircle className="w-4 h-4 text-red-400" />
                               </span>
                             )}
+                            <button
+                              onClick={() => {
+                                setReplaceTarget(file.id);
+                                replaceInputRef.current?.click();
+                              }}
+                              disabled={uploading === kb.id || file.status === "queued" || file.status === "processing"}
+                              title="Upload a revised version"
+                              className="p-1 rounded hover:bg-gray-200 dark:hover:bg-gray-700 text-gray-400 hover:text-purple-400 disabled:opacity-50 transition-colors"
+                            >
+                              <RefreshCw className="w-3.5 h-3.5" />
+                            </button>
                             <button
                               onClick={() => handleDeleteFile(kb.id, file.id)}
                               className="p-1 rounded hover:bg-gray-200 dark:hover:bg-gray-700 text-gray-400 hover:text-red-400 transition-colors"
@@ -95,7 +95,8 @@ export const api = {
 
   // Knowledge Base Files
   listKBFiles: (kbId: string) => request<any[]>(`/api/knowledge-bases/${kbId}/files`),
-  uploadKBFile: async (kbId: string, file: File) => {
+  // With fileId, uploads a revised version of that file (only changed chunks are re-embedded)
+  uploadKBFile: async (kbId: string, file: File, fileId?: string) => {
     const headers: Record<string, string> = {};
     try {
       const clerk = await waitForClerk();
@@ -110,8 +111,9 @@ export const api = {
     }
     const formData = new FormData();
     formData.append("file", file);
-    const res = await fetch(`${API_URL}/api/knowledge-bases/${kbId}/files`, {
-      method: "POST",
+    const url = `${API_URL}/api/knowledge-bases/${kbId}/files` + (fileId ? `/${fileId}` : "");
+    const res = await fetch(url, {
+      method: fileId ? "PUT" : "POST",
       headers,
       body: formData,
     });
@@ -129,6 +129,7 @@ export interface KnowledgeBaseFile {
   chunk_count: number;
   status: string;
   error_message: string | null;
+  progress?: { stage?: string; fraction?: number; chunks_per_second?: number } | null;
   created_at: string;
   updated_at: string;
 }